@@ -0,0 +1,275 @@
+"""Batch benchmark of the VRP heuristics over instance files.
+
+Usage example:
+    python -m src.Benchmark --instances "Dataset/100/*.txt" --heuristics cws aco --grid "beta=1,2" \
+        --seeds 0 1 2 --workers 8 --timeout 300 --output results.csv
+"""
+import argparse
+import ast
+import csv
+import inspect
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from collections import deque
+from contextlib import suppress
+from glob import glob
+from multiprocessing.connection import Connection, wait
+from typing import Callable, Optional
+from src.Vrp import Vrp
+
+try:
+    import resource
+except ImportError:
+    # Unix only, the peak memory is read with psutil elsewhere
+    resource = None
+
+# Parameters of the heuristics which have no default value, overridden by the parameter grid
+DEFAULT_PARAMS = {
+    "aco": {"n_ants": 20, "max_iter": 50, "alpha": 1, "beta": 2, "rho": 0.1},
+    "acs": {"n_ants": 20, "max_iter": 50, "alpha": 1, "beta": 2, "rho": 0.1},
+    "mmas": {"n_ants": 20, "max_iter": 50, "alpha": 1, "beta": 2, "rho": 0.1},
+    "island": {"n_colonies": 4, "n_ants": 20, "max_iter": 50, "alpha": 1, "beta": 2, "rho": 0.1},
+    "alns": {"max_iter": 2000},
+}
+
+# Heuristics which only look at the nearest neighbors of the customers, run on instances computing the distances on
+# demand so that their memory stays linear, see Instance.LazyDistances
+LAZY_HEURISTICS = ("decomposition",)
+
+# Jobs run in spawned rather than forked processes, a forked process starts with the peak memory of the parent
+_job_context = multiprocessing.get_context("spawn")
+
+COLUMNS = ["instance", "heuristic", "params", "seed", "status", "wall_time", "peak_rss_kb", "total_cost",
+           "vehicles", "best_cost_history", "error"]
+
+
+def heuristic_method(heuristic: str) -> Callable:
+    """Get the Vrp method of a heuristic name, e.g. "cws" -> Vrp.cws_heuristic"""
+    method = getattr(Vrp, f"{heuristic}_heuristic", None)
+
+    if method is None:
+        raise ValueError(f"Unknown heuristic {heuristic}")
+
+    return method
+
+
+def parse_grid(grid: list[str]) -> dict[str, list]:
+    """Parse a parameter grid given as "name=value1,value2" strings"""
+    parsed = {}
+
+    for entry in grid:
+        name, _, values = entry.partition("=")
+        parsed[name.strip()] = [ast.literal_eval(value.strip()) for value in values.split(",")]
+
+    return parsed
+
+
+def make_jobs(instances: list[str], heuristics: list[str], grid: dict[str, list],
+              seeds: list[Optional[int]]) -> list[dict]:
+    """Expand instances, heuristics, parameter grid and seeds into jobs
+        Grid parameters and seeds are only applied to the heuristics accepting them.
+    """
+    jobs = []
+
+    for heuristic in heuristics:
+        accepted = inspect.signature(heuristic_method(heuristic)).parameters
+        names = [name for name in grid if name in accepted]
+        heuristic_seeds = seeds if "seed" in accepted else [None]
+
+        for values in itertools.product(*(grid[name] for name in names)):
+            params = {**DEFAULT_PARAMS.get(heuristic, {}), **dict(zip(names, values))}
+
+            for instance in instances:
+                for seed in heuristic_seeds:
+                    jobs.append({"instance": instance, "heuristic": heuristic, "params": params, "seed": seed})
+
+    return jobs
+
+
+def job_key(job: dict) -> tuple:
+    """Identify a job, in memory or read back from the results file"""
+    params = job["params"] if isinstance(job["params"], str) else json.dumps(job["params"], sort_keys=True)
+    seed = "" if job["seed"] in (None, "") else str(job["seed"])
+    return job["instance"], job["heuristic"], params, seed
+
+
+def peak_rss_kb() -> Optional[int]:
+    """Peak resident memory of the current process, in kB, None if the platform does not report it"""
+    # The peak of the address space on Linux, ru_maxrss keeps the peak of the parent across fork and exec
+    with suppress(OSError):
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes on Linux and the BSDs
+        return peak // 1024 if sys.platform == "darwin" else peak
+
+    try:
+        import psutil
+    except ImportError:
+        return None
+
+    # Peak working set, only reported on Windows
+    peak = getattr(psutil.Process().memory_info(), "peak_wset", None)
+    return None if peak is None else peak // 1024
+
+
+def run_job(job: dict) -> dict:
+    """Run a single job in the current process
+        :return: Results of the job, see COLUMNS
+    """
+    # Imported here, workers only pay for the loader when they run a job
+    from src.Dataset import load_vrp
+
+    vrp = load_vrp(job["instance"], lazy_distances=job["heuristic"] in LAZY_HEURISTICS)
+    params = dict(job["params"])
+
+    if job["seed"] is not None:
+        params["seed"] = job["seed"]
+
+    start = time.perf_counter()
+    getattr(vrp, f"{job['heuristic']}_heuristic")(**params)
+    wall_time = time.perf_counter() - start
+
+    return {"status": "ok", "wall_time": wall_time,
+            "peak_rss_kb": peak_rss_kb(),
+            "total_cost": vrp.total_cost(), "vehicles": len(vrp.routes),
+            "best_cost_history": json.dumps(vrp.best_cost_history)}
+
+
+def _job_process(connection: Connection, job: dict):
+    try:
+        connection.send(run_job(job))
+    except Exception:
+        connection.send({"status": "error", "error": traceback.format_exc(limit=3)})
+    finally:
+        connection.close()
+
+
+def run_jobs(jobs: list[dict], n_workers: int, timeout: Optional[float], on_result: Callable[[dict, dict], None]):
+    """Run jobs in separate processes, at most n_workers at a time, killing the jobs exceeding the timeout
+        :arg jobs: Jobs to run
+        :arg n_workers: Maximum number of concurrent jobs
+        :arg timeout: (Optional) Maximum wall time of a job, in seconds
+        :arg on_result: Called with each job and its results as soon as the job finishes
+    """
+    pending = deque(jobs)
+    # Receiving end of the pipe of each running job -> (process, job, start time)
+    running = {}
+
+    while pending or running:
+        while pending and len(running) < n_workers:
+            job = pending.popleft()
+            receiver, sender = _job_context.Pipe(duplex=False)
+            process = _job_context.Process(target=_job_process, args=(sender, job), daemon=True)
+            process.start()
+            sender.close()
+            running[receiver] = (process, job, time.monotonic())
+
+        for receiver in wait(list(running), timeout=0.1):
+            process, job, _ = running.pop(receiver)
+
+            try:
+                result = receiver.recv()
+            except EOFError:
+                result = {"status": "error", "error": f"Worker exited with code {process.exitcode}"}
+
+            receiver.close()
+            process.join()
+            on_result(job, result)
+
+        if timeout is not None:
+            for receiver, (process, job, start) in list(running.items()):
+                if time.monotonic() - start > timeout:
+                    process.kill()
+                    process.join()
+                    receiver.close()
+                    del running[receiver]
+                    on_result(job, {"status": "timeout", "wall_time": time.monotonic() - start})
+
+
+def completed_jobs(output: str) -> set[tuple]:
+    """Read the keys of the jobs already completed in a results file, the jobs which failed or timed out are not
+    completed and run again"""
+    if not os.path.exists(output):
+        return set()
+
+    with open(output, newline="") as file:
+        return {job_key(row) for row in csv.DictReader(file) if row["status"] == "ok"}
+
+
+def run_benchmark(instances: list[str], heuristics: list[str], grid: dict[str, list], seeds: list[Optional[int]],
+                  output: str, n_workers: int = 1, timeout: Optional[float] = None, resume: bool = True,
+                  parquet: Optional[str] = None) -> int:
+    """Run every (instance, heuristic, params, seed) job and append the results to a CSV file
+        :arg instances: Glob patterns of the instance files
+        :arg heuristics: Heuristic names, e.g. "nearest_neighbor", "cws", "aco", "acs"
+        :arg grid: Values of each parameter, the cartesian product is run
+        :arg seeds: Seeds of the randomized heuristics
+        :arg output: CSV file the results are appended to as soon as each job finishes
+        :arg n_workers: Maximum number of concurrent jobs
+        :arg timeout: (Optional) Maximum wall time of a job, in seconds
+        :arg resume: Skip the jobs already completed in the output file
+        :arg parquet: (Optional) Parquet file to export all results to at the end, requires pandas
+        :return: Number of jobs run
+    """
+    files = sorted({filename for pattern in instances for filename in glob(pattern)})
+    jobs = make_jobs(files, heuristics, grid, seeds)
+
+    done = completed_jobs(output) if resume else set()
+    jobs = [job for job in jobs if job_key(job) not in done]
+
+    write_header = not (resume and os.path.exists(output))
+
+    with open(output, "a" if resume else "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=COLUMNS)
+
+        if write_header:
+            writer.writeheader()
+
+        def record(job: dict, result: dict):
+            instance, heuristic, params, seed = job_key(job)
+            writer.writerow({"instance": instance, "heuristic": heuristic, "params": params, "seed": seed,
+                             **result})
+            file.flush()
+            print(f"[{result['status']}] {heuristic} {instance} {params} seed={seed} "
+                  f"cost={result.get('total_cost', '')}")
+
+        run_jobs(jobs, n_workers, timeout, record)
+
+    if parquet:
+        import pandas as pd
+        pd.read_csv(output).to_parquet(parquet)
+
+    return len(jobs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run VRP heuristics over instance files")
+    parser.add_argument("--instances", nargs="+", required=True, help="Glob patterns of the instance files")
+    parser.add_argument("--heuristics", nargs="+", default=["nearest_neighbor", "cws", "aco", "acs"],
+                        help="Heuristic names")
+    parser.add_argument("--grid", nargs="*", default=[], help='Parameter values, e.g. "n_ants=10,50" "rho=0.1"')
+    parser.add_argument("--seeds", nargs="*", type=int, default=[0], help="Seeds of the randomized heuristics")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Maximum number of concurrent jobs")
+    parser.add_argument("--timeout", type=float, default=None, help="Maximum wall time of a job, in seconds")
+    parser.add_argument("--output", default="benchmark.csv", help="CSV file the results are appended to")
+    parser.add_argument("--parquet", default=None, help="Parquet file to export the results to, requires pandas")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Rerun the jobs already completed in the output file")
+    args = parser.parse_args()
+
+    run_benchmark(args.instances, args.heuristics, parse_grid(args.grid), args.seeds, args.output, args.workers,
+                  args.timeout, not args.no_resume, args.parquet)
+
+
+if __name__ == "__main__":
+    main()
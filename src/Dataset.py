@@ -0,0 +1,94 @@
+import hashlib
+import os
+from contextlib import suppress
+from glob import escape, glob
+from typing import Iterator
+from src.LocationSet import LocationSet
+from src.Vrp import Vrp
+import numpy as np
+
+# Columns of the customer table of the Solomon instance files, in file order
+CUSTOMER_DTYPE = np.dtype([("id", np.int64), ("x", np.int64), ("y", np.int64), ("demand", np.int64),
+                           ("ready_time", np.int64), ("due_date", np.int64), ("service", np.int64)])
+
+
+def parse(filename: str) -> tuple[int, int, np.ndarray]:
+    """Parse a Solomon instance file
+        :arg filename: Path of the instance file
+        :return: Vehicle number, vehicle capacity and customer table (warehouse first) as a structured array
+    """
+    with open(filename) as file:
+        lines = file.readlines()
+
+    # The vehicle number and capacity are on the first line of numbers after the VEHICLE header
+    vehicle = next(i for i, line in enumerate(lines) if line.strip().upper() == "VEHICLE")
+    numbers = next(line.split() for line in lines[vehicle + 1:] if line.split() and line.split()[0].isdigit())
+    vehicle_number, vehicle_capacity = int(numbers[0]), int(numbers[1])
+
+    # The customer table follows its column header
+    header = next(i for i, line in enumerate(lines) if line.strip().upper().startswith("CUST NO."))
+    customers = np.loadtxt(lines[header + 1:], dtype=CUSTOMER_DTYPE, ndmin=1)
+
+    return vehicle_number, vehicle_capacity, customers
+
+
+def load(filename: str, cache: bool = True) -> tuple[int, int, np.ndarray]:
+    """Load a Solomon instance file, through a binary cache written next to it and keyed by the file content hash
+        :arg filename: Path of the instance file
+        :arg cache: Read and write the binary cache
+        :return: Vehicle number, vehicle capacity and customer table (warehouse first) as a structured array
+    """
+    if not cache:
+        return parse(filename)
+
+    with open(filename, "rb") as file:
+        digest = hashlib.sha256(file.read()).hexdigest()[:16]
+
+    cache_file = f"{filename}.{digest}.npz"
+
+    if os.path.exists(cache_file):
+        with np.load(cache_file, allow_pickle=False) as data:
+            return int(data["vehicle_number"]), int(data["vehicle_capacity"]), data["customers"]
+
+    vehicle_number, vehicle_capacity, customers = parse(filename)
+
+    # Caches of previous versions of the file are stale
+    for stale in glob(f"{escape(filename)}.*.npz"):
+        with suppress(OSError):
+            os.remove(stale)
+
+    # Written to a temporary file first, so concurrent readers never see a partial cache. The cache is only an
+    # optimization, e.g. a read-only dataset directory is parsed every time
+    temporary = f"{cache_file}.{os.getpid()}.tmp"
+    try:
+        with open(temporary, "wb") as file:
+            np.savez(file, vehicle_number=vehicle_number, vehicle_capacity=vehicle_capacity, customers=customers)
+        os.replace(temporary, cache_file)
+    except OSError:
+        with suppress(OSError):
+            os.remove(temporary)
+
+    return vehicle_number, vehicle_capacity, customers
+
+
+def load_vrp(filename: str, cache: bool = True, **kwargs) -> Vrp:
+    """Load a Solomon instance file as a Vrp
+        :arg filename: Path of the instance file
+        :arg cache: Read and write the binary cache
+        :arg kwargs: Additional arguments of Vrp, e.g. distance_dtype
+    """
+    vehicle_number, vehicle_capacity, customers = load(filename, cache)
+    return Vrp.from_location_set(LocationSet.from_records(customers), vehicle_number, vehicle_capacity, **kwargs)
+
+
+def iter_vrps(directory: str, pattern: str = "*", cache: bool = True, **kwargs) -> Iterator[tuple[str, Vrp]]:
+    """Lazily load every Solomon instance file of a directory, in name order
+        :arg directory: Directory to search, e.g. Dataset/100
+        :arg pattern: Glob pattern the file names must match
+        :arg cache: Read and write the binary caches
+        :arg kwargs: Additional arguments of Vrp, e.g. distance_dtype
+        :return: Iterator of (file path, Vrp)
+    """
+    for filename in sorted(glob(os.path.join(escape(directory), pattern))):
+        if filename.lower().endswith(".txt"):
+            yield filename, load_vrp(filename, cache, **kwargs)
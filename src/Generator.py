@@ -0,0 +1,176 @@
+"""Seeded generator of synthetic Solomon-format instances, at any number of customers.
+
+Layouts follow the Solomon families: "random" (r) customers are spread uniformly, "clustered" (c) customers are
+grouped around cluster centers and "mixed" (rc) instances have both. "tight" delivery windows and small vehicles match
+the type 1 instances (e.g. r101), "loose" windows and large vehicles the type 2 instances (e.g. r201). The coordinate
+grid grows with the number of customers, so that their density stays the one of the 100-customer files.
+
+Usage example:
+    python -m src.Generator --customers 1000 5000 --layouts random clustered mixed --windows tight loose \
+        --seed 0 --output Dataset/generated
+"""
+import argparse
+import os
+from typing import Optional
+from src.Dataset import CUSTOMER_DTYPE
+from src.LocationSet import LocationSet
+from src.Vrp import Vrp
+import numpy as np
+
+LAYOUTS = ("random", "clustered", "mixed")
+WINDOWS = ("tight", "loose")
+
+# Solomon family letters of each layout
+FAMILIES = {"random": "R", "clustered": "C", "mixed": "RC"}
+
+# Vehicle capacity and range of the delivery window widths, as shares of the horizon
+CAPACITIES = {"tight": 200, "loose": 1000}
+WIDTHS = {"tight": (0.02, 0.08), "loose": (0.05, 0.3)}
+
+# Service time at the customers of each layout, mixed instances use the random one
+SERVICES = {"random": 10, "clustered": 90, "mixed": 10}
+
+# Number of customers of a cluster and spread of the customers around its center, as a share of the grid side
+CLUSTER_SIZE = 10
+CLUSTER_SPREAD = 0.03
+
+
+def instance_name(n_customers: int, layout: str, windows: str, seed: Optional[int], window_density: float = 1) -> str:
+    """Name of a generated instance, e.g. RC1_1000_0 for a mixed instance with tight windows and seed 0, followed by
+    the share of customers with a delivery window if some have none, e.g. RC1_1000_0_d0.5"""
+    name = f"{FAMILIES[layout]}{1 if windows == 'tight' else 2}_{n_customers}_{seed}"
+    return name if window_density == 1 else f"{name}_d{window_density:g}"
+
+
+def generate(n_customers: int, layout: str = "random", windows: str = "tight", seed: Optional[int] = None,
+             window_density: float = 1) -> tuple[int, int, np.ndarray]:
+    """Generate a Solomon-like instance
+        :arg n_customers: Number of customers
+        :arg layout: Placement of the customers, see LAYOUTS
+        :arg windows: Width of the delivery windows and size of the vehicles, see WINDOWS
+        :arg seed: (Optional) Seed of the random generator, the same seed always gives the same instance
+        :arg window_density: Share of the customers with a delivery window, the others can be served at any time
+        :return: Vehicle number, vehicle capacity and customer table (warehouse first) as a structured array, like
+            Dataset.load
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout {layout}, expected one of {LAYOUTS}")
+    if windows not in WINDOWS:
+        raise ValueError(f"Unknown windows {windows}, expected one of {WINDOWS}")
+
+    rng = np.random.default_rng(seed)
+    side = round(100 * np.sqrt(max(n_customers, 1) / 100))
+    depot = np.array([side // 2, side // 2])
+
+    # Step 1 : Place the customers, the first half of a mixed instance at random and the second half in clusters
+    n_random = {"random": n_customers, "clustered": 0, "mixed": n_customers // 2}[layout]
+    n_clustered = n_customers - n_random
+    centers = rng.uniform(0, side, (max(n_clustered // CLUSTER_SIZE, 1), 2))
+    coords = np.vstack((rng.uniform(0, side, (n_random, 2)),
+                        centers[rng.integers(len(centers), size=n_clustered)] +
+                        rng.normal(0, CLUSTER_SPREAD * side, (n_clustered, 2))))
+    coords = np.clip(np.rint(coords), 0, side).astype(np.int64)
+
+    # Step 2 : Demands, multiples of 10 in clusters like the c instances
+    demand = np.where(np.arange(n_customers) < n_random, rng.integers(1, 42, n_customers),
+                      10 * rng.integers(1, 5, n_customers))
+
+    # Step 3 : The horizon fits a vehicle serving as many customers as its capacity allows, one grid step apart
+    service = SERVICES[layout]
+    capacity = CAPACITIES[windows]
+    stops = capacity / demand.mean() if n_customers else 1
+    spacing = 2 * side / np.sqrt(max(n_customers, 1))
+    horizon = round(side + stops * (service + spacing))
+
+    # Step 4 : Windows centered anywhere the customer can be reached from and return to the warehouse in time
+    depot_distance = np.sqrt(((coords - depot) ** 2).sum(axis=1))
+    earliest = np.ceil(depot_distance)
+    latest = np.floor(horizon - depot_distance - service)
+    center = rng.uniform(earliest, np.maximum(latest, earliest))
+    half_width = rng.uniform(*WIDTHS[windows], n_customers) * horizon / 2
+    windowed = rng.random(n_customers) < window_density
+
+    ready_time = np.where(windowed, np.maximum(np.floor(center - half_width), 0), 0)
+    due_date = np.where(windowed, np.clip(np.ceil(center + half_width), earliest, np.maximum(latest, earliest)),
+                        np.maximum(latest, earliest))
+
+    customers = np.zeros(n_customers + 1, dtype=CUSTOMER_DTYPE)
+    customers["id"] = np.arange(n_customers + 1)
+    customers["x"][0], customers["y"][0] = depot
+    customers["due_date"][0] = horizon
+    customers["x"][1:], customers["y"][1:] = coords[:, 0], coords[:, 1]
+    customers["demand"][1:] = demand
+    customers["ready_time"][1:] = ready_time
+    customers["due_date"][1:] = due_date
+    customers["service"][1:] = service
+
+    return max(n_customers // 4, 1), capacity, customers
+
+
+def generate_vrp(n_customers: int, layout: str = "random", windows: str = "tight", seed: Optional[int] = None,
+                 window_density: float = 1, **kwargs) -> Vrp:
+    """Generate a Solomon-like instance as a Vrp, see generate
+        :arg kwargs: Additional arguments of Vrp, e.g. distance_dtype
+    """
+    vehicle_number, vehicle_capacity, customers = generate(n_customers, layout, windows, seed, window_density)
+    return Vrp.from_location_set(LocationSet.from_records(customers), vehicle_number, vehicle_capacity, **kwargs)
+
+
+def write(filename: str, name: str, vehicle_number: int, vehicle_capacity: int, customers: np.ndarray):
+    """Write an instance in the Solomon file format, readable by Dataset.load
+        :arg filename: Path of the instance file
+        :arg name: Name of the instance, on the first line
+        :arg vehicle_number: Number of vehicles
+        :arg vehicle_capacity: Capacity of the vehicles
+        :arg customers: Customer table (warehouse first), see Dataset.CUSTOMER_DTYPE
+    """
+    lines = [name, "", "VEHICLE", "NUMBER     CAPACITY", f"{vehicle_number:>5}{vehicle_capacity:>13}", "",
+             "CUSTOMER", "CUST NO.  XCOORD.   YCOORD.    DEMAND   READY TIME  DUE DATE   SERVICE   TIME", ""]
+    lines += [f"{row['id']:>5}{row['x']:>11}{row['y']:>11}{row['demand']:>11}{row['ready_time']:>11}"
+              f"{row['due_date']:>11}{row['service']:>11}" for row in customers]
+
+    with open(filename, "w") as file:
+        file.write("\n".join(lines) + "\n")
+
+
+def generate_files(directory: str, sizes: list[int], layouts: list[str], windows: list[str],
+                   seed: Optional[int] = None, window_density: float = 1) -> list[str]:
+    """Write one instance file per size, layout and window width, skipping the files that already exist
+        :arg directory: Directory of the instance files, created if needed
+        :return: Paths of the instance files
+    """
+    os.makedirs(directory, exist_ok=True)
+    filenames = []
+
+    for n_customers in sizes:
+        for layout in layouts:
+            for width in windows:
+                name = instance_name(n_customers, layout, width, seed, window_density)
+                filename = os.path.join(directory, f"{name}.txt")
+
+                # Instances are fully determined by their parameters, an existing file is up to date
+                if not os.path.exists(filename):
+                    write(filename, name, *generate(n_customers, layout, width, seed, window_density))
+
+                filenames.append(filename)
+
+    return filenames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate Solomon-format VRPTW instances")
+    parser.add_argument("--customers", nargs="+", type=int, required=True, help="Numbers of customers")
+    parser.add_argument("--layouts", nargs="+", default=["random"], choices=LAYOUTS, help="Customer layouts")
+    parser.add_argument("--windows", nargs="+", default=["tight"], choices=WINDOWS, help="Delivery window widths")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator")
+    parser.add_argument("--window-density", type=float, default=1, help="Share of customers with a delivery window")
+    parser.add_argument("--output", default="Dataset/generated", help="Directory of the instance files")
+    args = parser.parse_args()
+
+    for filename in generate_files(args.output, args.customers, args.layouts, args.windows, args.seed,
+                                   args.window_density):
+        print(filename)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import math
+import time
+from typing import Optional
+from src.Instance import Instance
+from src.Instrumentation import NULL_PROFILER, Profiler
+from src.Location import Location
+from src.Route import Route
+from src.Heuristics.Stopping import StoppingCriteria
+import numpy as np
+
+DESTROY_OPERATORS = ("random", "worst", "shaw", "route")
+REPAIR_OPERATORS = ("greedy", "regret2", "regret3")
+
+# Scores of an operator pair whose solution is a new best, improves on the current one, or is accepted anyway
+SCORES = (33, 9, 13)
+
+# Randomness of the worst and Shaw removals, higher values remove the worst or most related customers more often
+DETERMINISM = 4
+
+# Weights of the distance, ready time and demand differences in the relatedness of two customers (Shaw removal)
+RELATEDNESS = (9, 3, 2)
+
+# Regret of a customer which has fewer insertion options than the regret considers
+MISSING_OPTION = 1e9
+
+
+class Alns:
+    """Class improving VRP routes with Adaptive Large Neighborhood Search: each iteration removes some customers with
+    a destroy operator and inserts them back with a repair operator, the operators being chosen with weights adapted
+    to their past success. New solutions are accepted with simulated annealing.
+
+    Routes are never modified, changed routes are replaced by new ones, so solutions share their unchanged routes and
+    only the schedules of the changed routes are computed again."""
+
+    def __init__(self, instance: Instance, vehicle_capacity: int, rng: np.random.Generator, n_neighbors: int = 20,
+                 removal: tuple[float, float] = (0.05, 0.2)):
+        """
+            :arg instance: Instance the routes belong to
+            :arg vehicle_capacity: Capacity of the vehicles
+            :arg rng: Random generator
+            :arg n_neighbors: Number of nearest neighbors of each customer, a customer is only inserted into the
+                routes serving one of its neighbors or into a new route
+            :arg removal: Minimum and maximum share of the customers removed by each iteration
+        """
+        self.instance = instance
+        self.vehicle_capacity = vehicle_capacity
+        self.rng = rng
+        self.n_customers = len(instance) - 1
+        self.removal = (max(1, round(removal[0] * self.n_customers)),
+                        max(1, min(self.n_customers, round(removal[1] * self.n_customers))))
+        self.neighbors = instance.neighbor_lists(min(n_neighbors, self.n_customers - 1)).tolist() \
+            if self.n_customers > 1 else [[] for _ in range(len(instance))]
+        # Customers having each customer among their neighbors, whose insertion options change with its route
+        self.neighbor_of = [set() for _ in range(len(instance))]
+        for customer in range(1, len(instance)):
+            for neighbor in self.neighbors[customer]:
+                self.neighbor_of[neighbor].add(customer)
+
+        self._destroy = [getattr(self, f"_{operator}_removal") for operator in DESTROY_OPERATORS]
+        self._regret = [1, 2, 3]
+
+        # Cost of serving each customer in a route of its own, inf if that is infeasible
+        distances = np.asarray(instance.distances, dtype=np.float64)
+        departure = np.maximum(distances[0], instance.ready_time) + instance.service
+        self.single_cost = np.where((distances[0] <= instance.due_date) &
+                                    (departure + distances[:, 0] <= instance.due_date[0]) &
+                                    (instance.demand <= vehicle_capacity), departure + distances[:, 0], np.inf)
+
+        # Scales of the relatedness terms
+        self._distances = distances
+        self._scales = (distances.max() or 1, np.ptp(instance.ready_time) or 1, np.ptp(instance.demand) or 1)
+
+    def run(self, routes: list[Route], max_iter: Optional[int], temperature: float = 0.05, cooling: float = 0.9995,
+            segment: int = 100, reaction: float = 0.1, stopping: Optional[StoppingCriteria] = None,
+            profiler: Profiler = NULL_PROFILER) -> tuple[list[Route], list[float]]:
+        """Improve routes, return the best routes found and the best cost after each iteration
+            :arg routes: Feasible routes to start from, they are not modified
+            :arg max_iter: (Optional) Maximum number of iterations, only the stopping criteria end the run if None
+            :arg temperature: Initial temperature, as the relative cost increase accepted with probability 1/2
+            :arg cooling: Factor applied to the temperature after each iteration
+            :arg segment: Number of iterations between two updates of the operator weights
+            :arg reaction: Weight of the last segment's scores in the operator weights
+            :arg stopping: (Optional) Criteria ending the run early, e.g. a time budget
+            :arg profiler: Profiler timing the destroy and repair phases and counting the accepted solutions
+        """
+        stopping = stopping or StoppingCriteria()
+        if max_iter is None and not stopping.bounded():
+            raise ValueError("Either max_iter or a stopping criterion is required")
+
+        current = [route for route in routes if route.customers]
+        current_cost = best_cost = self.cost(current)
+        best = current
+        history = []
+
+        temperature = -temperature * current_cost / math.log(0.5) if current_cost else 0
+        weights = [np.ones(len(DESTROY_OPERATORS)), np.ones(len(REPAIR_OPERATORS))]
+        scores = [np.zeros(len(DESTROY_OPERATORS)), np.zeros(len(REPAIR_OPERATORS))]
+        uses = [np.zeros(len(DESTROY_OPERATORS)), np.zeros(len(REPAIR_OPERATORS))]
+
+        start = time.perf_counter()
+        limit = stopping.time_limit(start)
+        iteration = 0
+
+        while (max_iter is None or iteration < max_iter) and self.n_customers:
+            iteration_start = time.perf_counter()
+
+            # Step 1 : Choose the operators with a roulette wheel over their weights
+            chosen = [self.rng.choice(len(w), p=w / w.sum()) for w in weights]
+            n_removed = self.rng.integers(self.removal[0], self.removal[1] + 1)
+
+            # Step 2 : Destroy and repair the current solution
+            with profiler.phase("destroy"):
+                candidate, removed = self._destroy[chosen[0]](current, n_removed)
+            with profiler.phase("repair"):
+                candidate = self._insert(candidate, removed, self._regret[chosen[1]])
+            candidate_cost = self.cost(candidate)
+
+            # Step 3 : Accept the new solution with simulated annealing, and score the operators
+            score = 0
+            if candidate_cost < best_cost - 1e-9:
+                best, best_cost = candidate, candidate_cost
+                score = SCORES[0]
+            if candidate_cost < current_cost - 1e-9:
+                score = score or SCORES[1]
+            if candidate_cost < current_cost - 1e-9 or \
+                    (temperature > 0 and self.rng.random() < math.exp((current_cost - candidate_cost) / temperature)):
+                current, current_cost = candidate, candidate_cost
+                score = score or SCORES[2]
+                profiler.count("accepted")
+
+            for k in range(2):
+                scores[k][chosen[k]] += score
+                uses[k][chosen[k]] += 1
+
+            # Step 4 : Adapt the weights to the scores of the last segment
+            iteration += 1
+            if iteration % segment == 0:
+                for k in range(2):
+                    used = uses[k] > 0
+                    weights[k][used] = (1 - reaction) * weights[k][used] + reaction * scores[k][used] / uses[k][used]
+                    weights[k] = np.maximum(weights[k], 1e-3)
+                    scores[k][:], uses[k][:] = 0, 0
+
+            temperature *= cooling
+            history.append(best_cost)
+
+            now = time.perf_counter()
+            if stopping.reason(history, now, limit, now - iteration_start):
+                break
+
+        return best, history
+
+    def cost(self, routes: list[Route]) -> float:
+        return sum(route.cost() for route in routes)
+
+    # Destroy operators, each returning the remaining routes and the removed customers
+    def _remove(self, routes: list[Route], removed: set[int]) -> tuple[list[Route], list[Location]]:
+        """Remove customers from routes, the routes serving none of them are kept as they are"""
+        remaining = []
+        for route in routes:
+            if any(customer.index in removed for customer in route.customers):
+                customers = [customer for customer in route.customers if customer.index not in removed]
+                if customers:
+                    remaining.append(Route(route.warehouse, customers))
+            else:
+                remaining.append(route)
+
+        return remaining, [self.instance.locations[index] for index in removed]
+
+    def _pick(self, n_items: int) -> int:
+        """Pick a position in a list sorted from the most to the least desirable item, favoring the first ones"""
+        return int(self.rng.random() ** DETERMINISM * n_items)
+
+    def _random_removal(self, routes: list[Route], n_removed: int) -> tuple[list[Route], list[Location]]:
+        """Remove random customers"""
+        return self._remove(routes, set((self.rng.choice(self.n_customers, n_removed, replace=False) + 1).tolist()))
+
+    def _worst_removal(self, routes: list[Route], n_removed: int) -> tuple[list[Route], list[Location]]:
+        """Remove customers whose removal saves the most, with some randomness"""
+        savings = [(-route.removal_cost(position), customer.index) for route in routes
+                   for position, customer in enumerate(route.customers)]
+        savings.sort(reverse=True)
+
+        removed = set()
+        while len(removed) < n_removed:
+            removed.add(savings.pop(self._pick(len(savings)))[1])
+
+        return self._remove(routes, removed)
+
+    def _shaw_removal(self, routes: list[Route], n_removed: int) -> tuple[list[Route], list[Location]]:
+        """Remove related customers: close to each other, with similar ready times and demands"""
+        ready_time, demand = self.instance.ready_time, self.instance.demand
+        remaining = np.arange(1, self.n_customers + 1)
+        seed = self.rng.integers(1, self.n_customers + 1)
+        removed = [seed]
+        remaining = remaining[remaining != seed]
+
+        while len(removed) < n_removed:
+            reference = removed[self.rng.integers(len(removed))]
+            relatedness = RELATEDNESS[0] * self._distances[reference, remaining] / self._scales[0] + \
+                RELATEDNESS[1] * np.abs(ready_time[reference] - ready_time[remaining]) / self._scales[1] + \
+                RELATEDNESS[2] * np.abs(demand[reference] - demand[remaining]) / self._scales[2]
+            chosen = np.argsort(relatedness, kind="stable")[self._pick(len(remaining))]
+            removed.append(remaining[chosen].item())
+            remaining = np.delete(remaining, chosen)
+
+        return self._remove(routes, set(removed))
+
+    def _route_removal(self, routes: list[Route], n_removed: int) -> tuple[list[Route], list[Location]]:
+        """Remove whole routes, short routes being more likely removed, until enough customers are removed"""
+        sizes = np.array([len(route.customers) for route in routes], dtype=np.float64)
+        order = self.rng.choice(len(routes), len(routes), replace=False, p=(1 / sizes) / (1 / sizes).sum())
+
+        removed = set()
+        for r in order.tolist():
+            if len(removed) >= n_removed:
+                break
+            removed.update(customer.index for customer in routes[r].customers)
+
+        return self._remove(routes, removed)
+
+    # Repair
+    def _best_insertion(self, route: Route, customer: Location) -> Optional[tuple[float, int]]:
+        """Get the cheapest feasible insertion of a customer into a route, as (cost, position)"""
+        best = None
+        for position in range(len(route.customers) + 1):
+            cost = route.insertion_cost(customer, position, self.vehicle_capacity)
+            if cost is not None and (best is None or cost < best[0]):
+                best = (cost, position)
+        return best
+
+    def _insert(self, routes: list[Route], customers: list[Location], regret: int) -> list[Route]:
+        """Insert customers into routes with regret-k insertion: the customer whose k cheapest options differ the most
+        from its cheapest one is inserted first, at its cheapest position. Regret-1 is greedy insertion, the customer
+        with the cheapest insertion is inserted first
+            :arg routes: Routes, replaced by new routes when changed
+            :arg customers: Customers to insert
+            :arg regret: Number of options of the regret
+        """
+        routes = list(routes)
+        route_of = {customer.index: r for r, route in enumerate(routes) for customer in route.customers}
+        pending = {customer.index: customer for customer in customers}
+
+        # Cheapest insertion of each pending customer into each route serving one of its neighbors
+        options: dict[int, dict[int, tuple[float, int]]] = {}
+        for index, customer in pending.items():
+            candidates = {route_of[neighbor] for neighbor in self.neighbors[index] if neighbor in route_of}
+            options[index] = {}
+            for r in candidates:
+                insertion = self._best_insertion(routes[r], customer)
+                if insertion is not None:
+                    options[index][r] = insertion
+
+        while pending:
+            # Step 1 : Choose the customer to insert
+            chosen, chosen_key = None, None
+            for index in pending:
+                costs = sorted([cost for cost, _ in options[index].values()] + [self.single_cost[index]])
+                key = -costs[0] if regret == 1 else \
+                    sum(costs[k] - costs[0] if k < len(costs) else MISSING_OPTION for k in range(1, regret))
+                if chosen_key is None or key > chosen_key or (key == chosen_key and costs[0] < chosen_cost):
+                    chosen, chosen_key, chosen_cost = index, key, costs[0]
+
+            customer = pending.pop(chosen)
+            choices = options.pop(chosen)
+
+            # Step 2 : Insert it at its cheapest position, or in a new route if that is cheaper or the only option
+            r, position = min(((cost, r, position) for r, (cost, position) in choices.items()),
+                              default=(np.inf, -1, 0))[1:]
+            if r < 0 or self.single_cost[chosen] < choices[r][0]:
+                r = len(routes)
+                routes.append(Route(self.instance.warehouse, [customer]))
+            else:
+                route = routes[r]
+                routes[r] = Route(route.warehouse, route.customers[:position] + [customer] +
+                                  route.customers[position:])
+            route_of[chosen] = r
+
+            # Step 3 : Update the options of the customers the changed route is an option for
+            for index, other in pending.items():
+                if r in options[index] or index in self.neighbor_of[chosen]:
+                    insertion = self._best_insertion(routes[r], other)
+                    if insertion is None:
+                        options[index].pop(r, None)
+                    else:
+                        options[index][r] = insertion
+
+        return routes
@@ -1,75 +1,453 @@
-from typing import Optional
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Optional
+from src.Instance import Instance
+from src.LocationSet import LocationSet
+from src.Heuristics.Pheromones import PheromoneStore
+from src.Instrumentation import NULL_PROFILER, Profiler
 from src.Route import Route
-from src.Location import Location
+import src.Solution as Solution
 import numpy as np
 
-def construct_solution(alpha: int, beta: int, customers: list[Location], warehouse: Location, vehicle_capacity: int,
-                       pheromones: dict) -> list[Route]:
-    solution = []
-    unvisited = customers
+# Pheromone update rules
+VARIANTS = ("aco", "acs", "mmas")
 
-    # Generate vehicle routes
-    while unvisited:
-        new_route = Route(warehouse, [])
+# Probability of the Max-Min Ant System to construct the best solution once converged, sets the ratio of its bounds
+MMAS_P_BEST = 0.05
 
-        total_route_demand = 0
-        current = warehouse
-        current_cost = 0
+# Solutions are encoded as giant tours: the customer indices of every route in visiting order, routes being separated
+# by the warehouse index (0). Tours of a batch are padded with 0 to a common length of 2n + 1.
 
-        # Assign customers to vehicles
-        while total_route_demand < vehicle_capacity:
-            next_loc = _select_next_location(current, unvisited, current_cost,
-                                             vehicle_capacity - total_route_demand, alpha, beta,
-                                             pheromones)
 
-            if not next_loc:
-                break
+def construct_solutions(instance: Instance, pheromones: PheromoneStore, n_ants: int, alpha: int, beta: int,
+                        vehicle_capacity: int, rng: np.random.Generator,
+                        n_candidates: Optional[int] = None,
+                        profiler: Profiler = NULL_PROFILER) -> tuple[np.ndarray, np.ndarray]:
+    """Construct the solutions of n_ants ants, advancing all ants in lockstep
+        :arg instance: Instance to construct solutions for
+        :arg pheromones: Pheromone levels, indexed like the distance matrix of the instance
+        :arg n_ants: Number of ants to use
+        :arg alpha: Alpha parameter, controls the influence of pheromones
+        :arg beta: Beta parameter, controls the influence of cost
+        :arg vehicle_capacity: Capacity of the vehicles
+        :arg rng: Random generator used for the roulette-wheel selection
+        :arg n_candidates: (Optional) Number of nearest customers which can follow the current location an ant
+            chooses from, see Instance.feasible_neighbor_lists. The ant only chooses from all customers when none of
+            them is deliverable
+        :arg profiler: Profiler timing the feasibility and selection phases and counting the evaluated candidates
+        :return: Giant tours of the ants (n_ants, 2n + 1) and total cost of each tour (n_ants,), see
+            Solution.evaluate_tours
+    """
+    n = len(instance)
+    distances, demand = instance.distances, instance.demand
+    ready_time, due_date, service = instance.ready_time, instance.due_date, instance.service
 
-            new_route.customers.append(next_loc)
-            total_route_demand += next_loc.demand
-            current_cost = current.cost_to(next_loc, current_cost)
-            unvisited.remove(next_loc)
-            current = next_loc
+    # A new route must always be able to serve at least one customer, otherwise the ants would never finish
+    unreachable = (distances[0, 1:] > due_date[1:]) | (demand[1:] > vehicle_capacity)
+    if unreachable.any():
+        raise ValueError(f"Customers at indices {np.flatnonzero(unreachable) + 1} cannot be served by any route")
 
-        solution.append(new_route)
+    candidates = instance.feasible_neighbor_lists(n_candidates) if n_candidates else None
+    # The levels of the candidate edges are read directly if the store holds exactly these edges
+    stored = candidates is not None and pheromones.candidates is not None and \
+        np.array_equal(pheromones.candidates, candidates)
 
-    return solution
+    tours = np.zeros((n_ants, 2 * n + 1), dtype=np.int32)
+    position = np.ones(n_ants, dtype=np.int64)
+    unvisited = np.ones((n_ants, n), dtype=bool)
+    unvisited[:, 0] = False
 
+    # State of the route each ant is currently building
+    current = np.zeros(n_ants, dtype=np.int64)
+    current_cost = np.zeros(n_ants)
+    capacity = np.full(n_ants, vehicle_capacity, dtype=np.int64)
 
-def _select_next_location(current: Location, unvisited: list[Location], current_cost: int,
-                          capacity: int, alpha: int, beta: int, pheromones: dict) -> Optional[
-    Location]:
-    """Select the next location for the ACO heuristic
-        :arg current: Current location
-        :arg unvisited: List of unvisited locations
-        :arg current_cost: Cost already incurred on this route
-        :arg capacity: Remaining capacity of the vehicle
-        :arg alpha: Alpha parameter, controls the influence of pheromones
-        :arg beta: Beta parameter, controls the influence of cost
-        :arg pheromones: Pheromone matrix
+    def evaluate(ants: np.ndarray, columns: Optional[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+        """Departure times at some locations from the current location of some ants, and whether they are
+        deliverable. The locations are columns[i] for ant i, or every location if columns is None"""
+        profiler.count("candidates_evaluated", len(ants) * (len(distances) if columns is None else columns.shape[1]))
+
+        if columns is None:
+            arrival = current_cost[ants, None] + distances[current[ants]]
+            departure = np.maximum(arrival, ready_time) + service
+            deliverable = unvisited[ants] & (arrival <= due_date) & (demand <= capacity[ants, None])
+        else:
+            arrival = current_cost[ants, None] + distances[current[ants, None], columns]
+            departure = np.maximum(arrival, ready_time[columns]) + service[columns]
+            deliverable = unvisited[ants[:, None], columns] & (arrival <= due_date[columns]) & \
+                (demand[columns] <= capacity[ants, None])
+
+        return departure, deliverable
+
+    def weights(start: np.ndarray, end: Optional[np.ndarray]) -> np.ndarray:
+        """Pheromone weights of the edges from start to end, or to every location if end is None"""
+        if end is None:
+            levels = pheromones.rows(start)
+        else:
+            levels = pheromones.stored_rows(start) if stored else pheromones.get(start[:, None], end)
+        return levels ** alpha if alpha != 1 else levels
+
+    def move(ants: np.ndarray, columns: Optional[np.ndarray], departure: np.ndarray, deliverable: np.ndarray):
+        """Move each ant to one of its deliverable locations, selected with a roulette wheel"""
+        with np.errstate(divide="ignore"):
+            scores = weights(current[ants], columns) * (1 / departure) ** beta + 1e-6
+        scores = np.where(deliverable, scores, 0)
+
+        cumulative = np.cumsum(scores, axis=1)
+        total = cumulative[:, -1]
+        draw = np.minimum(rng.random(total.size) * total, np.nextafter(total, 0))
+        selected = np.argmax(cumulative > draw[:, None], axis=1)
+        next_loc = selected if columns is None else columns[np.arange(len(ants)), selected]
+
+        tours[ants, position[ants]] = next_loc
+        position[ants] += 1
+        current_cost[ants] = departure[np.arange(len(ants)), selected]
+        capacity[ants] -= demand[next_loc]
+        unvisited[ants, next_loc] = False
+        current[ants] = next_loc
+
+    # Ants which still have customers to visit
+    active = np.arange(n_ants)
+
+    while active.size:
+        # Ants with a deliverable candidate choose among their candidates only
+        scanning = active
+        if candidates is not None:
+            columns = candidates[current[active]]
+            with profiler.phase("feasibility"):
+                departure, deliverable = evaluate(active, columns)
+            narrowed = deliverable.any(axis=1)
+            with profiler.phase("selection"):
+                move(active[narrowed], columns[narrowed], departure[narrowed], deliverable[narrowed])
+            scanning = active[~narrowed]
+
+        # Arrival and departure times at every location from the current location of the other ants, the unvisited
+        # locations whose delivery window is reachable and whose demand fits the remaining capacity are deliverable
+        with profiler.phase("feasibility"):
+            departure, deliverable = evaluate(scanning, None)
+        moving = deliverable.any(axis=1)
+        with profiler.phase("selection"):
+            move(scanning[moving], None, departure[moving], deliverable[moving])
+
+        # Ants without any deliverable location return to the warehouse and start a new route
+        ants = scanning[~moving]
+        position[ants] += 1
+        current[ants] = 0
+        current_cost[ants] = 0
+        capacity[ants] = vehicle_capacity
+
+        active = active[unvisited[active].any(axis=1) | (current[active] != 0)]
+
+    profiler.count("ants_built", n_ants)
+
+    # The departure times above only decide where the ants can go, the tours are costed like any other batch
+    with profiler.phase("evaluation"):
+        costs = Solution.evaluate_tours(instance, tours).costs
+
+    return tours, costs
+
+
+def iteration_seeds(seed_sequence: np.random.SeedSequence, iteration: int, n_chunks: int) -> list[
+    np.random.SeedSequence]:
+    """Derive the seeds of the chunks of ants of an iteration, independently of the process they run in
+        :arg seed_sequence: Seed sequence of the whole run
+        :arg iteration: Index of the iteration
+        :arg n_chunks: Number of chunks the ants of the iteration are split into
     """
-    probabilities = {}
-    reachable_delivery_windows = current.find_deliverable(unvisited, capacity, current_cost)
+    # The spawn key of the run tells apart the runs spawned from the same seed, e.g. the colonies of an island model
+    return [np.random.SeedSequence(seed_sequence.entropy, spawn_key=seed_sequence.spawn_key + (iteration, chunk))
+            for chunk in range(n_chunks)]
+
+
+# Instance held by each worker process of an AntPool, set once by the pool initializer
+_worker_instance: Optional[Instance] = None
+_worker_shm: Optional[SharedMemory] = None
+
+
+def _init_worker(shm_name: str, shape: tuple, dtype: np.dtype, location_set: LocationSet):
+    global _worker_instance, _worker_shm
+
+    # The distance matrix is attached from shared memory instead of being copied into every worker
+    _worker_shm = SharedMemory(name=shm_name)
+    distances = np.ndarray(shape, dtype=dtype, buffer=_worker_shm.buf)
+    _worker_instance = Instance.from_location_set(location_set, distances)
+
+
+def _construct_chunk(pheromones: PheromoneStore, n_ants: int, alpha: int, beta: int, vehicle_capacity: int,
+                     seed: np.random.SeedSequence, n_candidates: Optional[int]) -> tuple[np.ndarray, np.ndarray]:
+    return construct_solutions(_worker_instance, pheromones, n_ants, alpha, beta, vehicle_capacity,
+                               np.random.default_rng(seed), n_candidates)
+
+
+class AntPool:
+    """Process pool spreading the ants of each iteration, or whole colonies, across several workers.
+
+    Each worker holds the instance once, only the current pheromone matrix is sent to the workers every iteration."""
+
+    def __init__(self, instance: Instance, n_workers: int):
+        """
+            :arg instance: Instance to construct solutions for
+            :arg n_workers: Number of worker processes
+        """
+        self.n_workers = n_workers
+
+        self._shm = SharedMemory(create=True, size=max(instance.distances.nbytes, 1))
+        np.ndarray(instance.distances.shape, dtype=instance.distances.dtype, buffer=self._shm.buf)[:] = \
+            instance.distances
+
+        self._executor = ProcessPoolExecutor(n_workers, initializer=_init_worker,
+                                             initargs=(self._shm.name, instance.distances.shape,
+                                                       instance.distances.dtype, instance.location_set))
+
+    def construct_solutions(self, pheromones: PheromoneStore, n_ants: int, alpha: int, beta: int, vehicle_capacity: int,
+                            seeds: list[np.random.SeedSequence],
+                            n_candidates: Optional[int] = None) -> tuple[np.ndarray, np.ndarray]:
+        """Construct the solutions of n_ants ants, split into one chunk per seed
+            :arg seeds: Seed of each chunk of ants, see iteration_seeds
+            :arg n_candidates: (Optional) Number of nearest customers the ants choose from first
+            :return: Giant tours of the ants and total cost of each tour, in chunk order
+        """
+        chunks = [len(chunk) for chunk in np.array_split(np.arange(n_ants), len(seeds))]
+
+        futures = [self._executor.submit(_construct_chunk, pheromones, chunk, alpha, beta, vehicle_capacity, seed,
+                                          n_candidates)
+                   for chunk, seed in zip(chunks, seeds) if chunk]
+        results = [future.result() for future in futures]
+
+        return np.concatenate([tours for tours, _ in results]), np.concatenate([costs for _, costs in results])
+
+    def run_colonies(self, colonies: list["Colony"], n_iter: int, n_ants: int, vehicle_capacity: int) -> list[
+        "Colony"]:
+        """Run n_iter iterations of several colonies, each colony in a single worker
+            :return: The updated colonies, in the same order
+        """
+        futures = [self._executor.submit(_run_colony, colony, n_iter, n_ants, vehicle_capacity)
+                   for colony in colonies]
+        return [future.result() for future in futures]
+
+    def close(self):
+        self._executor.shutdown()
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self) -> "AntPool":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def tour_edges(tours: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Get the edges travelled by a batch of giant tours
+        :arg tours: Giant tours (m, length)
+        :return: Start and end location indices of every edge and the index of the tour it belongs to
+    """
+    start, end = tours[:, :-1], tours[:, 1:]
+    # Consecutive warehouse indices are route separators or padding, not edges
+    travelled = (start != 0) | (end != 0)
+    return start[travelled], end[travelled], np.nonzero(travelled)[0]
+
+
+def tour_diversity(tours: np.ndarray) -> float:
+    """Measure how different a batch of giant tours are: the share of distinct edges among all the edges travelled,
+    1 / len(tours) if all tours are the same and 1 if they have no edge in common"""
+    start, end, _ = tour_edges(tours)
+    return len(np.unique(start.astype(np.int64) * (max(tours.max(), 0) + 1) + end)) / max(len(start), 1)
+
+
+def tour_to_routes(tour: np.ndarray, instance: Instance) -> list[Route]:
+    """Convert a giant tour into a list of routes
+        :arg tour: Giant tour
+        :arg instance: Instance the tour was constructed for
+    """
+    routes = []
+    customers = []
+
+    for index in tour.tolist():
+        if index:
+            customers.append(instance.locations[index])
+        elif customers:
+            routes.append(Route(instance.warehouse, customers))
+            customers = []
+
+    return routes
+
+
+def routes_to_tour(routes: list[Route], length: int) -> np.ndarray:
+    """Convert a list of routes into a giant tour
+        :arg routes: Routes whose locations belong to an instance
+        :arg length: Length of the tour, padded with 0
+    """
+    tour = np.zeros(length, dtype=np.int32)
+    indices = [index for route in routes for index in [0] + [customer.index for customer in route.customers]]
+    tour[:len(indices)] = indices
+    return tour
+
+
+def update_pheromones_aco(pheromones: PheromoneStore, tours: np.ndarray, costs: np.ndarray, rho: float):
+    """Update the pheromone levels based on the tours taken by all ants
+        :arg pheromones: Pheromone levels
+        :arg tours: Giant tours taken
+        :arg costs: Total cost of each tour
+        :arg rho: Rho parameter, controls the pheromone evaporation rate
+    """
+    # Evaporate pheromones
+    pheromones.evaporate(rho)
+
+    # Add pheromones to the edges taken
+    start, end, ant = tour_edges(tours)
+    pheromones.add(start, end, 1 / costs[ant])
+
+
+def update_pheromones_acs(pheromones: PheromoneStore, tours: np.ndarray, costs: np.ndarray, rho: float,
+                          initial_pheromone: float):
+    """Update the pheromone levels based on the best tour of the iteration
+        :arg pheromones: Pheromone levels
+        :arg tours: Giant tours taken
+        :arg costs: Total cost of each tour
+        :arg rho: Rho parameter, controls the pheromone evaporation rate
+        :arg initial_pheromone: Pheromone level the store was initialized with
+    """
+    # Evaporate pheromones towards a share of the initial level
+    pheromones.evaporate(rho, 1 / (pheromones.size - 1) * initial_pheromone)
+
+    # Identify the best solution in this iteration
+    best = np.argmin(costs)
+
+    # Intensify pheromones for the edges of the best solution
+    start, end, _ = tour_edges(tours[best:best + 1])
+    pheromones.set(start, end, (1 - rho) * pheromones.get(start, end) + rho / costs[best])
+
+
+def mmas_bounds(best_cost: float, rho: float, n_customers: int) -> tuple[float, float]:
+    """Get the pheromone bounds of the Max-Min Ant System
+        :arg best_cost: Total cost of the best solution found so far
+        :arg rho: Rho parameter, controls the pheromone evaporation rate
+        :arg n_customers: Number of customers
+    """
+    upper = 1 / (rho * best_cost)
+    root = MMAS_P_BEST ** (1 / n_customers)
+    lower = upper * (1 - root) / (max(n_customers / 2 - 1, 1) * root)
+    return min(lower, upper), upper
+
+
+def update_pheromones_mmas(pheromones: PheromoneStore, tours: np.ndarray, costs: np.ndarray, rho: float,
+                           best_cost: float):
+    """Update the pheromone levels based on the best tour of the iteration, within the Max-Min Ant System bounds
+        :arg pheromones: Pheromone levels
+        :arg tours: Giant tours taken
+        :arg costs: Total cost of each tour
+        :arg rho: Rho parameter, controls the pheromone evaporation rate
+        :arg best_cost: Total cost of the best solution found so far, including this iteration
+    """
+    # The bounds follow the best solution, every level is kept within them from now on
+    pheromones.bounds = mmas_bounds(best_cost, rho, pheromones.size - 1)
+
+    # Evaporate pheromones
+    pheromones.evaporate(rho)
+
+    # Only the best solution of the iteration deposits pheromones
+    best = np.argmin(costs)
+    start, end, _ = tour_edges(tours[best:best + 1])
+    pheromones.add(start, end, 1 / costs[best])
+
+
+def reinforce_pheromones(variant: str, pheromones: PheromoneStore, tour: np.ndarray, cost: float, rho: float):
+    """Reinforce the edges of a single tour with the deposit rule of a variant, without evaporating
+        :arg variant: Pheromone update rule to use, see VARIANTS
+        :arg pheromones: Pheromone levels
+        :arg tour: Giant tour to reinforce
+        :arg cost: Total cost of the tour
+        :arg rho: Rho parameter, controls the pheromone evaporation rate
+    """
+    start, end, _ = tour_edges(tour[None, :])
+
+    if variant == "acs":
+        pheromones.set(start, end, (1 - rho) * pheromones.get(start, end) + rho / cost)
+    else:
+        pheromones.add(start, end, 1 / cost)
+
+
+@dataclass
+class Colony:
+    """Class for storing the state of an ant colony: its parameters, pheromone levels and best solution so far."""
+    variant: str
+    alpha: int
+    beta: int
+    rho: float
+    pheromones: PheromoneStore
+    initial_pheromone: float
+    seed_sequence: np.random.SeedSequence
+    # Number of nearest customers the ants choose from first, all customers if None
+    n_candidates: Optional[int] = None
+    best_cost: float = float("inf")
+    best_solution: Optional[np.ndarray] = None
+    best_cost_history: list[float] = field(default_factory=list)
+    iteration: int = 0
+
+    def iterate(self, instance: Instance, n_ants: int, vehicle_capacity: int, pool: Optional[AntPool] = None,
+                daemon: Optional[Callable[[np.ndarray, np.ndarray], None]] = None,
+                profiler: Profiler = NULL_PROFILER) -> tuple[np.ndarray, np.ndarray]:
+        """Run one iteration: construct the solutions of all ants, update the pheromones and the best solution
+            :arg instance: Instance to construct solutions for
+            :arg n_ants: Number of ants to use
+            :arg vehicle_capacity: Capacity of the vehicles
+            :arg pool: (Optional) Pool to generate the solutions concurrently with
+            :arg daemon: (Optional) Daemon action improving the tours and costs in place before the pheromone update,
+                e.g. LocalSearch.Daemon
+            :arg profiler: Profiler timing the phases of the iteration and recording an event per iteration, the
+                construction phases of the ants are only detailed without a pool
+            :return: Giant tours of the ants and total cost of each tour
+        """
+        start = time.perf_counter()
+
+        with profiler.phase("construction"):
+            if pool:
+                seeds = iteration_seeds(self.seed_sequence, self.iteration, pool.n_workers)
+                tours, costs = pool.construct_solutions(self.pheromones, n_ants, self.alpha, self.beta,
+                                                        vehicle_capacity, seeds, self.n_candidates)
+            else:
+                rng = np.random.default_rng(iteration_seeds(self.seed_sequence, self.iteration, 1)[0])
+                tours, costs = construct_solutions(instance, self.pheromones, n_ants, self.alpha, self.beta,
+                                                   vehicle_capacity, rng, self.n_candidates, profiler)
+        profiler.count("cost_evaluations", len(costs))
+
+        if daemon:
+            with profiler.phase("daemon"):
+                daemon(tours, costs)
+
+        with profiler.phase("pheromone_update"):
+            if self.variant == "acs":
+                update_pheromones_acs(self.pheromones, tours, costs, self.rho, self.initial_pheromone)
+            elif self.variant == "mmas":
+                update_pheromones_mmas(self.pheromones, tours, costs, self.rho,
+                                       min(self.best_cost, costs.min().item()))
+            else:
+                update_pheromones_aco(self.pheromones, tours, costs, self.rho)
+
+        # Find the best solution
+        best = np.argmin(costs)
+
+        if costs[best] < self.best_cost:
+            self.best_cost = costs[best].item()
+            self.best_solution = tours[best].copy()
 
-    # If no reachable delivery windows are found
-    if not reachable_delivery_windows:
-        return None
+        self.best_cost_history.append(self.best_cost)
 
-    # Calculate the probabilities of selecting each location
-    for next_loc in reachable_delivery_windows:
-        # Amount of pheromone on the edge between the current location and next_loc
-        pheromone = pheromones[(current, next_loc)]
+        if profiler.enabled:
+            profiler.iteration(iteration=self.iteration, best_cost=self.best_cost,
+                               iteration_best_cost=costs[best].item(), mean_cost=costs.mean().item(),
+                               iteration_time=time.perf_counter() - start, diversity=tour_diversity(tours))
 
-        # Cost to deliver to next_loc
-        cost = current.cost_to(next_loc, current_cost)
+        self.iteration += 1
 
-        # Desirability of next_loc
-        desirability = (1 / cost)
+        return tours, costs
 
-        probabilities[next_loc] = (pheromone ** alpha) * (desirability ** beta) + 1e-6
 
-    # Normalize the probabilities
-    total = sum(probabilities.values())
-    probabilities = {loc: prob / total for loc, prob in probabilities.items()}
+def _run_colony(colony: Colony, n_iter: int, n_ants: int, vehicle_capacity: int) -> Colony:
+    for _ in range(n_iter):
+        colony.iterate(_worker_instance, n_ants, vehicle_capacity)
 
-    return np.random.choice(list(probabilities.keys()), p=list(probabilities.values()))
+    return colony
@@ -0,0 +1,106 @@
+import json
+import os
+from contextlib import suppress
+from glob import escape, glob
+from src.Instance import Instance
+from src.Heuristics.AntColony import Colony
+from src.Heuristics.Pheromones import PheromoneStore
+import numpy as np
+
+# Name of the state file of a checkpoint directory, the arrays are stored next to it
+STATE_FILE = "state.json"
+
+
+def _save_array(directory: str, name: str, array: np.ndarray) -> str:
+    """Write an array as a .npy file through a temporary file
+        :return: Name of the file in the directory
+    """
+    filename = f"{name}.npy"
+    temporary = os.path.join(directory, f"{filename}.{os.getpid()}.tmp")
+    with open(temporary, "wb") as file:
+        np.save(file, array, allow_pickle=False)
+    os.replace(temporary, os.path.join(directory, filename))
+    return filename
+
+
+def save_checkpoint(directory: str, colony: Colony, instance: Instance, params: dict):
+    """Save the state of a colony to a checkpoint directory, replacing the previous checkpoint.
+
+    Arrays are written as .npy files named after the iteration, then the state file referring to them replaces the
+    previous one atomically, so a run interrupted while saving leaves the previous checkpoint intact.
+        :arg directory: Checkpoint directory, created if needed
+        :arg colony: Colony to save
+        :arg instance: Instance the colony runs on
+        :arg params: Parameters of the run, e.g. the number of ants, stored with the state as JSON
+    """
+    os.makedirs(directory, exist_ok=True)
+    store = colony.pheromones
+    tag = f"{colony.iteration:08d}"
+
+    arrays = {"pheromones": _save_array(directory, f"pheromones-{tag}", store.raw)}
+    if store.candidates is not None:
+        arrays["candidates"] = _save_array(directory, f"candidates-{tag}", store.candidates)
+    if colony.best_solution is not None:
+        arrays["best_solution"] = _save_array(directory, f"best_solution-{tag}", colony.best_solution)
+
+    seed_sequence = colony.seed_sequence
+    state = {
+        "instance": instance.fingerprint(),
+        "params": params,
+        "colony": {"variant": colony.variant, "alpha": colony.alpha, "beta": colony.beta, "rho": colony.rho,
+                   "initial_pheromone": colony.initial_pheromone, "n_candidates": colony.n_candidates,
+                   "best_cost": colony.best_cost, "best_cost_history": colony.best_cost_history,
+                   "iteration": colony.iteration},
+        "seed_sequence": {"entropy": seed_sequence.entropy, "spawn_key": list(seed_sequence.spawn_key),
+                          "pool_size": seed_sequence.pool_size,
+                          "n_children_spawned": seed_sequence.n_children_spawned},
+        "pheromones": {"bounds": list(store.bounds), "background": store.background, "scale": store.scale,
+                       "offset": store.offset},
+        "arrays": arrays,
+    }
+
+    temporary = os.path.join(directory, f"{STATE_FILE}.{os.getpid()}.tmp")
+    with open(temporary, "w") as file:
+        json.dump(state, file)
+    os.replace(temporary, os.path.join(directory, STATE_FILE))
+
+    # Arrays of previous checkpoints are stale. The pheromones a run was resumed from stay memory-mapped until it
+    # ends, and mapped files cannot be deleted on Windows: they are left to the saves of the next runs
+    for filename in glob(os.path.join(escape(directory), "*.npy")):
+        if os.path.basename(filename) not in arrays.values():
+            with suppress(OSError):
+                os.remove(filename)
+
+
+def load_checkpoint(directory: str, instance: Instance) -> tuple[Colony, dict]:
+    """Load the state of a colony from a checkpoint directory. The pheromone levels are memory-mapped copy-on-write,
+    so they are only read from disk as they are used
+        :arg directory: Checkpoint directory, see save_checkpoint
+        :arg instance: Instance the colony runs on, must be the one it was saved for
+        :return: Colony and parameters of the run
+    """
+    with open(os.path.join(directory, STATE_FILE)) as file:
+        state = json.load(file)
+
+    if state["instance"] != instance.fingerprint():
+        raise ValueError(f"Checkpoint {directory} was made for another instance")
+
+    def array(name: str, mmap_mode=None):
+        filename = state["arrays"].get(name)
+        return np.load(os.path.join(directory, filename), mmap_mode=mmap_mode) if filename else None
+
+    # Step 1 : Restore the pheromone levels, the lookup tables of the candidate edges are rebuilt
+    levels = state["pheromones"]
+    store = PheromoneStore.from_raw(array("pheromones", mmap_mode="c"), levels["background"], levels["scale"],
+                                    levels["offset"], array("candidates"), tuple(levels["bounds"]))
+
+    # Step 2 : Restore the random generator and the colony
+    seeds = state["seed_sequence"]
+    seed_sequence = np.random.SeedSequence(seeds["entropy"], spawn_key=tuple(seeds["spawn_key"]),
+                                           pool_size=seeds["pool_size"],
+                                           n_children_spawned=seeds["n_children_spawned"])
+
+    colony = Colony(pheromones=store, seed_sequence=seed_sequence, best_solution=array("best_solution"),
+                    **state["colony"])
+
+    return colony, state["params"]
@@ -0,0 +1,118 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from src.Instance import Instance
+from src.LocationSet import LocationSet
+from src.SolutionCache import CachedSolution
+import numpy as np
+
+METHODS = ("sweep", "kmeans")
+
+# Number of nearest neighbors of a customer looked at to tell whether it lies on the boundary of its cluster
+BOUNDARY_NEIGHBORS = 5
+
+
+def sweep_clusters(instance: Instance, n_clusters: int) -> list[np.ndarray]:
+    """Split the customers into sectors of consecutive polar angles around the warehouse, with the same number of
+    customers each. The first sector starts after the widest angular gap, so that no group of customers is cut
+    where it can be avoided
+        :arg instance: Instance of the customers
+        :arg n_clusters: Number of sectors
+        :return: Location indices of the customers of each sector
+    """
+    coords = instance.location_set.coordinates()
+    angles = np.arctan2(coords[1:, 1] - coords[0, 1], coords[1:, 0] - coords[0, 0])
+    order = np.argsort(angles, kind="stable")
+
+    # Rotate the sweep to start right after the widest gap between two consecutive angles
+    sorted_angles = angles[order]
+    gaps = np.diff(np.append(sorted_angles, sorted_angles[0] + 2 * np.pi))
+    order = np.roll(order, -(np.argmax(gaps).item() + 1))
+
+    return [sector + 1 for sector in np.array_split(order, n_clusters) if sector.size]
+
+
+def kmeans_clusters(instance: Instance, n_clusters: int, rng: np.random.Generator, time_weight: float = 1,
+                    max_iter: int = 50) -> list[np.ndarray]:
+    """Group the customers with k-means on their coordinates and the middle of their delivery windows, so that each
+    cluster holds customers that are close in space and time
+        :arg instance: Instance of the customers
+        :arg n_clusters: Number of clusters
+        :arg rng: Random generator choosing the initial centers, k-means++ style
+        :arg time_weight: Weight of the time coordinate, in distance units per time unit, 0 for space only
+        :arg max_iter: Maximum number of Lloyd iterations
+        :return: Location indices of the customers of each non-empty cluster
+    """
+    features = np.column_stack((instance.location_set.coordinates()[1:],
+                                time_weight * (instance.ready_time[1:] + instance.due_date[1:]) / 2))
+    n_clusters = min(n_clusters, len(features))
+
+    # Step 1 : Choose the centers one by one, far from the centers already chosen
+    centers = [features[rng.integers(len(features))]]
+    closest = ((features - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, n_clusters):
+        centers.append(features[rng.choice(len(features), p=closest / closest.sum())] if closest.sum() > 0
+                       else features[rng.integers(len(features))])
+        closest = np.minimum(closest, ((features - centers[-1]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+
+    # Step 2 : Assign each customer to its closest center, then move the centers to the mean of their customers
+    labels = np.full(len(features), -1)
+    for _ in range(max_iter):
+        # Squared distances expanded, so that only an (n, k) array is built
+        new_labels = np.argmin((centers ** 2).sum(axis=1) - 2 * features @ centers.T, axis=1)
+        if np.array_equal(new_labels, labels):
+            break
+
+        labels = new_labels
+        counts = np.bincount(labels, minlength=n_clusters)
+        for axis in range(features.shape[1]):
+            sums = np.bincount(labels, weights=features[:, axis], minlength=n_clusters)
+            centers[counts > 0, axis] = sums[counts > 0] / counts[counts > 0]
+
+    return [cluster + 1 for cluster in (np.flatnonzero(labels == k) for k in range(n_clusters)) if cluster.size]
+
+
+def boundary_customers(instance: Instance, clusters: list[np.ndarray],
+                       n_neighbors: int = BOUNDARY_NEIGHBORS) -> list[int]:
+    """Get the customers having one of their nearest neighbors in another cluster"""
+    cluster_of = np.zeros(len(instance), dtype=np.int64)
+    for k, cluster in enumerate(clusters):
+        cluster_of[cluster] = k
+
+    neighbors = instance.neighbor_lists(n_neighbors)[1:]
+    return (np.flatnonzero((cluster_of[neighbors] != cluster_of[1:, None]).any(axis=1)) + 1).tolist()
+
+
+def _solve_cluster(location_set: LocationSet, vehicle_number: int, vehicle_capacity: int, heuristic: str,
+                   params: dict) -> CachedSolution:
+    """Solve the sub-problem of a cluster, in a worker process or not"""
+    # Imported here, the Vrp module imports this one
+    from src.Vrp import Vrp
+
+    vrp = Vrp.from_location_set(location_set, vehicle_number, vehicle_capacity)
+    vrp.solve(heuristic, **params)
+    return CachedSolution.from_routes(vrp.routes, vrp.best_cost_history)
+
+
+def solve_clusters(instance: Instance, clusters: list[np.ndarray], vehicle_number: int, vehicle_capacity: int,
+                   heuristic: str, params: dict, n_workers: Optional[int] = None) -> list[CachedSolution]:
+    """Solve each cluster as an independent problem with the same warehouse
+        :arg instance: Instance of the customers
+        :arg clusters: Location indices of the customers of each cluster
+        :arg vehicle_number: Number of vehicles of each sub-problem
+        :arg vehicle_capacity: Capacity of the vehicles
+        :arg heuristic: Name of the heuristic solving the sub-problems, e.g. "insertion" for Vrp.insertion_heuristic
+        :arg params: Parameters of the heuristic
+        :arg n_workers: (Optional) Number of processes solving the clusters in parallel, in this process if None
+        :return: Routes of each cluster, as customer ids
+    """
+    # Each sub-problem only receives its own locations, its distance matrix is built by the worker
+    location_sets = [instance.location_set.subset(np.concatenate(([0], cluster))) for cluster in clusters]
+    args = [(location_set, vehicle_number, vehicle_capacity, heuristic, params) for location_set in location_sets]
+
+    if not n_workers:
+        return [_solve_cluster(*arg) for arg in args]
+
+    with ProcessPoolExecutor(n_workers) as executor:
+        futures = [executor.submit(_solve_cluster, *arg) for arg in args]
+        return [future.result() for future in futures]
@@ -0,0 +1,312 @@
+from typing import Optional
+from src.Instance import Instance
+from src.Instrumentation import NULL_PROFILER, Profiler
+from src.Location import Location
+from src.Route import EPSILON, Route
+import numpy as np
+
+# Regret of a missing option, so that the customers with the fewest options are inserted first
+MISSING_OPTION = 1e9
+
+
+def cheapest_insertion(routes: list[Route], customer: Location, vehicle_capacity: int) -> Optional[tuple[int, int]]:
+    """Find the feasible insertion of a customer into some routes that increases the total cost the least
+        :arg routes: Routes to insert the customer into
+        :arg customer: Customer to insert
+        :arg vehicle_capacity: Capacity of the vehicles
+        :return: Index of the route and position to insert the customer at, None if no insertion is feasible
+    """
+    best, best_cost = None, float("inf")
+
+    for r, route in enumerate(routes):
+        for position in range(len(route.customers) + 1):
+            cost = route.insertion_cost(customer, position, vehicle_capacity)
+
+            if cost is not None and cost < best_cost:
+                best, best_cost = (r, position), cost
+
+    return best
+
+
+def insert_customers(routes: list[Route], customers: list[Location], warehouse: Location,
+                     vehicle_capacity: int) -> list[Route]:
+    """Insert customers into routes one by one, each at its cheapest feasible position, or in a new route if it fits
+    in none of them. The customers with the earliest due dates are inserted first, as they have the fewest options
+        :arg routes: Routes to insert the customers into, updated in place
+        :arg customers: Customers to insert
+        :arg warehouse: Warehouse the new routes start from
+        :arg vehicle_capacity: Capacity of the vehicles
+        :return: The routes, including the new ones
+    """
+    for customer in sorted(customers, key=lambda customer: customer.due_date):
+        insertion = cheapest_insertion(routes, customer, vehicle_capacity)
+
+        if insertion is None:
+            routes.append(Route(warehouse, [customer]))
+        else:
+            r, position = insertion
+            routes[r].insert(position, customer)
+
+    return routes
+
+
+def _schedule(instance: Instance, nodes: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Compute the schedule of a route
+        :arg nodes: Location indices of the route, starting and ending with the warehouse (0)
+        :return: Arrival at and departure from each node, latest service start at each node keeping the rest of the
+            route feasible, and total waiting time from each node to the end of the route
+    """
+    distances, ready_time, due_date, service = instance.distances, instance.ready_time, instance.due_date, \
+        instance.service
+    size = len(nodes)
+    arrival, departure = np.zeros(size), np.zeros(size)
+
+    for k in range(1, size):
+        arrival[k] = departure[k - 1] + distances[nodes[k - 1], nodes[k]]
+        departure[k] = max(arrival[k], ready_time[nodes[k]]) + service[nodes[k]]
+
+    latest = np.empty(size)
+    latest[-1] = due_date[0]
+    for k in range(size - 2, -1, -1):
+        latest[k] = min(due_date[nodes[k]], latest[k + 1] - distances[nodes[k], nodes[k + 1]] - service[nodes[k]])
+
+    waiting = np.cumsum(np.maximum(ready_time[nodes] - arrival, 0)[::-1])[::-1]
+    return arrival, departure, latest, waiting
+
+
+def _insertions(instance: Instance, nodes: np.ndarray, schedule: tuple, customers: np.ndarray,
+                free_capacity: float, legs: Optional[tuple[np.ndarray, np.ndarray]] = None) -> tuple[np.ndarray, ...]:
+    """Evaluate the insertion of each customer at each position of a route at once
+        :arg nodes: Location indices of the route, starting and ending with the warehouse
+        :arg schedule: Schedule of the route, see _schedule
+        :arg customers: Location indices of the customers
+        :arg free_capacity: Capacity left in the vehicle
+        :arg legs: (Optional) (customers, positions) distances from the location before each position to each
+            customer, and from each customer to the location after the position, looked up if None
+        :return: (customers, positions) feasibility, detour d(i, u) + d(u, j), push forward of the service start at
+            the next location and change of the route cost of each insertion. Position p inserts between nodes[p] and
+            nodes[p + 1]
+    """
+    arrival, departure, latest, waiting = schedule
+    ready_time, due_date, service = instance.ready_time, instance.due_date, instance.service
+    before, after = nodes[:-1], nodes[1:]
+
+    to_customer, from_customer = legs or _legs(instance, nodes, customers)
+
+    # Step 1 : Service of the customer, then arrival at the next location
+    arrival_customer = departure[:-1] + to_customer
+    next_arrival = np.maximum(arrival_customer, ready_time[customers, None]) + service[customers, None] + \
+        from_customer
+
+    # Step 2 : The customer's window and the latest start of the next location must be met
+    push = np.maximum(next_arrival, ready_time[after]) - np.maximum(arrival[1:], ready_time[after])
+    feasible = (arrival_customer <= due_date[customers, None] + EPSILON) & \
+        (np.maximum(next_arrival, ready_time[after]) <= latest[1:] + EPSILON) & \
+        (instance.demand[customers, None] <= free_capacity)
+
+    # Step 3 : The delay is absorbed by the waiting times that follow, see RouteState.shift
+    delta = np.maximum(next_arrival - arrival[1:] - waiting[1:], 0)
+
+    return feasible, to_customer + from_customer, push, delta
+
+
+def _legs(instance: Instance, nodes: np.ndarray, customers: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Look up the distances from the location before each position of a route to each customer, and from each
+    customer to the location after the position, see _insertions"""
+    return (np.asarray(instance.distances[np.ix_(nodes[:-1], customers)], dtype=np.float64).T,
+            np.asarray(instance.distances[np.ix_(customers, nodes[1:])], dtype=np.float64))
+
+
+def _choose_seed(instance: Instance, customers: np.ndarray, seed_customer: str) -> int:
+    """Choose the customer starting a new route: the farthest from the warehouse or the one with the earliest due
+    date"""
+    if seed_customer == "farthest":
+        return customers[np.argmax(instance.distances[0, customers])].item()
+    if seed_customer == "due_date":
+        return customers[np.argmin(instance.due_date[customers])].item()
+
+    raise ValueError(f"Unknown seed customer criterion {seed_customer}")
+
+
+def solomon_routes(instance: Instance, vehicle_capacity: int, mu: float = 1, lam: float = 1, alpha1: float = 1,
+                   seed_customer: str = "farthest", profiler: Profiler = NULL_PROFILER) -> list[Route]:
+    """Build routes one at a time with Solomon's I1 insertion heuristic: each route starts from a seed customer, then
+    the customer whose best insertion saves the most compared to a route of its own is inserted, until none fits.
+
+    Only the customers still fitting in the route are evaluated again after each insertion, all positions at once: a
+    customer that no longer fits never fits again, as insertions only delay the route and fill the vehicle. Their
+    distances to the locations of the route are kept, the two legs of the inserted customer being the only new
+    ones.
+        :arg instance: Instance to build routes for
+        :arg vehicle_capacity: Capacity of the vehicles
+        :arg mu: Weight of the removed edge in the detour, c11 = d(i, u) + d(u, j) - mu d(i, j)
+        :arg lam: Weight of the distance from the warehouse in the saving, c2 = lam d(0, u) - c1
+        :arg alpha1: Weight of the detour against the push forward of the next service start in the insertion cost
+            c1, between 0 and 1
+        :arg seed_customer: Customer starting each route, "farthest" from the warehouse or earliest "due_date"
+        :arg profiler: Profiler counting the evaluated insertions
+    """
+    unrouted = np.ones(len(instance), dtype=bool)
+    unrouted[0] = False
+    routes = []
+
+    while unrouted.any():
+        # Step 1 : Start a route with a seed customer
+        nodes = np.array([0, _choose_seed(instance, np.flatnonzero(unrouted), seed_customer), 0])
+        unrouted[nodes[1]] = False
+        load = instance.demand[nodes[1]].item()
+        candidates = np.flatnonzero(unrouted)
+        to_customer, from_customer = _legs(instance, nodes, candidates)
+
+        # Step 2 : Insert the customer with the largest saving until no customer fits
+        while candidates.size:
+            removed = np.asarray(instance.distances[nodes[:-1], nodes[1:]], dtype=np.float64)
+            feasible, detour, push, _ = _insertions(instance, nodes, _schedule(instance, nodes), candidates,
+                                                    vehicle_capacity - load, (to_customer, from_customer))
+            profiler.count("insertions_evaluated", feasible.size)
+
+            cost = np.where(feasible, alpha1 * (detour - mu * removed) + (1 - alpha1) * push, np.inf)
+            positions = np.argmin(cost, axis=1)
+            best = cost[np.arange(len(candidates)), positions]
+
+            # Customers that fit nowhere are dropped for the rest of the route
+            fits = np.isfinite(best)
+            candidates, positions, best = candidates[fits], positions[fits], best[fits]
+            if not candidates.size:
+                break
+
+            chosen = np.argmax(lam * np.asarray(instance.distances[0, candidates], dtype=np.float64) - best)
+            customer, position = candidates[chosen].item(), positions[chosen].item()
+            nodes = np.insert(nodes, position + 1, customer)
+            load += instance.demand[customer].item()
+            unrouted[customer] = False
+
+            # The customer splits the edge at its position into two legs
+            fits[fits] = np.arange(len(candidates)) != chosen
+            candidates = np.delete(candidates, chosen)
+            to_customer = np.insert(to_customer[fits], position + 1, instance.distances[customer, candidates], axis=1)
+            from_customer = np.insert(from_customer[fits], position, instance.distances[candidates, customer], axis=1)
+
+        routes.append(Route(instance.warehouse, [instance.locations[index] for index in nodes[1:-1].tolist()]))
+
+    return routes
+
+
+def regret_routes(instance: Instance, vehicle_capacity: int, regret: int = 2, n_routes: Optional[int] = None,
+                  seed_customer: str = "farthest", n_neighbors: Optional[int] = 20,
+                  profiler: Profiler = NULL_PROFILER) -> list[Route]:
+    """Build routes in parallel with regret-k insertion: the customer whose k best insertions, in k different routes,
+    differ the most from its best one is inserted first, at its best position. Customers with fewer than k options
+    come first, and a new route is opened for a customer that fits in no route.
+
+    The best insertion of every unrouted customer into every route is kept in a matrix, and only the column of the
+    changed route is evaluated again after each insertion, for the customers that still fit in it or are neighbors
+    of the inserted customer.
+        :arg instance: Instance to build routes for
+        :arg vehicle_capacity: Capacity of the vehicles
+        :arg regret: Number of options k compared, 1 inserts the cheapest insertion first
+        :arg n_routes: (Optional) Number of routes opened at the start, seeded by customers spread away from the
+            warehouse and from each other. Defaults to the number of vehicles the total demand needs
+        :arg seed_customer: Customer starting the routes opened later, "farthest" from the warehouse or earliest
+            "due_date"
+        :arg n_neighbors: (Optional) Number of nearest neighbors of each customer, a customer is only inserted into
+            the routes serving one of its neighbors. All routes are considered if None
+        :arg profiler: Profiler counting the evaluated insertions
+    """
+    n = len(instance)
+    distances = instance.distances
+    if n_routes is None:
+        n_routes = -(-instance.demand.sum().item() // vehicle_capacity)
+
+    # Customers having each customer among their neighbors, as ranges of an array
+    if n_neighbors is not None:
+        neighbors = instance.neighbor_lists(n_neighbors)
+        owners = np.repeat(np.arange(n), neighbors.shape[1])[np.argsort(neighbors.ravel(), kind="stable")]
+        bounds = np.searchsorted(np.sort(neighbors.ravel()), np.arange(n + 1))
+
+    unrouted = np.ones(n, dtype=bool)
+    unrouted[0] = False
+
+    # (locations, routes) cost and position of the best insertion of each customer into each route
+    costs = np.full((n, max(n_routes, 1) * 2), np.inf)
+    positions = np.zeros(costs.shape, dtype=np.int64)
+    routes, loads = [], []
+
+    # Regret of each customer and cost of its best insertion
+    regrets, best = np.full(n, -np.inf), np.full(n, np.inf)
+
+    def evaluate(r: int, customer: int):
+        """Evaluate the insertions into a route the customer was just added to, then update the regrets"""
+        pending = np.flatnonzero(unrouted)
+        if n_neighbors is None:
+            customers = pending
+        else:
+            related = np.isfinite(costs[:, r])
+            related[owners[bounds[customer]:bounds[customer + 1]]] = True
+            customers = pending[related[pending]]
+
+        if not customers.size:
+            return
+
+        nodes = routes[r]
+        feasible, _, _, delta = _insertions(instance, nodes, _schedule(instance, nodes), customers,
+                                            vehicle_capacity - loads[r])
+        profiler.count("insertions_evaluated", delta.size)
+        delta = np.where(feasible, delta, np.inf)
+
+        positions[customers, r] = np.argmin(delta, axis=1)
+        costs[customers, r] = delta[np.arange(len(customers)), positions[customers, r]]
+
+        options = costs[customers, :len(routes)]
+        if len(routes) > regret:
+            options = np.partition(options, regret - 1, axis=1)[:, :regret]
+        options = np.sort(options, axis=1)
+        best[customers] = options[:, 0]
+        # Missing options count as a large regret, so that the customers with the fewest options come first
+        regrets[customers] = np.where(np.isfinite(options), options, MISSING_OPTION)[:, 1:regret].sum(axis=1) - \
+            (regret - 1) * np.where(np.isfinite(options[:, 0]), options[:, 0], MISSING_OPTION)
+
+    def open_route(customer: int):
+        nonlocal costs, positions
+        if len(routes) == costs.shape[1]:
+            costs = np.hstack([costs, np.full(costs.shape, np.inf)])
+            positions = np.hstack([positions, np.zeros(positions.shape, dtype=np.int64)])
+
+        unrouted[customer] = False
+        routes.append(np.array([0, customer, 0]))
+        loads.append(instance.demand[customer].item())
+
+    # Step 1 : Open the first routes, each seed being the customer farthest from the warehouse and the other seeds
+    spread = np.asarray(distances[0], dtype=np.float64).copy()
+    spread[0] = -np.inf
+    for _ in range(min(n_routes, n - 1)):
+        customer = np.argmax(spread).item()
+        open_route(customer)
+        spread = np.minimum(spread, distances[customer])
+        spread[~unrouted] = -np.inf
+
+    for r, nodes in enumerate(routes):
+        evaluate(r, nodes[1].item())
+
+    while unrouted.any():
+        pending = np.flatnonzero(unrouted)
+
+        # Step 2 : Open a route for a customer that fits nowhere
+        stranded = pending[~np.isfinite(best[pending])]
+        if stranded.size:
+            customer = _choose_seed(instance, stranded, seed_customer)
+            open_route(customer)
+            r = len(routes) - 1
+        else:
+            # Step 3 : Insert the customer with the largest regret, the cheapest first among equal regrets
+            customer = pending[np.lexsort((best[pending], -regrets[pending]))[0]].item()
+            r = np.argmin(costs[customer, :len(routes)]).item()
+            routes[r] = np.insert(routes[r], positions[customer, r] + 1, customer)
+            loads[r] += instance.demand[customer].item()
+            unrouted[customer] = False
+
+        # Step 4 : Evaluate again the customers that may fit in the changed route
+        evaluate(r, customer)
+
+    return [Route(instance.warehouse, [instance.locations[index] for index in nodes[1:-1].tolist()])
+            for nodes in routes]
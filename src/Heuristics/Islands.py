@@ -0,0 +1,109 @@
+from typing import Optional, Union
+from src.Instance import Instance
+from src.Instrumentation import NULL_PROFILER, Profiler
+import src.Heuristics.AntColony as AntColony
+
+TOPOLOGIES = ("ring", "full")
+MIGRATIONS = ("best", "pheromones")
+
+
+def neighbors(colony: int, n_colonies: int, topology: str) -> list[int]:
+    """Get the colonies a colony receives migrants from
+        :arg colony: Index of the colony
+        :arg n_colonies: Number of colonies
+        :arg topology: "ring" (from the previous colony) or "full" (from every other colony)
+    """
+    if n_colonies < 2:
+        return []
+
+    if topology == "ring":
+        return [(colony - 1) % n_colonies]
+
+    return [other for other in range(n_colonies) if other != colony]
+
+
+def per_colony(value: Union[float, list], n_colonies: int) -> list:
+    """Expand a parameter shared by all colonies into one value per colony"""
+    values = value if isinstance(value, (list, tuple)) else [value] * n_colonies
+
+    if len(values) != n_colonies:
+        raise ValueError(f"Expected {n_colonies} values, got {len(values)}")
+
+    return list(values)
+
+
+def migrate(colonies: list[AntColony.Colony], topology: str, migration: str, migration_rate: float):
+    """Exchange information between colonies
+        :arg colonies: Colonies to exchange information between, updated in place
+        :arg topology: "ring" or "full", see neighbors
+        :arg migration: "best" to send the best solutions to the neighbors, "pheromones" to blend the pheromone
+            levels of the neighbors
+        :arg migration_rate: Weight of the neighbors' pheromones when blending
+    """
+    # Migrants are taken from the state before the exchange, so the result does not depend on the colony order
+    best = [(colony.best_cost, colony.best_solution) for colony in colonies]
+    pheromones = [colony.pheromones.copy() for colony in colonies] if migration == "pheromones" else None
+
+    for k, colony in enumerate(colonies):
+        sources = neighbors(k, len(colonies), topology)
+
+        if not sources:
+            continue
+
+        if migration == "pheromones":
+            colony.pheromones.blend([pheromones[source] for source in sources], migration_rate)
+            continue
+
+        # The best neighboring solution replaces the colony's own if it is better and reinforces its trail
+        cost, solution = min((best[source] for source in sources), key=lambda migrant: migrant[0])
+
+        if cost < colony.best_cost:
+            colony.best_cost = cost
+            colony.best_solution = solution.copy()
+            AntColony.reinforce_pheromones(colony.variant, colony.pheromones, solution, cost, colony.rho)
+
+
+def run_islands(instance: Instance, colonies: list[AntColony.Colony], n_ants: int, max_iter: int,
+                vehicle_capacity: int, migration_interval: int, topology: str, migration: str,
+                migration_rate: float, n_workers: Optional[int] = None,
+                profiler: Profiler = NULL_PROFILER) -> list[AntColony.Colony]:
+    """Run independent colonies in separate processes, exchanging information every migration_interval iterations
+        :arg instance: Instance to construct solutions for
+        :arg colonies: Colonies to run
+        :arg n_ants: Number of ants of each colony
+        :arg max_iter: Maximum number of iterations of each colony
+        :arg vehicle_capacity: Capacity of the vehicles
+        :arg migration_interval: Number of iterations between two migrations
+        :arg topology: "ring" or "full", see neighbors
+        :arg migration: "best" or "pheromones", see migrate
+        :arg migration_rate: Weight of the neighbors' pheromones when blending
+        :arg n_workers: (Optional) Number of processes, defaults to one per colony
+        :arg profiler: Profiler timing the epochs and migrations and recording an event per epoch, the phases of the
+            colonies themselves run in the workers and are not recorded
+        :return: The colonies after max_iter iterations
+    """
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology {topology}, expected one of {TOPOLOGIES}")
+
+    if migration not in MIGRATIONS:
+        raise ValueError(f"Unknown migration {migration}, expected one of {MIGRATIONS}")
+
+    with AntColony.AntPool(instance, n_workers or len(colonies)) as pool:
+        done = 0
+
+        while done < max_iter:
+            # Colonies only synchronize between epochs
+            n_iter = min(migration_interval, max_iter - done)
+            with profiler.phase("epoch"):
+                colonies = pool.run_colonies(colonies, n_iter, n_ants, vehicle_capacity)
+            done += n_iter
+
+            if profiler.enabled:
+                profiler.iteration(iteration=done, best_cost=min(colony.best_cost for colony in colonies),
+                                   colony_best_costs=[colony.best_cost for colony in colonies])
+
+            if done < max_iter:
+                with profiler.phase("migration"):
+                    migrate(colonies, topology, migration, migration_rate)
+
+    return colonies
@@ -0,0 +1,306 @@
+from typing import Optional
+from src.Instance import Instance
+from src.Location import Location
+from src.Route import Route, RouteState
+import src.Heuristics.AntColony as AntColony
+import numpy as np
+
+OPERATORS = ("two_opt", "or_opt", "relocate", "swap", "two_opt_star")
+
+# Minimum decrease of the total cost for a move to be applied, avoids cycling on floating point noise
+MIN_GAIN = 1e-7
+
+
+class LocalSearch:
+    """Class improving VRP routes with intra-route (2-opt, Or-opt) and inter-route (relocate, swap, 2-opt*) moves.
+
+    Moves respect the vehicle capacity and the delivery windows. Each customer is only paired with its k nearest
+    neighbors, so a pass over all customers is near-linear in the number of customers."""
+
+    def __init__(self, instance: Instance, vehicle_capacity: int, n_neighbors: int = 20,
+                 operators: tuple[str, ...] = OPERATORS):
+        """
+            :arg instance: Instance the routes belong to
+            :arg vehicle_capacity: Capacity of the vehicles
+            :arg n_neighbors: Number of nearest neighbors each customer is paired with
+            :arg operators: Operators to apply, in order, see OPERATORS
+        """
+        unknown = set(operators) - set(OPERATORS)
+        if unknown:
+            raise ValueError(f"Unknown operators {unknown}, expected some of {OPERATORS}")
+
+        self.instance = instance
+        self.vehicle_capacity = vehicle_capacity
+        neighbors = instance.neighbor_lists(n_neighbors)
+        self.neighbors = neighbors.tolist()
+        # Whether each customer can be served right before / after each of its neighbors, moves creating an
+        # infeasible arc are skipped without evaluating them
+        self.precedes = instance.arc_feasible(np.arange(len(instance))[:, None], neighbors).tolist()
+        self.follows = instance.arc_feasible(neighbors, np.arange(len(instance))[:, None]).tolist()
+        self._operators = [getattr(self, f"_{operator}") for operator in operators]
+        self._distance = instance.distances.item
+
+        self._routes: list[Route] = []
+        self._route_of: list[int] = []
+        self._position_of: list[int] = []
+
+    def improve(self, routes: list[Route], max_passes: Optional[int] = None,
+                customers: Optional[list[int]] = None) -> list[Route]:
+        """Apply improving moves until none is found, return the improved routes without modifying the given ones
+            :arg routes: Routes to improve
+            :arg max_passes: (Optional) Maximum number of passes over all customers
+            :arg customers: (Optional) Indices of the customers the moves start from, e.g. the customers near the
+                boundaries of separately solved clusters, all customers if None
+        """
+        self._routes = [Route(route.warehouse, list(route.customers)) for route in routes]
+        self._route_of = [-1] * len(self.instance)
+        self._position_of = [-1] * len(self.instance)
+
+        for r in range(len(self._routes)):
+            self._update_positions(r)
+
+        passes = 0
+        improved = True
+
+        while improved and (max_passes is None or passes < max_passes):
+            improved = False
+            passes += 1
+
+            for u in range(1, len(self.instance)) if customers is None else customers:
+                if self._route_of[u] < 0:
+                    continue
+
+                for operator in self._operators:
+                    improved |= operator(u)
+
+        return [route for route in self._routes if route.customers]
+
+    def _update_positions(self, r: int):
+        for position, customer in enumerate(self._routes[r].customers):
+            self._route_of[customer.index] = r
+            self._position_of[customer.index] = position
+
+    def _apply_intra(self, r: int, customers: list[Location]) -> bool:
+        """Replace the customers of a route if the new order is feasible and cheaper"""
+        route = self._routes[r]
+        state = RouteState(route.warehouse, customers)
+
+        if not state.feasible or (route.state.feasible and state.cost > route.cost() - MIN_GAIN):
+            return False
+
+        route.customers = customers
+        route._state = state
+        self._update_positions(r)
+        return True
+
+    # Intra-route operators
+    def _two_opt(self, u: int) -> bool:
+        """Reverse the segment between u and one of its neighbors in the same route"""
+        r = self._route_of[u]
+        route = self._routes[r]
+        nodes = route.state.nodes
+
+        for v in self.neighbors[u]:
+            if self._route_of[v] != r:
+                continue
+
+            a, b = sorted((self._position_of[u], self._position_of[v]))
+
+            if b - a < 2:
+                continue
+
+            # Node positions are customer positions + 1, the arcs (a, a + 1) and (b, b + 1) are replaced
+            c_a, c_a1, c_b, c_b1 = nodes[a + 1].index, nodes[a + 2].index, nodes[b + 1].index, nodes[b + 2].index
+            distance = self._distance
+            if distance(c_a, c_b) + distance(c_a1, c_b1) > distance(c_a, c_a1) + distance(c_b, c_b1) - MIN_GAIN:
+                continue
+
+            customers = route.customers
+            if self._apply_intra(r, customers[:a + 1] + customers[a + 1:b + 1][::-1] + customers[b + 1:]):
+                return True
+
+        return False
+
+    def _or_opt(self, u: int) -> bool:
+        """Move a segment of 1 to 3 customers starting at u after one of its neighbors in the same route"""
+        r = self._route_of[u]
+        route = self._routes[r]
+        i = self._position_of[u]
+        distance = self._distance
+
+        for length in (1, 2, 3):
+            customers = route.customers
+
+            if i + length > len(customers):
+                break
+
+            nodes = route.state.nodes
+            prev, first, last, nxt = nodes[i].index, u, nodes[i + length].index, nodes[i + length + 1].index
+            removal_gain = distance(prev, first) + distance(last, nxt) - distance(prev, nxt)
+
+            for v, follows in zip(self.neighbors[u], self.follows[u]):
+                if self._route_of[v] != r or not follows:
+                    continue
+
+                j = self._position_of[v]
+
+                # The segment is inserted between v and its successor
+                if i - 1 <= j < i + length:
+                    continue
+
+                v_next = nodes[j + 2].index
+                if removal_gain + distance(v, v_next) - distance(v, first) - distance(last, v_next) < MIN_GAIN:
+                    continue
+
+                segment = customers[i:i + length]
+                rest = customers[:i] + customers[i + length:]
+                at = j + 1 if j < i else j + 1 - length
+
+                if self._apply_intra(r, rest[:at] + segment + rest[at:]):
+                    return True
+
+        return False
+
+    # Inter-route operators, evaluated in constant time from the cached route schedules
+    def _relocate(self, u: int) -> bool:
+        """Move u next to one of its neighbors in another route"""
+        a = self._route_of[u]
+        route_a = self._routes[a]
+
+        if not route_a.state.feasible:
+            return False
+
+        p = self._position_of[u]
+        removal = route_a.removal_cost(p)
+        customer = route_a.customers[p]
+
+        if removal is None:
+            return False
+
+        for v, precedes, follows in zip(self.neighbors[u], self.precedes[u], self.follows[u]):
+            b = self._route_of[v]
+
+            if b == a or b < 0 or not self._routes[b].state.feasible:
+                continue
+
+            route_b = self._routes[b]
+            q = self._position_of[v]
+
+            # u is inserted right before or right after v, if the arc between them is feasible
+            for position, feasible in ((q, precedes), (q + 1, follows)):
+                insertion = route_b.insertion_cost(customer, position, self.vehicle_capacity) if feasible else None
+
+                if insertion is not None and removal + insertion < -MIN_GAIN:
+                    route_b.insert(position, route_a.pop(p))
+                    self._update_positions(a)
+                    self._update_positions(b)
+                    return True
+
+        return False
+
+    def _swap(self, u: int) -> bool:
+        """Exchange u with one of its neighbors in another route"""
+        a = self._route_of[u]
+        route_a = self._routes[a]
+
+        if not route_a.state.feasible:
+            return False
+
+        p = self._position_of[u]
+
+        for v in self.neighbors[u]:
+            b = self._route_of[v]
+
+            if b == a or b < 0 or not self._routes[b].state.feasible:
+                continue
+
+            route_b = self._routes[b]
+            q = self._position_of[v]
+            cost_a = route_a.replacement_cost(p, route_b.customers[q], self.vehicle_capacity)
+            cost_b = route_b.replacement_cost(q, route_a.customers[p], self.vehicle_capacity) \
+                if cost_a is not None else None
+
+            if cost_b is not None and cost_a + cost_b < -MIN_GAIN:
+                route_b.replace(q, route_a.replace(p, route_b.customers[q]))
+                self._update_positions(a)
+                self._update_positions(b)
+                return True
+
+        return False
+
+    def _two_opt_star(self, u: int) -> bool:
+        """Exchange the tails of two routes, so that u is followed by one of its neighbors"""
+        a = self._route_of[u]
+        route_a = self._routes[a]
+        state_a = route_a.state
+
+        if not state_a.feasible:
+            return False
+
+        # u is at node position i, the new route a' is a[:i] + b[j:] and the new route b' is b[:j] + a[i + 1:]
+        i = self._position_of[u] + 1
+        distance = self._distance
+
+        for v, precedes in zip(self.neighbors[u], self.precedes[u]):
+            b = self._route_of[v]
+
+            if b == a or b < 0 or not precedes or not self._routes[b].state.feasible:
+                continue
+
+            route_b = self._routes[b]
+            state_b = route_b.state
+            j = self._position_of[v] + 1
+
+            if state_a.load[i] + state_b.load[-1] - state_b.load[j - 1] > self.vehicle_capacity or \
+                    state_b.load[j - 1] + state_a.load[-1] - state_a.load[i] > self.vehicle_capacity:
+                continue
+
+            # The tail of each route keeps its schedule, shifted by the change of arrival at its first node
+            shift_a = state_b.shift(j, state_a.departure[i] + distance(u, v) - state_b.arrival[j])
+            if shift_a is None:
+                continue
+
+            after_u = state_a.nodes[i + 1]
+            before_v = state_b.nodes[j - 1]
+            shift_b = state_a.shift(i + 1, state_b.departure[j - 1] + distance(before_v.index, after_u.index)
+                                    - state_a.arrival[i + 1])
+            # The new routes cost the old ones' tails plus their shifts
+            if shift_b is not None and shift_a + shift_b < -MIN_GAIN:
+                customers_a, customers_b = route_a.customers, route_b.customers
+                route_a.customers = customers_a[:i] + customers_b[j - 1:]
+                route_b.customers = customers_b[:j - 1] + customers_a[i:]
+                self._update_positions(a)
+                self._update_positions(b)
+                return True
+
+        return False
+
+
+class Daemon:
+    """Class applying local search to the best solutions of each iteration of the ant colony heuristics, before the
+    pheromone update."""
+
+    def __init__(self, instance: Instance, vehicle_capacity: int, n_best: int = 1, n_neighbors: int = 20,
+                 operators: tuple[str, ...] = OPERATORS, max_passes: Optional[int] = None):
+        """
+            :arg instance: Instance the solutions are constructed for
+            :arg vehicle_capacity: Capacity of the vehicles
+            :arg n_best: Number of best solutions of each iteration to improve
+            :arg n_neighbors: Number of nearest neighbors each customer is paired with
+            :arg operators: Operators to apply, see OPERATORS
+            :arg max_passes: (Optional) Maximum number of passes over all customers
+        """
+        self.instance = instance
+        self.n_best = n_best
+        self.max_passes = max_passes
+        self.local_search = LocalSearch(instance, vehicle_capacity, n_neighbors, operators)
+
+    def __call__(self, tours: np.ndarray, costs: np.ndarray):
+        """Improve the best tours of an iteration in place
+            :arg tours: Giant tours of the ants
+            :arg costs: Total cost of each tour
+        """
+        for ant in np.argsort(costs, kind="stable")[:self.n_best]:
+            routes = self.local_search.improve(AntColony.tour_to_routes(tours[ant], self.instance), self.max_passes)
+            tours[ant] = AntColony.routes_to_tour(routes, tours.shape[1])
+            costs[ant] = sum(route.cost() for route in routes)
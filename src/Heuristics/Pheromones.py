@@ -0,0 +1,196 @@
+from typing import Optional
+import numpy as np
+
+# Scale below which the raw values are folded back into levels, before they lose precision
+_MIN_SCALE = 1e-100
+
+
+class PheromoneStore:
+    """Class for storing the pheromone levels of the edges between locations.
+
+    Levels are stored as raw values and a global affine transform, level = raw * scale + offset, so evaporating every
+    edge only updates the transform. A store restricted to candidate edges keeps one level per candidate edge, all the
+    other edges share a single level which evaporates but never receives deposits. Levels are kept within bounds,
+    e.g. the Max-Min Ant System ones, when they are read or updated and whenever the bounds change."""
+
+    def __init__(self, size: int, initial: float, candidates: Optional[np.ndarray] = None,
+                 bounds: tuple[float, float] = (0.0, float("inf"))):
+        """
+            :arg size: Number of locations
+            :arg initial: Initial level of every edge
+            :arg candidates: (Optional) (size, k) array of the end locations of the edges stored for each start
+                location, all edges are stored if None
+            :arg bounds: Minimum and maximum level of an edge
+        """
+        self.size = size
+        self.candidates = candidates
+        self.scale = 1.0
+        self.offset = 0.0
+
+        self.raw = np.full((size, size) if candidates is None else candidates.shape, initial, dtype=np.float64)
+        # Raw level of the edges which are not stored
+        self.background = initial
+        self._bounds = (0.0, float("inf"))
+        self.bounds = bounds
+        self._index_candidates()
+
+    @classmethod
+    def from_raw(cls, raw: np.ndarray, background: float, scale: float, offset: float,
+                 candidates: Optional[np.ndarray] = None,
+                 bounds: tuple[float, float] = (0.0, float("inf"))) -> "PheromoneStore":
+        """Restore a store from its raw values and affine transform, e.g. from a checkpoint, without copying them"""
+        store = cls.__new__(cls)
+        store.size = len(raw)
+        store.candidates = candidates
+        # The saved levels are already within the bounds, setting them through the property would copy the raw values
+        store._bounds = tuple(bounds)
+        store.raw, store.background, store.scale, store.offset = raw, background, scale, offset
+        store._index_candidates()
+        return store
+
+    def _index_candidates(self):
+        if self.candidates is not None:
+            # Flat keys (start * size + end) of the stored edges, sorted, and the position of each in raw
+            keys = (np.arange(self.size)[:, None] * self.size + self.candidates).ravel()
+            self._slots = np.argsort(keys, kind="stable")
+            self._keys = keys[self._slots]
+
+    @property
+    def bounds(self) -> tuple[float, float]:
+        """Minimum and maximum level of an edge"""
+        return self._bounds
+
+    @bounds.setter
+    def bounds(self, bounds: tuple[float, float]):
+        bounds = tuple(bounds)
+        if bounds == self._bounds:
+            return
+
+        self._bounds = bounds
+        lower, upper = bounds
+
+        # Clip the stored levels too, otherwise the edges above the new maximum, e.g. the ones never reinforced since
+        # the initial level, would keep more pheromones than the reinforced edges clipped when updated
+        if lower > 0 or upper < np.inf:
+            self._normalize()
+            np.clip(self.raw, lower, upper, out=self.raw)
+            self.background = min(max(self.background, lower), upper)
+
+    def _clip(self, levels: np.ndarray) -> np.ndarray:
+        lower, upper = self.bounds
+        return np.clip(levels, lower, upper) if lower > 0 or upper < np.inf else levels
+
+    def _find(self, start: np.ndarray, end: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Locate edges in a store restricted to candidate edges
+            :return: Position of each edge in the flattened raw values, and whether it is stored at all
+        """
+        keys = np.asarray(start) * self.size + np.asarray(end)
+        positions = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+        return self._slots[positions], self._keys[positions] == keys
+
+    def get(self, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+        """Get the levels of edges, start and end are broadcast together"""
+        if self.candidates is None:
+            raw = self.raw[start, end]
+        else:
+            slots, stored = self._find(start, end)
+            raw = np.where(stored, self.raw.ravel()[slots], self.background)
+
+        return self._clip(raw * self.scale + self.offset)
+
+    def rows(self, starts: np.ndarray) -> np.ndarray:
+        """Get the levels of every edge leaving some locations
+            :return: (len(starts), size) array of levels
+        """
+        if self.candidates is None:
+            raw = self.raw[starts]
+        else:
+            raw = np.full((len(starts), self.size), self.background)
+            raw[np.arange(len(starts))[:, None], self.candidates[starts]] = self.raw[starts]
+
+        return self._clip(raw * self.scale + self.offset)
+
+    def stored_rows(self, starts: np.ndarray) -> np.ndarray:
+        """Get the levels of the candidate edges leaving some locations, in the order of the candidates
+            :return: (len(starts), k) array of levels
+        """
+        return self._clip(self.raw[starts] * self.scale + self.offset)
+
+    def matrix(self) -> np.ndarray:
+        """Get the (size, size) matrix of all levels"""
+        return self.rows(np.arange(self.size))
+
+    def set(self, start: np.ndarray, end: np.ndarray, levels: np.ndarray):
+        """Set the levels of edges, edges which are not stored are ignored"""
+        raw = (self._clip(np.asarray(levels, dtype=np.float64)) - self.offset) / self.scale
+
+        if self.candidates is None:
+            self.raw[start, end] = raw
+        else:
+            slots, stored = self._find(start, end)
+            self.raw.ravel()[slots[stored]] = np.broadcast_to(raw, stored.shape)[stored]
+
+    def add(self, start: np.ndarray, end: np.ndarray, amounts: np.ndarray):
+        """Add pheromones to edges, the amounts of repeated edges are summed"""
+        keys, inverse = np.unique(np.asarray(start) * self.size + np.asarray(end), return_inverse=True)
+        totals = np.bincount(inverse.ravel(), weights=np.broadcast_to(amounts, inverse.shape).ravel())
+        start, end = keys // self.size, keys % self.size
+        self.set(start, end, self.get(start, end) + totals)
+
+    def evaporate(self, rho: float, target: float = 0.0):
+        """Move every level towards a target, level = (1 - rho) * level + rho * target, in constant time"""
+        self.scale *= 1 - rho
+        self.offset = (1 - rho) * self.offset + rho * target
+
+        if self.scale < _MIN_SCALE:
+            self._normalize()
+
+    def _normalize(self):
+        """Fold the affine transform back into the raw values"""
+        self.raw = self.raw * self.scale + self.offset
+        self.background = self.background * self.scale + self.offset
+        self.scale = 1.0
+        self.offset = 0.0
+
+    def blend(self, others: list["PheromoneStore"], rate: float):
+        """Move every level towards the mean level of other stores with the same layout
+            :arg others: Stores to blend with
+            :arg rate: Weight of the other stores
+        """
+        self._normalize()
+        others = [(other.raw * other.scale + other.offset, other.background * other.scale + other.offset)
+                  for other in others]
+
+        self.raw = (1 - rate) * self.raw + rate * np.mean([raw for raw, _ in others], axis=0)
+        self.background = (1 - rate) * self.background + rate * np.mean([background for _, background in others])
+
+    def remap(self, sources: np.ndarray, candidates: Optional[np.ndarray] = None,
+              level: Optional[float] = None) -> "PheromoneStore":
+        """Build a store over other locations, e.g. after locations were added or removed, keeping the levels of the
+        edges between locations of this store
+            :arg sources: Index in this store of each location of the new store, -1 for new locations
+            :arg candidates: (Optional) Candidate edges of the new store, see __init__
+            :arg level: (Optional) Level of the edges to or from new locations, the mean stored level by default
+        """
+        sources = np.asarray(sources)
+        size = len(sources)
+
+        if level is None:
+            level = self._clip(self.raw * self.scale + self.offset).mean().item()
+
+        store = PheromoneStore(size, level, candidates, self.bounds)
+        end = np.arange(size)[None, :] if candidates is None else candidates
+        start, end = np.broadcast_arrays(sources[:, None], sources[end])
+        known = (start >= 0) & (end >= 0)
+
+        store.raw = np.where(known, self.get(np.maximum(start, 0), np.maximum(end, 0)), level)
+        if candidates is not None and self.candidates is not None:
+            store.background = self.background * self.scale + self.offset
+
+        return store
+
+    def copy(self) -> "PheromoneStore":
+        store = PheromoneStore.__new__(PheromoneStore)
+        store.__dict__.update(self.__dict__)
+        store.raw = self.raw.copy()
+        return store
@@ -0,0 +1,131 @@
+import time
+from typing import Optional
+from src.Instance import Instance
+from src.Instrumentation import NULL_PROFILER, Profiler
+from src.Route import Route
+import numpy as np
+
+
+def savings_pairs(instance: Instance, n_neighbors: Optional[int] = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Compute the savings of serving two customers i < j in a row instead of in two separate routes,
+    d(0, i) + d(0, j) - d(i, j), sorted in descending order
+        :arg instance: Instance of the customers
+        :arg n_neighbors: (Optional) Only pair each customer with its nearest customers, all pairs if None
+        :return: Customer indices i and j of each pair and their savings
+    """
+    n = len(instance)
+    distances = instance.distances
+
+    if n_neighbors is None:
+        pairs_i, pairs_j = np.triu_indices(n, 1)
+        keep = pairs_i > 0
+        pairs_i, pairs_j = pairs_i[keep], pairs_j[keep]
+    else:
+        # Pairs of each customer with its nearest customers, each pair once
+        neighbors = instance.neighbor_lists(n_neighbors)[1:]
+        first = np.repeat(np.arange(1, n), neighbors.shape[1])
+        keys = np.unique(np.minimum(first, neighbors.ravel()) * n + np.maximum(first, neighbors.ravel()))
+        pairs_i, pairs_j = keys // n, keys % n
+
+    values = np.asarray(distances[0, pairs_i], dtype=np.float64) + distances[0, pairs_j] - distances[pairs_i, pairs_j]
+
+    # Sort the savings in descending order, ties in pair order
+    order = np.argsort(-values, kind="stable")
+    return pairs_i[order], pairs_j[order], values[order]
+
+
+def _find(parent: list[int], i: int) -> int:
+    """Find the representative of the route of customer i, halving the path on the way"""
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def _can_follow(first: Route, second: Route) -> bool:
+    """Check whether the customers of a route can be served right after the customers of another one"""
+    state_a, state_b = first.state, second.state
+
+    if not (state_a.feasible and state_b.feasible):
+        return False
+
+    # The schedule of the second route is shifted by the change of arrival at its first customer
+    arrival = state_a.departure[-2] + first.customers[-1].distance_to(second.customers[0])
+    return state_b.shift(1, arrival - state_b.arrival[1]) is not None
+
+
+def savings_routes(instance: Instance, vehicle_capacity: int, n_neighbors: Optional[int] = None,
+                   time_windows: bool = True, profiler: Profiler = NULL_PROFILER) -> list[Route]:
+    """Build routes with the parallel Clarke-Wright savings heuristic
+        :arg instance: Instance to build routes for
+        :arg vehicle_capacity: Capacity of the vehicles
+        :arg n_neighbors: (Optional) Only consider joining each customer with its nearest customers, all pairs if None
+        :arg time_windows: Only merge routes if the delivery windows are still met, routes are then never reversed.
+            Otherwise, routes are reversed when joining two heads or two tails
+        :arg profiler: Profiler timing the savings and merge phases and counting the merges
+    """
+    n = len(instance)
+
+    # Step 1 : Initialize routes, one per customer. Routes are kept by their representative in the union-find forest
+    routes: dict[int, Route] = {i: Route(instance.warehouse, [instance.locations[i]]) for i in range(1, n)}
+    parent = list(range(n))
+    size = [1] * n
+    load = instance.demand.tolist()
+
+    # Step 2 : Calculate and sort the savings
+    with profiler.phase("savings"):
+        pairs_i, pairs_j, _ = savings_pairs(instance, n_neighbors)
+
+        # Pairs whose customers cannot be served one after the other in either order are never merged
+        if time_windows:
+            forward, backward = instance.arc_feasible(pairs_i, pairs_j), instance.arc_feasible(pairs_j, pairs_i)
+            keep = forward | backward
+            pairs_i, pairs_j, forward, backward = pairs_i[keep], pairs_j[keep], forward[keep], backward[keep]
+        else:
+            forward = backward = np.ones(len(pairs_i), dtype=bool)
+
+    profiler.count("savings_pairs", len(pairs_i))
+    start = time.perf_counter()
+
+    # Step 3 : Merge routes based on savings, when i and j end routes that can be joined through the edge (i, j)
+    for i, j, i_to_j, j_to_i in zip(pairs_i.tolist(), pairs_j.tolist(), forward.tolist(), backward.tolist()):
+        root_i, root_j = _find(parent, i), _find(parent, j)
+
+        if root_i == root_j or load[root_i] + load[root_j] > vehicle_capacity:
+            continue
+
+        route_i, route_j = routes[root_i], routes[root_j]
+        head_i, tail_i = route_i.customers[0].index, route_i.customers[-1].index
+        head_j, tail_j = route_j.customers[0].index, route_j.customers[-1].index
+
+        if i not in (head_i, tail_i) or j not in (head_j, tail_j):
+            continue
+
+        # Orient the routes so that the first one ends with i or j and the second one starts with the other, both
+        # orientations are tried when both routes have a single customer
+        merged = None
+        for first, second, joined, arc in ((route_i, route_j, tail_i == i and head_j == j, i_to_j),
+                                           (route_j, route_i, tail_j == j and head_i == i, j_to_i)):
+            if joined and arc and (not time_windows or _can_follow(first, second)):
+                merged = first.customers + second.customers
+                break
+
+        # Two heads or two tails are joined by reversing a route, unless time windows are respected
+        if merged is None and not time_windows:
+            merged = route_i.customers + route_j.customers[::-1] if tail_i == i else \
+                route_i.customers[::-1] + route_j.customers
+
+        if merged is None:
+            continue
+
+        # Union by size, the merged route is kept by the new representative
+        root, child = (root_i, root_j) if size[root_i] >= size[root_j] else (root_j, root_i)
+        parent[child] = root
+        size[root] += size[child]
+        load[root] += load[child]
+        del routes[child]
+        routes[root] = Route(instance.warehouse, merged)
+        profiler.count("merges")
+
+    profiler.add_time("merge", time.perf_counter() - start)
+    return list(routes.values())
@@ -0,0 +1,91 @@
+import time
+from dataclasses import dataclass
+from threading import Event
+from typing import Optional
+from src.Instance import Instance
+from src.Route import Route
+from src.Solution import Solution
+import numpy as np
+import src.Heuristics.AntColony as AntColony
+
+
+@dataclass
+class StoppingCriteria:
+    """Class for storing the criteria ending a run before its maximum number of iterations, all of them optional.
+
+    Time limits are checked between iterations: a run stops early when the next iteration is not expected to finish
+    in time, assuming it lasts as long as the previous one, so the best solution is available by the deadline."""
+    # Seconds from the start of the run
+    time_budget: Optional[float] = None
+    # Wall-clock deadline, as a time.time() timestamp
+    deadline: Optional[float] = None
+    # Number of iterations without improvement of the best cost
+    patience: Optional[int] = None
+    # Cost at or below which a solution is good enough
+    target_cost: Optional[float] = None
+    # Event set by another thread to cancel the run
+    cancel: Optional[Event] = None
+
+    def time_limit(self, start: float) -> float:
+        """Get the time.perf_counter() value at which a run started at start must end, inf without time limits"""
+        limits = [float("inf")]
+
+        if self.time_budget is not None:
+            limits.append(start + self.time_budget)
+
+        if self.deadline is not None:
+            limits.append(time.perf_counter() + self.deadline - time.time())
+
+        return min(limits)
+
+    def reason(self, best_cost_history: list[float], now: float, limit: float,
+               iteration_time: float) -> Optional[str]:
+        """Get the reason to stop a run after an iteration, None to go on
+            :arg best_cost_history: Best cost after each iteration so far
+            :arg now: Current time.perf_counter() value
+            :arg limit: Time limit of the run, see time_limit
+            :arg iteration_time: Duration of the last iteration
+        """
+        if self.cancel is not None and self.cancel.is_set():
+            return "cancelled"
+
+        if self.target_cost is not None and best_cost_history and best_cost_history[-1] <= self.target_cost:
+            return "target_cost"
+
+        # The best cost never increases, so it did not improve if it is the same as patience iterations ago
+        if self.patience is not None and len(best_cost_history) > self.patience and \
+                best_cost_history[-1] >= best_cost_history[-1 - self.patience]:
+            return "patience"
+
+        if now + iteration_time > limit:
+            return "time_budget"
+
+        return None
+
+    def bounded(self) -> bool:
+        """Check whether some criterion can end a run"""
+        return any(value is not None for value in (self.time_budget, self.deadline, self.patience,
+                                                   self.target_cost, self.cancel))
+
+
+@dataclass
+class Progress:
+    """Class for storing the state of a run after an iteration, see Vrp.ant_colony_progress"""
+    iteration: int
+    best_cost: float
+    # Seconds since the start of the run
+    elapsed: float
+    best_solution: np.ndarray
+    instance: Instance
+    # Reason the run stops after this iteration, None if it goes on
+    stop_reason: Optional[str] = None
+
+    @property
+    def routes(self) -> list[Route]:
+        """Best routes so far, decoded from the best giant tour on access"""
+        return AntColony.tour_to_routes(self.best_solution, self.instance)
+
+    @property
+    def solution(self) -> Solution:
+        """Best solution so far, with the cost and load of each route"""
+        return Solution.from_tour(self.best_solution, self.instance)
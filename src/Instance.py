@@ -0,0 +1,325 @@
+import hashlib
+from dataclasses import dataclass
+from math import sqrt
+from typing import Optional, Union
+from src.Location import Location
+from src.LocationSet import LocationSet
+from src.SpatialIndex import SpatialIndex
+import numpy as np
+
+
+class LazyDistances:
+    """Class computing euclidean distances on demand, indexed like a dense distance matrix, for instances too large
+    to hold one. Distances are computed with the same arithmetic as Instance._distance_matrix, so both give the same
+    values.
+
+    Indexing with integers, slices and integer arrays is supported, arrays are broadcast together. Converting it to an
+    array, e.g. np.asarray(distances), builds the dense matrix."""
+
+    def __init__(self, coords: np.ndarray, dtype: np.dtype = np.float64):
+        """
+            :arg coords: (n, 2) array of coordinates
+            :arg dtype: dtype of the distances, as if they were stored in a matrix
+        """
+        self.coords = np.asarray(coords, dtype=np.float64)
+        self.dtype = np.dtype(dtype)
+        self._x, self._y = self.coords[:, 0].tolist(), self.coords[:, 1].tolist()
+        self._indices = np.arange(len(self.coords))
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return len(self.coords), len(self.coords)
+
+    @property
+    def ndim(self) -> int:
+        return 2
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    def item(self, a: int, b: int) -> float:
+        """Get the distance between the locations at indices a and b, without any array overhead"""
+        dx, dy = self._x[a] - self._x[b], self._y[a] - self._y[b]
+        distance = sqrt(dx * dx + dy * dy)
+        return distance if self.dtype == np.float64 else float(self.dtype.type(distance))
+
+    def __getitem__(self, key) -> Union[np.ndarray, np.floating]:
+        rows, columns = ((key if isinstance(key, tuple) else (key,)) + (slice(None),))[:2]
+        start, end = self._indices[rows], self._indices[columns]
+
+        # Slices select whole rows or columns, like basic indexing of a matrix
+        if isinstance(columns, slice):
+            start = np.asarray(start)[..., None]
+        elif isinstance(rows, slice):
+            start = start.reshape((-1,) + (1,) * np.ndim(end))
+
+        distances = np.sqrt(((self.coords[start] - self.coords[end]) ** 2).sum(axis=-1)).astype(self.dtype)
+        return distances[()] if distances.ndim == 0 else distances
+
+    def __array__(self, dtype: Optional[np.dtype] = None, copy: Optional[bool] = None) -> np.ndarray:
+        return Instance._distance_matrix(self.coords, dtype or self.dtype, None)
+
+
+@dataclass
+class Instance:
+    """Class for storing the problem-level data shared by all locations, routes and heuristics of a VRP.
+
+    Locations are referred to by dense integer indices: index 0 is the warehouse, indices 1..n are the customers in
+    the order they were given."""
+    location_set: LocationSet
+    distances: Union[np.ndarray, LazyDistances]
+
+    # Location views, bound to the instance, kept for the object-based APIs
+    locations: list[Location]
+
+    # Rows of the distance matrix computed at once, bounds the size of the temporary arrays
+    _block_size = 256
+
+    # Tolerance of the arc feasibility checks, an arc is only pruned if it is infeasible beyond rounding errors
+    _arc_tolerance = 1e-6
+
+    def __init__(self, warehouse: Location, customers: list[Location], dtype: np.dtype = np.float64,
+                 mmap_path: Optional[str] = None, lazy: bool = False):
+        """Build the instance and its distance matrix
+            :arg warehouse: Warehouse location
+            :arg customers: Customer locations
+            :arg dtype: dtype of the distance matrix, use np.float32 to halve its memory footprint
+            :arg mmap_path: (Optional) File to memory-map the distance matrix to instead of keeping it in memory
+            :arg lazy: Compute the distances on demand instead of storing them, see LazyDistances
+        """
+        self._bind(LocationSet.from_locations([warehouse] + customers), None, dtype, mmap_path, lazy)
+
+    @classmethod
+    def from_location_set(cls, location_set: LocationSet, distances: Optional[np.ndarray] = None,
+                          dtype: np.dtype = np.float64, mmap_path: Optional[str] = None,
+                          lazy: bool = False) -> "Instance":
+        """Build an instance from columnar location data, the warehouse being at index 0
+            :arg location_set: Locations of the instance
+            :arg distances: (Optional) Precomputed distance matrix, e.g. shared memory in worker processes
+            :arg dtype: dtype of the distance matrix, if computed
+            :arg mmap_path: (Optional) File to memory-map the distance matrix to, if computed
+            :arg lazy: Compute the distances on demand instead of storing them, if not given
+        """
+        instance = cls.__new__(cls)
+        instance._bind(location_set, distances, dtype, mmap_path, lazy)
+        return instance
+
+    def _bind(self, location_set: LocationSet, distances: Optional[np.ndarray], dtype: np.dtype,
+              mmap_path: Optional[str], lazy: bool = False):
+        self.location_set = location_set
+        if distances is not None:
+            self.distances = distances
+        elif lazy:
+            self.distances = LazyDistances(location_set.coordinates(), dtype)
+        else:
+            self.distances = self._distance_matrix(location_set.coordinates(), dtype, mmap_path)
+        self.locations = location_set.views(self)
+        self._neighbor_lists = {}
+        self._feasible_neighbor_lists = {}
+        self._spatial_index = None
+        self._arcs = None
+        self._fingerprint = None
+        self._id_index = None
+
+    def update(self, location_set: LocationSet, sources: np.ndarray) -> "Instance":
+        """Build an instance over changed locations, copying the distances between unchanged locations instead of
+        computing them again. The distance matrix is kept in memory, distances computed on demand stay so
+            :arg location_set: New locations, the warehouse first
+            :arg sources: Index in this instance of each new location, -1 for locations at new coordinates
+        """
+        if isinstance(self.distances, LazyDistances):
+            return Instance.from_location_set(location_set, dtype=self.distances.dtype, lazy=True)
+
+        sources = np.asarray(sources)
+        coords = location_set.coordinates()
+        distances = np.empty((len(location_set), len(location_set)), dtype=self.distances.dtype)
+
+        kept = np.flatnonzero(sources >= 0)
+        distances[np.ix_(kept, kept)] = self.distances[np.ix_(sources[kept], sources[kept])]
+
+        # Distances from and to the new locations, block by block
+        fresh = np.flatnonzero(sources < 0)
+        for start in range(0, len(fresh), self._block_size):
+            rows = fresh[start:start + self._block_size]
+            block = np.sqrt(((coords[rows, None, :] - coords[None, :, :]) ** 2).sum(axis=2))
+            distances[rows] = block
+            distances[:, rows] = block.T
+
+        return Instance.from_location_set(location_set, distances)
+
+    def __deepcopy__(self, memo: dict) -> "Instance":
+        # The problem data is never modified, copies of routes and solutions can share it
+        return self
+
+    # Location attributes as arrays, indexed like the distance matrix
+    @property
+    def demand(self) -> np.ndarray:
+        return self.location_set.demand
+
+    @property
+    def ready_time(self) -> np.ndarray:
+        return self.location_set.ready_time
+
+    @property
+    def due_date(self) -> np.ndarray:
+        return self.location_set.due_date
+
+    @property
+    def service(self) -> np.ndarray:
+        return self.location_set.service
+
+    def __len__(self) -> int:
+        return len(self.distances)
+
+    @property
+    def warehouse(self) -> Location:
+        return self.locations[0]
+
+    @property
+    def customers(self) -> list[Location]:
+        return self.locations[1:]
+
+    def distance(self, a: int, b: int) -> float:
+        """Get the distance between the locations at indices a and b"""
+        return self.distances.item(a, b)
+
+    def neighbor_lists(self, k: int) -> np.ndarray:
+        """Get the k nearest customers of every location, nearest first, computed once per k
+            :arg k: Number of neighbors, capped to the number of other customers
+            :return: (n, k) array of customer indices, row 0 holds the customers nearest to the warehouse
+        """
+        k = max(min(k, len(self) - 2), 0)
+
+        if k not in self._neighbor_lists:
+            # Each location but the warehouse is excluded from its own neighbors, indices are shifted by the warehouse
+            self._neighbor_lists[k] = self.spatial_index.nearest(self.location_set.coordinates(), k,
+                                                                 exclude=np.arange(len(self)) - 1) + 1
+
+        return self._neighbor_lists[k]
+
+    def feasible_neighbor_lists(self, k: int) -> np.ndarray:
+        """Get the k nearest customers of every location which can be served right after it, nearest first, computed
+        once per k. Rows with fewer feasible successors are completed with the nearest infeasible ones
+            :arg k: Number of neighbors, capped to the number of other customers
+            :return: (n, k) array of customer indices
+        """
+        k = max(min(k, len(self) - 2), 0)
+
+        if k not in self._feasible_neighbor_lists:
+            neighbors = np.empty((len(self), k), dtype=np.int64)
+
+            for start in range(0, len(self) if k else 0, self._block_size):
+                rows = np.array(self.distances[start:start + self._block_size, 1:], dtype=np.float64)
+                own = np.arange(start, start + len(rows))
+                rows[own[own >= 1] - start, own[own >= 1] - 1] = np.inf
+
+                # Infeasible successors rank after every feasible one
+                feasible = self.feasible_successors(own)[:, 1:]
+                rows[~feasible] += rows[np.isfinite(rows)].max(initial=0) + 1
+
+                nearest = np.argpartition(rows, k - 1, axis=1)[:, :k]
+                order = np.argsort(np.take_along_axis(rows, nearest, axis=1), axis=1, kind="stable")
+                neighbors[start:start + len(rows)] = np.take_along_axis(nearest, order, axis=1) + 1
+
+            self._feasible_neighbor_lists[k] = neighbors
+
+        return self._feasible_neighbor_lists[k]
+
+    @property
+    def earliest_start(self) -> np.ndarray:
+        """Earliest time the service of each location can start, leaving the warehouse at time 0"""
+        return np.maximum(np.asarray(self.distances[0], dtype=np.float64), self.ready_time)
+
+    @property
+    def latest_arrival(self) -> np.ndarray:
+        """Latest arrival time at each location which still allows returning to the warehouse in time"""
+        return np.minimum(self.due_date, self.due_date[0] - self.service - np.asarray(self.distances[:, 0],
+                                                                                     dtype=np.float64))
+
+    @property
+    def arcs(self) -> np.ndarray:
+        """Bit-packed arc feasibility matrix, built on first use: bit j of row i is set if location j can be reached
+        within its delivery window right after serving location i, see feasible_successors and arc_feasible"""
+        if self._arcs is None:
+            n = len(self)
+            earliest_departure = self.earliest_start + self.service
+            self._arcs = np.empty((n, (n + 7) // 8), dtype=np.uint8)
+
+            for start in range(0, n, self._block_size):
+                rows = np.asarray(self.distances[start:start + self._block_size], dtype=np.float64)
+                feasible = earliest_departure[start:start + len(rows), None] + rows <= \
+                    self.due_date + self._arc_tolerance
+                own = np.arange(start, start + len(rows))
+                feasible[own - start, own] = False
+                self._arcs[start:start + len(rows)] = np.packbits(feasible, axis=1)
+
+        return self._arcs
+
+    def feasible_successors(self, starts: np.ndarray) -> np.ndarray:
+        """Get the locations which can be served right after some locations
+            :return: (len(starts), n) boolean array
+        """
+        return np.unpackbits(self.arcs[starts], axis=1, count=len(self)).astype(bool)
+
+    def arc_feasible(self, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+        """Check whether locations can be served right after others, start and end are broadcast together. Looked up
+        in the arc matrix once it is built, otherwise only the given arcs are checked, e.g. the arcs to the nearest
+        neighbors of large instances"""
+        start, end = np.asarray(start), np.asarray(end)
+
+        if self._arcs is not None:
+            return (self._arcs[start, end >> 3] >> (7 - (end & 7)) & 1).astype(bool)
+
+        earliest_departure = np.maximum(np.asarray(self.distances[0, start], dtype=np.float64),
+                                        self.ready_time[start]) + self.service[start]
+        return (earliest_departure + np.asarray(self.distances[start, end], dtype=np.float64) <=
+                self.due_date[end] + self._arc_tolerance) & (start != end)
+
+    @property
+    def spatial_index(self) -> SpatialIndex:
+        """Grid over the customer coordinates, built on first use, its point indices are shifted by the warehouse"""
+        if self._spatial_index is None:
+            self._spatial_index = SpatialIndex(self.location_set.coordinates()[1:])
+
+        return self._spatial_index
+
+    def fingerprint(self) -> str:
+        """Hash of the location data, computed on first use, identifies the instance across processes and runs"""
+        if self._fingerprint is None:
+            digest = hashlib.sha256()
+            for column in self.location_set.COLUMNS:
+                digest.update(np.ascontiguousarray(getattr(self.location_set, column), dtype=np.float64).tobytes())
+            self._fingerprint = digest.hexdigest()[:16]
+
+        return self._fingerprint
+
+    @property
+    def id_index(self) -> dict[int, int]:
+        """Index of each location id, built on first use"""
+        if self._id_index is None:
+            self._id_index = {location_id: i for i, location_id in enumerate(self.location_set.id.tolist())}
+
+        return self._id_index
+
+    @classmethod
+    def _distance_matrix(cls, coords: np.ndarray, dtype: np.dtype, mmap_path: Optional[str]) -> np.ndarray:
+        """Compute the euclidean distance matrix of a set of coordinates, block by block
+            :arg coords: (n, 2) array of coordinates
+            :arg dtype: dtype of the resulting matrix
+            :arg mmap_path: (Optional) File to memory-map the resulting matrix to
+        """
+        n = len(coords)
+
+        if mmap_path:
+            distances = np.lib.format.open_memmap(mmap_path, mode="w+", dtype=dtype, shape=(n, n))
+        else:
+            distances = np.empty((n, n), dtype=dtype)
+
+        for start in range(0, n, cls._block_size):
+            diff = coords[start:start + cls._block_size, None, :] - coords[None, :, :]
+            distances[start:start + cls._block_size] = np.sqrt((diff ** 2).sum(axis=2))
+
+        if mmap_path:
+            distances.flush()
+
+        return distances
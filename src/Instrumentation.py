@@ -0,0 +1,142 @@
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Callable, Optional
+
+
+class _Phase:
+    """Context manager adding its wall time to a phase timer of a profiler"""
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *args):
+        self.profiler.add_time(self.name, time.perf_counter() - self.start)
+
+
+class Profiler:
+    """Class collecting the wall time spent in each phase of the heuristics, counters and one event per iteration.
+
+    Heuristics accept a profiler argument and default to NULL_PROFILER, whose methods do nothing. Phases may be
+    nested, each phase timer holds the total time spent in that phase."""
+    enabled = True
+
+    def __init__(self, on_iteration: Optional[Callable[[dict], None]] = None):
+        """
+            :arg on_iteration: (Optional) Called with each iteration event as soon as it is recorded, e.g. to stream
+                the events to a log
+        """
+        self.on_iteration = on_iteration
+        self.timers: dict[str, float] = defaultdict(float)
+        self.calls: dict[str, int] = defaultdict(int)
+        self.counters: dict[str, int] = defaultdict(int)
+        self.events: list[dict] = []
+
+    def phase(self, name: str) -> _Phase:
+        """Time a phase: with profiler.phase("construction"): ..."""
+        return _Phase(self, name)
+
+    def add_time(self, name: str, seconds: float):
+        """Add wall time to a phase timer"""
+        self.timers[name] += seconds
+        self.calls[name] += 1
+
+    def count(self, name: str, value: int = 1):
+        """Increment a counter"""
+        self.counters[name] += value
+
+    def iteration(self, **event):
+        """Record the event of an iteration, e.g. its index, best cost, wall time and diversity"""
+        self.events.append(event)
+
+        if self.on_iteration:
+            self.on_iteration(event)
+
+    def to_dict(self) -> dict:
+        return {"timers": dict(self.timers), "calls": dict(self.calls), "counters": dict(self.counters),
+                "events": self.events}
+
+    def to_json(self, filename: Optional[str] = None) -> str:
+        """Export the timers, counters and events as JSON
+            :arg filename: (Optional) File to write the JSON to
+        """
+        text = json.dumps(self.to_dict(), indent=2)
+
+        if filename:
+            _write_atomic(filename, text)
+
+        return text
+
+    def to_prometheus(self, filename: Optional[str] = None, prefix: str = "vrp",
+                      labels: Optional[dict[str, str]] = None) -> str:
+        """Export the timers, counters and last event in the Prometheus text format, e.g. for the textfile collector
+        of the node exporter
+            :arg filename: (Optional) File to write the metrics to, replaced atomically
+            :arg prefix: Prefix of the metric names
+            :arg labels: (Optional) Labels added to every metric, e.g. {"instance": "c101"}
+        """
+        labels = labels or {}
+
+        def sample(name: str, value: float, **extra) -> str:
+            pairs = ",".join(f'{key}="{value}"' for key, value in {**labels, **extra}.items())
+            return f"{prefix}_{name}{{{pairs}}} {value}" if pairs else f"{prefix}_{name} {value}"
+
+        lines = [f"# TYPE {prefix}_phase_seconds_total counter"]
+        lines += [sample("phase_seconds_total", seconds, phase=name) for name, seconds in self.timers.items()]
+        lines += [f"# TYPE {prefix}_phase_calls_total counter"]
+        lines += [sample("phase_calls_total", calls, phase=name) for name, calls in self.calls.items()]
+        lines += [f"# TYPE {prefix}_events_total counter"]
+        lines += [sample("events_total", value, counter=name) for name, value in self.counters.items()]
+        lines += [f"# TYPE {prefix}_iterations_total counter", sample("iterations_total", len(self.events))]
+
+        # Numeric fields of the last event, e.g. the best cost, as gauges
+        if self.events:
+            for name, value in self.events[-1].items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines += [f"# TYPE {prefix}_{name} gauge", sample(name, value)]
+
+        text = "\n".join(lines) + "\n"
+
+        if filename:
+            _write_atomic(filename, text)
+
+        return text
+
+
+class NullProfiler(Profiler):
+    """Profiler recording nothing, the default of every heuristic"""
+    enabled = False
+
+    def __init__(self):
+        super().__init__()
+        self._phase = nullcontext()
+
+    def phase(self, name: str) -> nullcontext:
+        return self._phase
+
+    def add_time(self, name: str, seconds: float):
+        pass
+
+    def count(self, name: str, value: int = 1):
+        pass
+
+    def iteration(self, **event):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+def _write_atomic(filename: str, text: str):
+    """Write a file through a temporary file, so readers never see a partial file"""
+    temporary = f"{filename}.{os.getpid()}.tmp"
+    with open(temporary, "w") as file:
+        file.write(text)
+    os.replace(temporary, filename)
@@ -1,13 +1,17 @@
-from copy import deepcopy
 from math import sqrt
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from operator import itemgetter
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 
+if TYPE_CHECKING:
+    from src.Instance import Instance
 
-@dataclass(frozen=True)
+
+@dataclass(frozen=True, slots=True)
 class Location:
-    """Class for storing data about VRP locations."""
+    """Class for storing data about VRP locations.
+
+    Locations of an instance are lightweight views of its LocationSet, the columnar data heuristics work on."""
     id: int
     x: int
     y: int
@@ -16,9 +20,28 @@ class Location:
     due_date: int
     service: int
 
+    # Position of the location in the distance matrix of the instance it belongs to, if any
+    index: int = field(default=-1, compare=False, repr=False)
+    instance: Optional["Instance"] = field(default=None, compare=False, repr=False)
+
+    def __hash__(self) -> int:
+        # Equal locations have equal ids, hashing the id alone avoids hashing all seven fields
+        return hash(self.id)
+
+    def __copy__(self) -> "Location":
+        # Locations are immutable, copies can share the same object
+        return self
+
+    def __deepcopy__(self, memo: dict) -> "Location":
+        return self
+
     def distance_to(self, other: "Location") -> float:
         """Calculate the distance to travel from the current location to another location.
+            Looks the distance up in the distance matrix of the instance if both locations belong to the same one.
             :arg other: The other location to calculate the distance to"""
+        if self.instance is not None and self.instance is other.instance:
+            return self.instance.distances.item(self.index, other.index)
+
         return sqrt((self.x - other.x) ** 2 + (self.y - other.y) ** 2)
 
     def cost_to(self, other: "Location", current_cost: float = 0) -> float:
@@ -40,7 +63,7 @@ class Location:
             :arg current_cost: Cost that was already incurred before reaching this location
             :return List of reachable locations
         """
-        return [loc for loc in deepcopy(others) if loc.due_date >= self.distance_to(loc) + current_cost]
+        return [loc for loc in others if loc.due_date >= self.distance_to(loc) + current_cost]
 
     def find_deliverable(self, others: list["Location"], capacity: int, current_cost: int = 0) -> list["Location"]:
         """Find all neighbors whose delivery windows are reachable from the current location and whose demand can be fulfilled with the remaining truck capacity, return them.
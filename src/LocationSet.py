@@ -0,0 +1,56 @@
+from dataclasses import dataclass
+from typing import Optional, TYPE_CHECKING
+from src.Location import Location
+import numpy as np
+
+if TYPE_CHECKING:
+    from src.Instance import Instance
+
+
+@dataclass
+class LocationSet:
+    """Class for storing the data of a set of VRP locations as columns, locations are referred to by their index.
+
+    Location objects are only created as lightweight views for API compatibility, see views."""
+    id: np.ndarray
+    x: np.ndarray
+    y: np.ndarray
+    demand: np.ndarray
+    ready_time: np.ndarray
+    due_date: np.ndarray
+    service: np.ndarray
+
+    # Column names, in the order of the Location fields
+    COLUMNS = ("id", "x", "y", "demand", "ready_time", "due_date", "service")
+
+    @classmethod
+    def from_locations(cls, locations: list[Location]) -> "LocationSet":
+        """Build a location set from location objects"""
+        return cls(*(np.array([getattr(loc, column) for loc in locations]) for column in cls.COLUMNS))
+
+    @classmethod
+    def from_records(cls, records: np.ndarray) -> "LocationSet":
+        """Build a location set from a structured array with one field per column, e.g. Dataset.CUSTOMER_DTYPE"""
+        return cls(*(np.ascontiguousarray(records[column]) for column in cls.COLUMNS))
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    def coordinates(self) -> np.ndarray:
+        """Get the (n, 2) array of coordinates"""
+        return np.column_stack((self.x, self.y)).astype(np.float64)
+
+    def subset(self, indices: np.ndarray) -> "LocationSet":
+        """Get the locations at some indices, in that order"""
+        return LocationSet(*(getattr(self, column)[indices] for column in self.COLUMNS))
+
+    def concat(self, other: "LocationSet") -> "LocationSet":
+        """Get the locations of this set followed by the locations of another one"""
+        return LocationSet(*(np.concatenate((getattr(self, column), getattr(other, column)))
+                             for column in self.COLUMNS))
+
+    def views(self, instance: Optional["Instance"] = None) -> list[Location]:
+        """Create a Location view of every location, bound to an instance if given so that their distances are
+        looked up in its distance matrix"""
+        columns = [getattr(self, column).tolist() for column in self.COLUMNS]
+        return [Location(*values, index=i, instance=instance) for i, values in enumerate(zip(*columns))]
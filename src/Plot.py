@@ -0,0 +1,115 @@
+"""Plotting of routes and cost histories.
+
+matplotlib is only imported when something is drawn, so that importing the solver modules, e.g. in headless batch
+workers, does not pay for it. Files are written through a standalone Figure, without pyplot, so no GUI backend or
+global figure state is involved."""
+import os
+from typing import Optional, TYPE_CHECKING
+from src.Location import Location
+from src.Route import Route
+import numpy as np
+
+if TYPE_CHECKING:
+    from matplotlib.axes import Axes
+    from matplotlib.figure import Figure
+
+# Colormap cycled through by the routes
+COLORMAP = "tab20"
+
+
+def draw_routes(ax: "Axes", routes: list[Route], warehouse: Location, title: Optional[str] = None,
+                labels: bool = False, bounds: Optional[tuple[float, float, float, float]] = None):
+    """Draw all routes on an axis at once: one line collection for the legs of every route, one scatter for the
+    customers, colored by route
+        :arg ax: Axis to draw on
+        :arg routes: Routes to draw
+        :arg warehouse: Warehouse the routes start from
+        :arg title: (Optional) Title of the axis
+        :arg labels: Annotate the customers with their ids, only readable for small instances
+        :arg bounds: (Optional) Limits of the axis, (xmin, xmax, ymin, ymax)
+    """
+    from matplotlib import colormaps
+    from matplotlib.collections import LineCollection
+
+    colors = colormaps[COLORMAP](np.arange(len(routes)) % colormaps[COLORMAP].N)
+
+    # Step 1 : Legs of every route, from the warehouse back to the warehouse
+    segments, segment_colors, points, point_colors = [], [], [], []
+    for route, color in zip(routes, colors):
+        path = np.array([(warehouse.x, warehouse.y)] + [(c.x, c.y) for c in route.customers] +
+                        [(warehouse.x, warehouse.y)], dtype=np.float64)
+        segments.append(np.stack((path[:-1], path[1:]), axis=1))
+        segment_colors.append(np.repeat(color[None, :], len(path) - 1, axis=0))
+        points.append(path[1:-1])
+        point_colors.append(np.repeat(color[None, :], len(path) - 2, axis=0))
+
+    if routes:
+        ax.add_collection(LineCollection(np.concatenate(segments), colors=np.concatenate(segment_colors),
+                                         linewidths=1, alpha=0.8, zorder=1))
+        points = np.concatenate(points)
+        ax.scatter(points[:, 0], points[:, 1], c=np.concatenate(point_colors), s=12, zorder=2, label="Customers")
+
+    # Step 2 : Warehouse, labels and layout
+    ax.scatter([warehouse.x], [warehouse.y], c="red", s=80, marker="s", zorder=3, label="Warehouse")
+
+    if labels:
+        for route in routes:
+            for customer in route.customers:
+                ax.annotate(f"C{customer.id}", (customer.x, customer.y), xytext=(3, 3), textcoords="offset points",
+                            fontsize=6)
+
+    if bounds is not None:
+        ax.set_xlim(bounds[0], bounds[1])
+        ax.set_ylim(bounds[2], bounds[3])
+    else:
+        ax.autoscale_view()
+
+    if title:
+        ax.set_title(title)
+
+    ax.set_aspect("equal")
+    ax.grid(True, linestyle=":", alpha=0.6)
+    ax.set_xlabel("X Coordinate")
+    ax.set_ylabel("Y Coordinate")
+    ax.legend(loc="upper right")
+
+
+def routes_figure(routes: list[Route], warehouse: Location, title: Optional[str] = None, labels: bool = False,
+                  bounds: Optional[tuple[float, float, float, float]] = None,
+                  figsize: tuple = (10, 8)) -> "Figure":
+    """Draw all routes on a standalone figure, not managed by pyplot, see draw_routes"""
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize, layout="tight")
+    draw_routes(fig.add_subplot(), routes, warehouse, title, labels, bounds)
+    return fig
+
+
+def save_routes(filename: str, routes: list[Route], warehouse: Location, title: Optional[str] = None,
+                labels: bool = False, bounds: Optional[tuple[float, float, float, float]] = None,
+                figsize: tuple = (10, 8), dpi: int = 150):
+    """Draw all routes and write them to an image file, the format being given by its extension, e.g. .png or .svg,
+    without any GUI backend"""
+    routes_figure(routes, warehouse, title, labels, bounds, figsize).savefig(
+        filename, dpi=dpi, format=os.path.splitext(filename)[1][1:].lower() or "png")
+
+
+def plot_routes(routes: list[Route], warehouse: Location, title: Optional[str] = None, labels: bool = False,
+                bounds: Optional[tuple[float, float, float, float]] = None, figsize: tuple = (10, 8)):
+    """Draw all routes on a new pyplot figure, for interactive use
+        :return: The figure and its axis
+    """
+    from matplotlib import pyplot as plt
+
+    fig, ax = plt.subplots(figsize=figsize)
+    draw_routes(ax, routes, warehouse, title, labels, bounds)
+    fig.tight_layout()
+    return fig, ax
+
+
+def plot_history(best_cost_history: list[float], title: str = "Best cost history"):
+    """Plot a best cost history on the current pyplot figure"""
+    from matplotlib import pyplot as plt
+
+    plt.plot(range(len(best_cost_history)), best_cost_history)
+    plt.title(title)
@@ -1,15 +1,94 @@
-from operator import itemgetter
 from typing import Optional
 
 from src.Location import Location
 from dataclasses import dataclass
-import matplotlib.pyplot as plt
-import itertools
+import numpy as np
+
+# Tolerance of the time window checks, absorbs floating point errors of the delta computations
+EPSILON = 1e-9
+
+
+@dataclass
+class RouteState:
+    """Class for storing the cached schedule of a route.
+
+    Positions are indices into nodes: 0 is the departure from the warehouse, 1..n are the customers and n + 1 is the
+    return to the warehouse."""
+    nodes: list[Location]
+    arrival: list[float]
+    departure: list[float]
+    load: list[int]
+    length: float
+    # Whether every arrival, including the return to the warehouse, is within its delivery window
+    feasible: bool
+    # Maximum delay of the arrival at a position that keeps every following arrival within its delivery window
+    slack: list[float]
+    # Total waiting time from a position to the end of the route
+    waiting: list[float]
+    # Maximum advance of the arrival at a position that also advances the return to the warehouse
+    advance: list[float]
+
+    def __init__(self, warehouse: Location, customers: list[Location]):
+        self.nodes = [warehouse] + customers + [warehouse]
+        self.arrival = [0.0]
+        self.departure = [0.0]
+        self.load = [0]
+        self.length = 0
+
+        # Forward pass, same arithmetic as Location.cost_to
+        for prev, loc in zip(self.nodes, self.nodes[1:]):
+            distance = prev.distance_to(loc)
+            arrival = self.departure[-1] + distance
+            self.arrival.append(arrival)
+            self.departure.append(arrival + max(loc.ready_time - arrival, 0) + loc.service)
+            self.load.append(self.load[-1] + loc.demand)
+            self.length += distance
+
+        self.feasible = all(arrival <= loc.due_date + EPSILON for arrival, loc in zip(self.arrival, self.nodes))
+
+        # Backward pass
+        size = len(self.nodes)
+        self.slack = [0.0] * size
+        self.waiting = [0.0] * size
+        self.advance = [float("inf")] * size
+        self.slack[-1] = warehouse.due_date - self.arrival[-1]
+
+        for k in range(size - 2, 0, -1):
+            loc, arrival = self.nodes[k], self.arrival[k]
+            wait = max(loc.ready_time - arrival, 0)
+            self.slack[k] = min(loc.due_date - arrival, wait + self.slack[k + 1])
+            self.waiting[k] = wait + self.waiting[k + 1]
+            self.advance[k] = min(max(arrival - loc.ready_time, 0), self.advance[k + 1])
+
+        self.slack[0] = self.slack[1] if size > 1 else 0.0
+
+    @property
+    def cost(self) -> float:
+        return self.arrival[-1]
+
+    def shift(self, position: int, delta: float) -> Optional[float]:
+        """Get the change of the route cost if the arrival at a position is shifted by delta, the rest of the route
+        being unchanged. Return None if a delivery window would be missed.
+            :arg position: Position of the shifted arrival
+            :arg delta: Shift of the arrival time
+        """
+        if delta > 0:
+            if delta > self.slack[position] + EPSILON:
+                return None
+
+            # The delay is absorbed by the waiting times that follow
+            return max(delta - self.waiting[position], 0)
+
+        # An earlier arrival is absorbed by the first customer whose delivery window is not yet open
+        return -min(-delta, self.advance[position])
 
 
 @dataclass
 class Route:
-    """Class for storing data about VRP Routes."""
+    """Class for storing data about VRP Routes.
+
+    The schedule of the route (arrival times, load, time window slack) is cached and invalidated when the customers
+    change through the methods of the route. Call invalidate() after mutating the customers list directly."""
     warehouse: Location
     customers: list[Location]
 
@@ -17,50 +96,171 @@ class Route:
         self.warehouse = warehouse
         self.customers = customers
 
-    def len(self) -> float:
-        """Calculate total route distance"""
-        if not self.customers:
-            return 0
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+
+        if name in ("warehouse", "customers"):
+            super().__setattr__("_state", None)
 
-        length = self.warehouse.distance_to(self.customers[0])
+    def invalidate(self):
+        """Drop the cached schedule, required after mutating the customers list directly"""
+        self._state = None
 
-        for i in range(len(self.customers) - 1):
-            length += self.customers[i].distance_to(self.customers[i + 1])
+    @property
+    def state(self) -> RouteState:
+        """Cached schedule of the route"""
+        if self._state is None:
+            self._state = RouteState(self.warehouse, self.customers)
 
-        length += self.customers[-1].distance_to(self.warehouse)
+        return self._state
 
-        return length
+    def len(self) -> float:
+        """Calculate total route distance"""
+        return self.state.length
 
     def merge(self, other: "Route") -> "Route":
         """Merge another route into the current one"""
         self.customers += other.customers
         return self
 
+    def append(self, customer: Location):
+        """Add a customer at the end of the route"""
+        self.customers.append(customer)
+        self.invalidate()
+
+    def insert(self, position: int, customer: Location):
+        """Insert a customer before the customer at a position"""
+        self.customers.insert(position, customer)
+        self.invalidate()
+
+    def replace(self, position: int, customer: Location) -> Location:
+        """Replace the customer at a position by another one and return the replaced customer"""
+        replaced = self.customers[position]
+        self.customers[position] = customer
+        self.invalidate()
+        return replaced
+
+    def pop(self, position: int = -1) -> Location:
+        """Remove the customer at a position and return it"""
+        customer = self.customers.pop(position)
+        self.invalidate()
+        return customer
+
     def demand(self) -> int:
         """Get total demand of all customers in the route"""
-        return sum([customer.demand for customer in self.customers])
+        return self.state.load[-1]
 
     def cost(self, customers: list[Location] = None) -> float:
         """Calculate total cost (distance and possible waiting time for package readiness)"""
-        if not self.customers:
-            return 0
+        return self.state.cost
 
-        cost = self.warehouse.cost_to(self.customers[0])
+    def is_feasible(self, capacity: Optional[int] = None) -> bool:
+        """Check whether every delivery window, including the return to the warehouse, and the capacity are respected
+            :arg capacity: (Optional) Vehicle capacity to check the demand against
+        """
+        return self.state.feasible and (capacity is None or self.demand() <= capacity)
+
+    # Constant time move evaluation, based on the cached schedule
+    def insertion_cost(self, customer: Location, position: int, capacity: Optional[int] = None) -> Optional[float]:
+        """Get the change of the route cost when inserting a customer before the customer at a position, or None if
+        the insertion is infeasible
+            :arg customer: Customer to insert
+            :arg position: Position to insert the customer at, len(customers) to append it
+            :arg capacity: (Optional) Vehicle capacity to check the demand against
+        """
+        state = self.state
 
-        for i in range(len(self.customers) - 1):
-            cost = self.customers[i].cost_to(self.customers[i + 1], cost)
+        if capacity is not None and state.load[-1] + customer.demand > capacity:
+            return None
 
-        cost = self.customers[-1].cost_to(self.warehouse, cost)
+        prev, nxt = state.nodes[position], state.nodes[position + 1]
+        arrival = state.departure[position] + prev.distance_to(customer)
 
-        return cost
+        if arrival > customer.due_date + EPSILON:
+            return None
+
+        departure = arrival + max(customer.ready_time - arrival, 0) + customer.service
+        return state.shift(position + 1, departure + customer.distance_to(nxt) - state.arrival[position + 1])
+
+    def removal_cost(self, position: int) -> Optional[float]:
+        """Get the change of the route cost when removing the customer at a position
+            :arg position: Position of the customer to remove
+        """
+        state = self.state
+        prev, nxt = state.nodes[position], state.nodes[position + 2]
+        arrival = state.departure[position] + prev.distance_to(nxt)
+        return state.shift(position + 2, arrival - state.arrival[position + 2])
+
+    def replacement_cost(self, position: int, customer: Location, capacity: Optional[int] = None) -> Optional[float]:
+        """Get the change of the route cost when replacing the customer at a position by another one, or None if the
+        replacement is infeasible
+            :arg position: Position of the customer to replace
+            :arg customer: Customer to put in its place
+            :arg capacity: (Optional) Vehicle capacity to check the demand against
+        """
+        state = self.state
+
+        if capacity is not None and state.load[-1] - state.nodes[position + 1].demand + customer.demand > capacity:
+            return None
+
+        prev, nxt = state.nodes[position], state.nodes[position + 2]
+        arrival = state.departure[position] + prev.distance_to(customer)
+
+        if arrival > customer.due_date + EPSILON:
+            return None
+
+        departure = arrival + max(customer.ready_time - arrival, 0) + customer.service
+        return state.shift(position + 2, departure + customer.distance_to(nxt) - state.arrival[position + 2])
 
     # Route solvers
-    def brute_force(self):
-        """Brute force the route, this does not take into account the delivery windows"""
-        permutations = [Route(self.warehouse, list(record)) for record in itertools.permutations(self.customers)]
-        lens = [(record.len(), record) for record in permutations]
+    def held_karp(self, time_windows: bool = False, max_memory: int = 256 * 2 ** 20) -> "Route":
+        """Find the optimal order of the customers with dynamic programming over subsets of customers (Held-Karp),
+        in O(2^n * n^2) time instead of O(n!).
+
+        Without time windows the route length is minimized. With time windows the route cost is minimized and orders
+        missing a delivery window, including the return to the warehouse, are pruned; the route is returned unchanged
+        if no order is feasible.
+
+        If the dynamic programming tables would exceed max_memory, falls back to a 2-opt heuristic (respecting the
+        delivery windows with time_windows) which is not guaranteed to be optimal.
+            :arg time_windows: Take the delivery windows into account
+            :arg max_memory: Maximum size of the dynamic programming tables, in bytes
+            :return: A new route with the customers in the optimal order
+        """
+        n = len(self.customers)
+
+        # Cost table (float64) and predecessor table (int8) over all (subset, last customer) states
+        if n >= 2 ** 7 or (2 ** n) * n * 9 > max_memory:
+            return self._optimize_heuristic(time_windows)
+
+        nodes = [self.warehouse] + self.customers
+        order = _held_karp(_distance_matrix(nodes),
+                           np.array([loc.ready_time for loc in nodes], dtype=np.float64),
+                           np.array([loc.due_date for loc in nodes], dtype=np.float64),
+                           np.array([loc.service for loc in nodes], dtype=np.float64),
+                           time_windows)
+
+        if order is None:
+            return Route(self.warehouse, list(self.customers))
 
-        return min(lens, key=itemgetter(0))[1]
+        return Route(self.warehouse, [self.customers[i] for i in order])
+
+    def _optimize_heuristic(self, time_windows: bool) -> "Route":
+        """Improve the order of the customers with 2-opt, the fallback of held_karp for long routes"""
+        if time_windows:
+            instance = self.warehouse.instance
+
+            if instance is None:
+                return Route(self.warehouse, list(self.customers))
+
+            # Imported here, the local search itself depends on routes
+            from src.Heuristics.LocalSearch import LocalSearch
+
+            local_search = LocalSearch(instance, self.demand(), operators=("two_opt", "or_opt"))
+            return (local_search.improve([self]) or [Route(self.warehouse, [])])[0]
+
+        nodes = [self.warehouse] + self.customers
+        return Route(self.warehouse, [nodes[i] for i in _two_opt(_distance_matrix(nodes))[1:]])
 
     def print(self, name: str = "Route"):
         print(f"==== {name} =====")
@@ -100,8 +300,8 @@ class Route:
         print(f"▼   Arrival: {cost}")
         print(f"{'■ Warehouse':<30} ID: {self.warehouse.id}")
 
-    def plot(self, xmin=Optional[int], xmax=Optional[int], ymin=Optional[int], ymax=Optional[int],
-             title: str = "Vehicle Route", figsize: tuple = (10, 8)):
+    def plot(self, xmin: Optional[int] = None, xmax: Optional[int] = None, ymin: Optional[int] = None,
+             ymax: Optional[int] = None, title: str = "Vehicle Route", figsize: tuple = (10, 8)):
         """
         Plot a VRP route showing warehouse, customers, and the complete path.
         
@@ -116,6 +316,9 @@ class Route:
             :param xmax: Max x of the plot
             :param xmin: Min x of the plot
         """
+        # Imported here, only plotting pays for matplotlib
+        import matplotlib.pyplot as plt
+
         # Create figure and axis
         fig, ax = plt.subplots(figsize=figsize)
 
@@ -178,3 +381,120 @@ class Route:
         plt.tight_layout()
 
         return fig, ax
+
+
+def _distance_matrix(nodes: list[Location]) -> np.ndarray:
+    """Get the distance matrix between locations, looked up in their instance if they all belong to the same one"""
+    instance = nodes[0].instance
+
+    if instance is not None and all(loc.instance is instance for loc in nodes):
+        indices = [loc.index for loc in nodes]
+        return np.asarray(instance.distances[np.ix_(indices, indices)], dtype=np.float64)
+
+    coords = np.array([(loc.x, loc.y) for loc in nodes], dtype=np.float64)
+    return np.sqrt(((coords[:, None, :] - coords[None, :, :]) ** 2).sum(axis=2))
+
+
+def _held_karp(distances: np.ndarray, ready_time: np.ndarray, due_date: np.ndarray, service: np.ndarray,
+               time_windows: bool) -> Optional[list[int]]:
+    """Find the optimal order of the customers of a route with dynamic programming over subsets
+        :arg distances: Distance matrix, index 0 is the warehouse and indices 1..n the customers
+        :arg ready_time: Ready times, indexed like the distance matrix
+        :arg due_date: Due dates, indexed like the distance matrix
+        :arg service: Service times, indexed like the distance matrix
+        :arg time_windows: Minimize the route cost and prune states missing a delivery window instead of minimizing
+            the route length
+        :return: Positions of the customers (0..n - 1) in visiting order, None if no order is feasible
+    """
+    n = len(distances) - 1
+
+    if n == 0:
+        return []
+
+    between, outbound, inbound = distances[1:, 1:], distances[0, 1:], distances[1:, 0]
+    warehouse_due_date = due_date[0]
+    ready_time, due_date, service = ready_time[1:], due_date[1:], service[1:]
+    bits = 1 << np.arange(n)
+
+    # cost[subset, last]: shortest length (or earliest departure time) of a path from the warehouse visiting the
+    # customers of subset and ending at last
+    cost = np.full((1 << n, n), np.inf)
+    parent = np.full((1 << n, n), -1, dtype=np.int8)
+
+    def visit(arrival: np.ndarray, last) -> np.ndarray:
+        if not time_windows:
+            return arrival
+
+        # Same arithmetic as Location.cost_to, late arrivals are pruned
+        return np.where(arrival <= due_date[last], arrival + np.maximum(ready_time[last] - arrival, 0) + service[last],
+                        np.inf)
+
+    cost[bits, np.arange(n)] = visit(outbound, np.arange(n))
+
+    subsets = np.arange(1 << n)
+    sizes = np.zeros(1 << n, dtype=np.int64)
+    for bit in bits:
+        sizes += (subsets & bit) != 0
+
+    # Subsets of the same size only depend on smaller subsets
+    for size in range(2, n + 1):
+        layer = subsets[sizes == size]
+
+        for last in range(n):
+            with_last = layer[(layer & bits[last]) != 0]
+            candidates = cost[with_last ^ bits[last]] + between[:, last]
+            previous = np.argmin(candidates, axis=1)
+            cost[with_last, last] = visit(candidates[np.arange(len(with_last)), previous], last)
+            parent[with_last, last] = previous
+
+    total = cost[-1] + inbound
+    if time_windows:
+        total[total > warehouse_due_date] = np.inf
+
+    last = int(np.argmin(total))
+    if not np.isfinite(total[last]):
+        return None
+
+    # Walk the predecessors back from the full subset
+    order = []
+    subset = (1 << n) - 1
+
+    while last >= 0:
+        order.append(last)
+        last, subset = int(parent[subset, last]), subset ^ (1 << last)
+
+    return order[::-1]
+
+
+def _two_opt(distances: np.ndarray) -> list[int]:
+    """Find a short tour starting and ending at index 0 with nearest neighbor construction and 2-opt
+        :arg distances: Distance matrix
+        :return: Indices of the tour, starting with 0
+    """
+    n = len(distances)
+    tour = [0]
+    unvisited = set(range(1, n))
+
+    while unvisited:
+        tour.append(min(unvisited, key=lambda j: distances[tour[-1], j]))
+        unvisited.remove(tour[-1])
+
+    tour = np.array(tour + [0])
+    improved = True
+
+    while improved:
+        improved = False
+
+        for i in range(1, n - 1):
+            # Gain of reversing tour[i:j + 1] for every j at once
+            a, b = tour[i - 1], tour[i]
+            c, d = tour[i + 1:n], tour[i + 2:n + 1]
+            gain = distances[a, b] + distances[c, d] - distances[a, c] - distances[b, d]
+            best = int(np.argmax(gain))
+
+            if gain[best] > 1e-9:
+                j = i + 1 + best
+                tour[i:j + 1] = tour[i:j + 1][::-1]
+                improved = True
+
+    return tour[:-1].tolist()
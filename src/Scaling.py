@@ -0,0 +1,201 @@
+"""Scaling benchmark of the VRP heuristics on generated instances of growing size.
+
+Each heuristic is run on one generated instance per size, each job in its own process. The wall time, peak memory
+and cost are reported per size, with the exponent of the power law fitted to the time and memory curves, e.g. 1 for
+linear and 2 for quadratic growth. Given the report of a previous commit, the heuristics whose exponents grew beyond
+a tolerance while being super-linear are flagged, and the command exits with status 1.
+
+Usage example:
+    python -m src.Scaling --sizes 250 500 1000 2000 --heuristics nearest_neighbor cws insertion \
+        --output scaling.json --baseline scaling-main.json
+"""
+import argparse
+import json
+import multiprocessing
+import subprocess
+import sys
+from contextlib import suppress
+from multiprocessing.connection import Connection
+from typing import Optional
+from src.Benchmark import make_jobs, parse_grid, peak_rss_kb, run_jobs
+from src.Generator import LAYOUTS, WINDOWS, generate_files
+import numpy as np
+
+# Increase of an exponent tolerated between two reports
+TOLERANCE = 0.25
+
+
+def _idle_process(connection: Connection):
+    # Imported like in the benchmark jobs, so that the idle process holds the same modules
+    from src.Dataset import load_vrp  # noqa: F401
+
+    connection.send(peak_rss_kb())
+    connection.close()
+
+
+def idle_rss() -> Optional[int]:
+    """Peak memory of a benchmark process that runs no job, in kB, subtracted from the peak memory of the jobs. None
+    if the platform does not report it, see Benchmark.peak_rss_kb"""
+    # Spawned like the benchmark jobs, a forked process would start with the peak memory of the parent
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_idle_process, args=(sender,), daemon=True)
+    process.start()
+    sender.close()
+    rss = receiver.recv()
+    process.join()
+    return rss
+
+
+def fit_exponent(sizes: list[int], values: list[float]) -> Optional[float]:
+    """Fit values = a * sizes^k in log-log space and return k, None with fewer than two positive points"""
+    points = [(n, value) for n, value in zip(sizes, values) if n > 0 and value is not None and value > 0]
+
+    if len({n for n, _ in points}) < 2:
+        return None
+
+    return np.polyfit(np.log([n for n, _ in points]), np.log([value for _, value in points]), 1)[0].item()
+
+
+def commit() -> Optional[str]:
+    """Current git commit of the working directory, None outside a repository"""
+    with suppress(OSError, subprocess.CalledProcessError):
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+
+    return None
+
+
+def run_scaling(sizes: list[int], heuristics: list[str], layout: str = "random", windows: str = "tight",
+                seed: int = 0, grid: Optional[dict[str, list]] = None, directory: str = "Dataset/generated",
+                n_workers: int = 1, timeout: Optional[float] = None) -> dict:
+    """Run every heuristic on one generated instance per size
+        :arg sizes: Numbers of customers
+        :arg heuristics: Heuristic names, e.g. "nearest_neighbor", "cws", "aco"
+        :arg layout: Layout of the generated instances, see Generator.LAYOUTS
+        :arg windows: Delivery windows of the generated instances, see Generator.WINDOWS
+        :arg seed: Seed of the generated instances and of the randomized heuristics
+        :arg grid: (Optional) Parameter values of the heuristics, one run per combination
+        :arg directory: Directory the generated instances are written to
+        :arg n_workers: Maximum number of concurrent jobs, more than 1 makes the timings noisy
+        :arg timeout: (Optional) Maximum wall time of a job, in seconds, larger sizes of a heuristic are skipped
+            once it timed out
+        :return: Report with one point per job and the fitted exponents of each heuristic and parameters
+    """
+    filenames = generate_files(directory, sizes, [layout], [windows], seed)
+    size_of = dict(zip(filenames, sizes))
+    idle = idle_rss()
+
+    points = []
+    timed_out = set()
+
+    def record(job: dict, result: dict):
+        key = (job["heuristic"], json.dumps(job["params"], sort_keys=True))
+        if result["status"] == "timeout":
+            timed_out.add(key)
+
+        points.append({"heuristic": job["heuristic"], "params": key[1], "n": size_of[job["instance"]],
+                       "status": result["status"], "wall_time": result.get("wall_time"),
+                       "memory_kb": None if result.get("peak_rss_kb") is None or idle is None
+                       else result["peak_rss_kb"] - idle,
+                       "total_cost": result.get("total_cost"), "vehicles": result.get("vehicles"),
+                       "error": result.get("error")})
+        print(f"[{result['status']}] {job['heuristic']} n={size_of[job['instance']]} "
+              f"time={result.get('wall_time', float('nan')):.3f}s cost={result.get('total_cost', '')}")
+
+    # One size at a time, so that the heuristics that timed out are not run on larger instances
+    for filename in filenames:
+        jobs = [job for job in make_jobs([filename], heuristics, grid or {}, [seed])
+                if (job["heuristic"], json.dumps(job["params"], sort_keys=True)) not in timed_out]
+        run_jobs(jobs, n_workers, timeout, record)
+
+    exponents = {}
+    for key in sorted({(point["heuristic"], point["params"]) for point in points}):
+        ok = [point for point in points if (point["heuristic"], point["params"]) == key and point["status"] == "ok"]
+        exponents[" ".join(key)] = {
+            "time": fit_exponent([point["n"] for point in ok], [point["wall_time"] for point in ok]),
+            "memory": fit_exponent([point["n"] for point in ok], [point["memory_kb"] for point in ok])}
+
+    return {"commit": commit(), "layout": layout, "windows": windows, "seed": seed, "sizes": sizes,
+            "idle_rss_kb": idle, "points": points, "exponents": exponents}
+
+
+def regressions(report: dict, baseline: dict, tolerance: float = TOLERANCE) -> list[str]:
+    """Compare the exponents of two reports
+        :arg report: Report of the current code, see run_scaling
+        :arg baseline: Report of a previous commit
+        :arg tolerance: Increase of an exponent tolerated
+        :return: Description of each super-linear exponent that grew beyond the tolerance
+    """
+    flagged = []
+
+    for name, exponents in report["exponents"].items():
+        for curve, exponent in exponents.items():
+            previous = baseline.get("exponents", {}).get(name, {}).get(curve)
+
+            if exponent is not None and previous is not None and exponent > 1 and exponent > previous + tolerance:
+                flagged.append(f"{name}: {curve} exponent {previous:.2f} ({baseline.get('commit')}) -> "
+                               f"{exponent:.2f} ({report.get('commit')})")
+
+    return flagged
+
+
+def print_report(report: dict):
+    """Print the time, memory and cost curves of each heuristic, then its exponents"""
+    for name, exponents in report["exponents"].items():
+        print(f"\n{name}")
+        print(f"{'n':>8} {'time (s)':>10} {'memory (kB)':>12} {'cost':>12} {'vehicles':>9}")
+
+        for point in report["points"]:
+            if " ".join((point["heuristic"], point["params"])) != name:
+                continue
+
+            if point["status"] == "ok":
+                memory = "-" if point["memory_kb"] is None else point["memory_kb"]
+                print(f"{point['n']:>8} {point['wall_time']:>10.3f} {memory:>12} "
+                      f"{point['total_cost']:>12.1f} {point['vehicles']:>9}")
+            else:
+                print(f"{point['n']:>8} {point['status']:>10}")
+
+        print("exponents: " + ", ".join(f"{curve} {'-' if value is None else f'{value:.2f}'}"
+                                        for curve, value in exponents.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how the VRP heuristics scale with the number of customers")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[250, 500, 1000, 2000], help="Numbers of customers")
+    parser.add_argument("--heuristics", nargs="+", default=["nearest_neighbor", "cws", "insertion"],
+                        help="Heuristic names")
+    parser.add_argument("--layout", default="random", choices=LAYOUTS, help="Layout of the generated instances")
+    parser.add_argument("--windows", default="tight", choices=WINDOWS, help="Delivery windows of the instances")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the instances and heuristics")
+    parser.add_argument("--grid", nargs="*", default=[], help='Parameter values, e.g. "max_iter=10"')
+    parser.add_argument("--directory", default="Dataset/generated", help="Directory of the generated instances")
+    parser.add_argument("--workers", type=int, default=1, help="Maximum number of concurrent jobs")
+    parser.add_argument("--timeout", type=float, default=None, help="Maximum wall time of a job, in seconds")
+    parser.add_argument("--output", default="scaling.json", help="JSON file the report is written to")
+    parser.add_argument("--baseline", default=None, help="Report of a previous commit to compare the exponents to")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Increase of an exponent tolerated")
+    args = parser.parse_args()
+
+    report = run_scaling(args.sizes, args.heuristics, args.layout, args.windows, args.seed, parse_grid(args.grid),
+                         args.directory, args.workers, args.timeout)
+
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    print_report(report)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            flagged = regressions(report, json.load(file), args.tolerance)
+
+        for line in flagged:
+            print(f"[regression] {line}")
+
+        if flagged:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+from dataclasses import dataclass
+from typing import Optional
+from src.Instance import Instance
+from src.Route import Route
+import src.Heuristics.AntColony as AntColony
+import numpy as np
+
+# Tolerance of the delivery window checks, the same as the arc feasibility checks of the instance
+TOLERANCE = 1e-6
+
+
+@dataclass
+class TourEvaluation:
+    """Class for storing the evaluation of a batch of giant tours"""
+    # Total cost of each tour, the sum of the return times of its routes
+    costs: np.ndarray
+    # Whether every delivery window of a tour is met and no route exceeds the capacity
+    feasible: np.ndarray
+    # (m, length) cost and load of the route ending at each position of the tours, 0 elsewhere
+    route_costs: np.ndarray
+    route_loads: np.ndarray
+
+
+def evaluate_tours(instance: Instance, tours: np.ndarray, vehicle_capacity: Optional[int] = None) -> TourEvaluation:
+    """Evaluate a batch of giant tours at once, all tours advancing one position at a time. The ants cost the tours
+    they construct with it, see AntColony.construct_solutions
+        :arg instance: Instance the tours were built for
+        :arg tours: Giant tours (m, length), see AntColony
+        :arg vehicle_capacity: (Optional) Capacity of the vehicles, the loads are not checked if None
+    """
+    tours = np.atleast_2d(tours)
+    distances, demand = instance.distances, instance.demand
+    ready_time, due_date, service = instance.ready_time, instance.due_date, instance.service
+
+    m = len(tours)
+    clock = np.zeros(m)
+    load = np.zeros(m, dtype=np.int64)
+    costs = np.zeros(m)
+    feasible = np.ones(m, dtype=bool)
+    route_costs = np.zeros(tours.shape)
+    route_loads = np.zeros(tours.shape, dtype=np.int64)
+
+    # Positions after the last customer of every tour are padding
+    length = np.flatnonzero(tours.any(axis=0)).max(initial=-1) + 2
+
+    for k in range(1, min(length, tours.shape[1])):
+        start, end = tours[:, k - 1], tours[:, k]
+        travelled = (start != 0) | (end != 0)
+        returned = travelled & (end == 0)
+
+        arrival = clock + distances[start, end]
+        feasible &= ~travelled | (arrival <= due_date[end] + TOLERANCE)
+        load += demand[end]
+
+        # A route ends when its vehicle returns to the warehouse, its cost is the return time
+        route_costs[returned, k] = arrival[returned]
+        route_loads[returned, k] = load[returned]
+        costs[returned] += arrival[returned]
+
+        clock = np.where(end == 0, 0, np.maximum(arrival, ready_time[end]) + service[end])
+        if vehicle_capacity is not None:
+            feasible &= load <= vehicle_capacity
+        load[end == 0] = 0
+
+    return TourEvaluation(costs, feasible, route_costs, route_loads)
+
+
+@dataclass
+class Solution:
+    """Class for storing a solution as a giant tour: the warehouse index (0), then the location indices of each route
+    followed by 0, as int32. The cost and load of each route are cached when the solution is built.
+
+    Routes are only built as Route objects at the API boundary, see from_routes and routes."""
+    tour: np.ndarray
+    instance: Instance
+    # Cost and load of each route, in order
+    route_costs: np.ndarray
+    route_loads: np.ndarray
+    cost: float
+    feasible: bool
+
+    @classmethod
+    def from_tour(cls, tour: np.ndarray, instance: Instance, vehicle_capacity: Optional[int] = None) -> "Solution":
+        """Build a solution from a giant tour, which may start with the warehouse and be padded with 0"""
+        tour = np.asarray(tour, dtype=np.int32)
+        evaluation = evaluate_tours(instance, tour, vehicle_capacity)
+        ends = np.flatnonzero((tour[1:] == 0) & (tour[:-1] != 0)) + 1
+        return cls(tour, instance, evaluation.route_costs[0, ends], evaluation.route_loads[0, ends],
+                   evaluation.costs[0].item(), evaluation.feasible[0].item())
+
+    @classmethod
+    def from_routes(cls, routes: list[Route], instance: Instance,
+                    vehicle_capacity: Optional[int] = None) -> "Solution":
+        """Build a solution from routes whose locations belong to an instance, e.g. Vrp.routes"""
+        length = 1 + sum(len(route.customers) + 1 for route in routes)
+        return cls.from_tour(AntColony.routes_to_tour(routes, length), instance, vehicle_capacity)
+
+    def __len__(self) -> int:
+        """Number of routes"""
+        return len(self.route_costs)
+
+    def routes(self) -> list[Route]:
+        """Build the Route objects of the solution"""
+        return AntColony.tour_to_routes(self.tour, self.instance)
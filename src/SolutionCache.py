@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from contextlib import suppress
+from dataclasses import dataclass
+from glob import escape, glob
+from typing import Optional
+from src.Instance import Instance
+from src.Route import Route
+import numpy as np
+
+
+@dataclass
+class CachedSolution:
+    """Class for storing a solution compactly: the customer ids of all routes, one after the other, and the number
+    of customers of each route"""
+    customers: np.ndarray
+    lengths: np.ndarray
+    cost: float
+    best_cost_history: list[float]
+
+    @classmethod
+    def from_routes(cls, routes: list[Route], best_cost_history: list[float]) -> "CachedSolution":
+        customers = np.array([customer.id for route in routes for customer in route.customers], dtype=np.int64)
+        lengths = np.array([len(route.customers) for route in routes], dtype=np.int64)
+        return cls(customers, lengths, sum(route.cost() for route in routes), list(best_cost_history))
+
+    def routes(self, instance: Instance) -> list[Route]:
+        """Build the routes over the locations of an instance, their schedules are only computed when used"""
+        locations, index = instance.locations, instance.id_index
+        customers = [locations[index[customer_id]] for customer_id in self.customers.tolist()]
+        bounds = np.cumsum(self.lengths).tolist()
+        return [Route(instance.warehouse, customers[start:end]) for start, end in zip([0] + bounds, bounds)]
+
+
+class SolutionCache:
+    """Class memoizing the solutions of the heuristics, keyed by a hash of the instance, the vehicle capacity, the
+    heuristic, its parameters and the routes it starts from.
+
+    Solutions are kept in memory up to max_entries, least recently used first out. With a directory, they are also
+    written to disk, one file per solution, and the least recently used files are deleted beyond max_bytes."""
+
+    def __init__(self, max_entries: int = 128, directory: Optional[str] = None, max_bytes: int = 256 * 2 ** 20):
+        """
+            :arg max_entries: Maximum number of solutions kept in memory
+            :arg directory: (Optional) Directory of the on-disk tier, shared by processes, none if None
+            :arg max_bytes: Maximum total size of the files of the on-disk tier
+        """
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, CachedSolution] = OrderedDict()
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(instance: Instance, vehicle_capacity: int, heuristic: str, params: dict,
+            routes: Optional[list[Route]] = None) -> str:
+        """Hash everything a solution depends on
+            :arg instance: Instance solved
+            :arg vehicle_capacity: Capacity of the vehicles
+            :arg heuristic: Name of the heuristic, e.g. "aco"
+            :arg params: Parameters of the heuristic, including the seed
+            :arg routes: (Optional) Routes the heuristic starts from
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps([instance.fingerprint(), vehicle_capacity, heuristic, params], sort_keys=True,
+                                 default=repr).encode())
+
+        for route in routes or []:
+            digest.update(np.array([0] + [customer.id for customer in route.customers], dtype=np.int64).tobytes())
+
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key: str) -> Optional[CachedSolution]:
+        """Look a solution up in memory, then on disk
+            :return: The solution, None if it is not cached
+        """
+        solution = self._memory.get(key)
+
+        if solution is not None:
+            self._memory.move_to_end(key)
+        elif self.directory:
+            with suppress(FileNotFoundError):
+                with np.load(self._path(key), allow_pickle=False) as data:
+                    solution = CachedSolution(data["customers"], data["lengths"], data["cost"].item(),
+                                              data["best_cost_history"].tolist())
+                # The modification time of the files orders the on-disk tier from least to most recently used
+                os.utime(self._path(key))
+                self._remember(key, solution)
+
+        if solution is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return solution
+
+    def put(self, key: str, solution: CachedSolution):
+        """Cache a solution in memory and on disk"""
+        self._remember(key, solution)
+
+        if not self.directory:
+            return
+
+        # Written to a temporary file first, so concurrent readers never see a partial file
+        temporary = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as file:
+            np.savez(file, customers=solution.customers, lengths=solution.lengths, cost=solution.cost,
+                     best_cost_history=np.array(solution.best_cost_history, dtype=np.float64))
+        os.replace(temporary, self._path(key))
+
+        self._evict_files()
+
+    def _remember(self, key: str, solution: CachedSolution):
+        self._memory[key] = solution
+        self._memory.move_to_end(key)
+
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_files(self):
+        """Delete the least recently used files until the on-disk tier fits in max_bytes"""
+        files = []
+        for filename in glob(os.path.join(escape(self.directory), "*.npz")):
+            with suppress(FileNotFoundError):
+                stat = os.stat(filename)
+                files.append((stat.st_mtime, stat.st_size, filename))
+
+        total = sum(size for _, size, _ in files)
+
+        for _, size, filename in sorted(files):
+            if total <= self.max_bytes:
+                break
+
+            with suppress(FileNotFoundError):
+                os.remove(filename)
+            total -= size
+
+    def clear(self):
+        """Drop every cached solution, in memory and on disk"""
+        self._memory.clear()
+
+        if self.directory:
+            for filename in glob(os.path.join(escape(self.directory), "*.npz")):
+                with suppress(FileNotFoundError):
+                    os.remove(filename)
@@ -0,0 +1,105 @@
+from math import sqrt
+from typing import Optional
+import numpy as np
+
+
+class SpatialIndex:
+    """Uniform grid over 2D points, answering k-nearest neighbor queries without computing all pairwise distances.
+
+    Points are sorted by grid cell, the points of a block of cells are found from the offsets of each cell. Queries
+    search growing squares of cells around the cell of the query point until no point outside the square can be
+    nearer than the k-th nearest found."""
+
+    # Average number of points per cell when the cell size is not given
+    _points_per_cell = 16
+
+    def __init__(self, coords: np.ndarray, cell_size: Optional[float] = None):
+        """
+            :arg coords: (n, 2) array of coordinates of the indexed points
+            :arg cell_size: (Optional) Side length of the grid cells, sized for a few points per cell by default
+        """
+        self.coords = np.asarray(coords, dtype=np.float64)
+        n = len(self.coords)
+
+        self.origin = self.coords.min(axis=0) if n else np.zeros(2)
+        extent = self.coords.max(axis=0) - self.origin if n else np.zeros(2)
+
+        if cell_size is None:
+            area = max(extent[0], 1) * max(extent[1], 1)
+            cell_size = sqrt(area * self._points_per_cell / max(n, 1))
+        self.cell_size = cell_size
+
+        self.shape = (extent // cell_size).astype(np.int64) + 1
+        cells = self._cells(self.coords)
+        cell_ids = cells[:, 0] * self.shape[1] + cells[:, 1]
+
+        # Points sorted by cell, the points of cell c are self._order[self._offsets[c]:self._offsets[c + 1]]
+        self._order = np.argsort(cell_ids, kind="stable")
+        self._offsets = np.searchsorted(cell_ids[self._order], np.arange(self.shape[0] * self.shape[1] + 1))
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    def _cells(self, points: np.ndarray) -> np.ndarray:
+        """Get the grid cell of each point, points outside the grid are assigned to the nearest border cell"""
+        return np.clip(((points - self.origin) // self.cell_size).astype(np.int64), 0, self.shape - 1)
+
+    def _points_in(self, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+        """Get the indexed points in the block of cells from low to high, both included"""
+        # The cells of a grid column are contiguous in the sorted order
+        first = low[0] * self.shape[1]
+        slices = [self._order[self._offsets[first + x + low[1]]:self._offsets[first + x + high[1] + 1]]
+                  for x in range(0, (high[0] - low[0] + 1) * self.shape[1], self.shape[1])]
+        return np.concatenate(slices)
+
+    def nearest(self, points: np.ndarray, k: int, exclude: Optional[np.ndarray] = None) -> np.ndarray:
+        """Find the k nearest indexed points of each query point, nearest first, ties broken by index
+            :arg points: (m, 2) array of coordinates of the query points
+            :arg k: Number of neighbors, at most the number of indexed points that are not excluded
+            :arg exclude: (Optional) Index of an indexed point to skip for each query point, -1 to skip none, e.g.
+                the query point itself
+            :return: (m, k) array of indices of the indexed points
+        """
+        points = np.asarray(points, dtype=np.float64)
+        exclude = np.full(len(points), -1) if exclude is None else np.asarray(exclude)
+        neighbors = np.empty((len(points), k), dtype=np.int64)
+
+        if not k:
+            return neighbors
+
+        cells = self._cells(points)
+        cell_ids = cells[:, 0] * self.shape[1] + cells[:, 1]
+        by_cell = np.argsort(cell_ids, kind="stable")
+        starts = np.flatnonzero(np.diff(cell_ids[by_cell], prepend=-1))
+
+        # Query points of the same cell share the searched blocks of cells
+        for queries in np.split(by_cell, starts[1:]):
+            cell = cells[queries[0]]
+            query_points = points[queries]
+            radius = 0
+
+            while True:
+                low, high = np.maximum(cell - radius, 0), np.minimum(cell + radius, self.shape - 1)
+                candidates = self._points_in(low, high)
+                distances = np.sqrt(((query_points[:, None, :] - self.coords[None, candidates, :]) ** 2).sum(axis=2))
+                distances[candidates[None, :] == exclude[queries, None]] = np.inf
+
+                # Distance from each query point to the nearest point that may lie outside the block, the sides of
+                # the block on the border of the grid have nothing beyond them
+                block_low = np.where(low > 0, self.origin + low * self.cell_size, -np.inf)
+                block_high = np.where(high < self.shape - 1, self.origin + (high + 1) * self.cell_size, np.inf)
+                outside = np.minimum(query_points - block_low, block_high - query_points).min(axis=1)
+
+                if len(candidates) >= k:
+                    kth = np.partition(distances, k - 1, axis=1)[:, k - 1]
+                    if (kth < outside).all() or np.isinf(outside).all():
+                        break
+                elif np.isinf(outside).all():
+                    raise ValueError(f"Cannot find {k} neighbors among {len(self)} points")
+
+                radius += 1
+
+            order = np.lexsort((np.broadcast_to(candidates, distances.shape), distances), axis=1)[:, :k]
+            neighbors[queries] = candidates[order]
+
+        return neighbors
@@ -1,10 +1,30 @@
-from copy import deepcopy
+import inspect
+import time
+from contextlib import closing, nullcontext
 from dataclasses import dataclass
-from matplotlib import pyplot as plt
+from src.Instance import Instance
 from src.Location import Location
+from src.LocationSet import LocationSet
+import src.Plot as Plot
 from src.Route import Route
+from src.Solution import Solution
+from src.SolutionCache import CachedSolution, SolutionCache
+import src.Heuristics.Alns as Alns
 import src.Heuristics.AntColony as AntColony
-from typing import Optional
+import src.Heuristics.Checkpoint as Checkpoint
+import src.Heuristics.Decomposition as Decomposition
+import src.Heuristics.Insertion as Insertion
+import src.Heuristics.Islands as Islands
+import src.Heuristics.LocalSearch as LocalSearch
+import src.Heuristics.Savings as Savings
+from src.Heuristics.Pheromones import PheromoneStore
+from src.Heuristics.Stopping import Progress, StoppingCriteria
+from src.Instrumentation import NULL_PROFILER, Profiler
+from typing import Callable, Iterator, Optional, Union
+import numpy as np
+
+# Parameters making a run depend on more than the arguments of the heuristic, see Vrp.solve
+_UNCACHED_PARAMS = ("profiler", "callback", "stopping", "checkpoint", "warm_start")
 
 
 @dataclass
@@ -13,6 +33,11 @@ class Vrp:
     vehicleCapacity: int
     warehouse: Location
     routes: list[Route]
+    instance: Instance
+    # Best cost after each iteration of the last metaheuristic run
+    best_cost_history: list[float]
+    # Pheromone levels of the last ant colony run, carried over when the locations change
+    pheromones: Optional[PheromoneStore]
     _locationBuf: list[Location]
 
     # Required for plotting
@@ -21,222 +46,584 @@ class Vrp:
     _xmax: int
     _ymax: int
 
-    def __init__(self, warehouse: Location, locations: list[Location], vehicle_number: int, vehicle_capacity: int):
-        self._locationBuf = locations
-        self.warehouse = warehouse
+    def __init__(self, warehouse: Location, locations: list[Location], vehicle_number: int, vehicle_capacity: int,
+                 distance_dtype: np.dtype = np.float64, distance_mmap: Optional[str] = None,
+                 lazy_distances: bool = False):
+        """
+            :arg distance_dtype: dtype of the distance matrix, use np.float32 for large instances
+            :arg distance_mmap: (Optional) File to memory-map the distance matrix to
+            :arg lazy_distances: Compute the distances on demand instead of storing a matrix, keeps the memory linear
+                for the heuristics which only look at the nearest neighbors of the customers, e.g.
+                decomposition_heuristic, see Instance.LazyDistances
+        """
+        # Locations are bound to the instance so distances are looked up instead of recomputed
+        self._setup(Instance(warehouse, locations, dtype=distance_dtype, mmap_path=distance_mmap,
+                             lazy=lazy_distances), vehicle_number, vehicle_capacity)
+
+    @classmethod
+    def from_location_set(cls, location_set: LocationSet, vehicle_number: int, vehicle_capacity: int,
+                          distance_dtype: np.dtype = np.float64, distance_mmap: Optional[str] = None,
+                          lazy_distances: bool = False) -> "Vrp":
+        """Build a Vrp from columnar location data, without creating intermediate location objects
+            :arg location_set: Locations, the warehouse first
+            :arg distance_dtype: dtype of the distance matrix, use np.float32 for large instances
+            :arg distance_mmap: (Optional) File to memory-map the distance matrix to
+            :arg lazy_distances: Compute the distances on demand instead of storing a matrix
+        """
+        vrp = cls.__new__(cls)
+        vrp._setup(Instance.from_location_set(location_set, dtype=distance_dtype, mmap_path=distance_mmap,
+                                              lazy=lazy_distances), vehicle_number, vehicle_capacity)
+        return vrp
+
+    def _setup(self, instance: Instance, vehicle_number: int, vehicle_capacity: int):
+        self.instance = instance
+        self._locationBuf = self.instance.customers
+        self.warehouse = self.instance.warehouse
         self.vehicleNumber = vehicle_number
         self.vehicleCapacity = vehicle_capacity
         self.routes = []
-        self._xmin = min([loc.x for loc in self._locationBuf] + [self.warehouse.x]) - 10
-        self._ymin = min([loc.y for loc in self._locationBuf] + [self.warehouse.y]) - 10
-        self._xmax = max([loc.x for loc in self._locationBuf] + [self.warehouse.x]) + 10
-        self._ymax = max([loc.y for loc in self._locationBuf] + [self.warehouse.y]) + 10
-
-    def nearest_neighbor_heuristic(self) -> "Vrp":
-        locations = deepcopy(self._locationBuf)
-        while locations:
+        self.best_cost_history = []
+        self.pheromones = None
+        self._xmin = self.instance.location_set.x.min().item() - 10
+        self._ymin = self.instance.location_set.y.min().item() - 10
+        self._xmax = self.instance.location_set.x.max().item() + 10
+        self._ymax = self.instance.location_set.y.max().item() + 10
+
+    def nearest_neighbor_heuristic(self, n_candidates: Optional[int] = 20,
+                                   profiler: Optional[Profiler] = None) -> "Vrp":
+        """Generate VRP routes by always delivering the customer that can be served the earliest next
+            :param n_candidates: (Optional) Number of nearest customers looked at first at each step, the other
+                customers are only scanned when none of them is provably the earliest. None always scans all customers
+            :param profiler: (Optional) Profiler collecting the construction time and how often the candidates were
+                enough to choose the next customer
+        """
+        profiler = profiler or NULL_PROFILER
+        start = time.perf_counter()
+
+        distances = self.instance.distances
+        demand, ready_time, due_date, service = (self.instance.demand, self.instance.ready_time,
+                                                 self.instance.due_date, self.instance.service)
+
+        candidates = self.instance.neighbor_lists(n_candidates) if n_candidates else np.empty((0, 0), dtype=np.int64)
+        if candidates.shape[1]:
+            # Customers farther than the last candidate are served at least this long after leaving a location
+            bounds = np.asarray(distances[np.arange(len(self.instance)), candidates[:, -1]], dtype=np.float64) + \
+                service[1:].min()
+
+        # Customers left to visit, as a mask over the location indices
+        unvisited = np.ones(len(self.instance), dtype=bool)
+        unvisited[0] = False
+
+        # Equally cheap customers are taken in this order, customers put back on the list come last
+        order = np.arange(len(self.instance))
+        next_order = len(self.instance)
+
+        while unvisited.any():
             # Create a new route
             route = Route(warehouse=self.warehouse, customers=[])
-            current = self.warehouse
+            current = 0
 
             cost = 0
-            demand = 0
+            load = 0
 
             while True:
-                current, additional_cost, locations = current.find_nearest_reachable(locations, cost)
+                # Departure times from the candidates of the current location first, then from every customer that
+                # can follow it if none of them is provably the earliest, see Location.cost_to
+                for scan in ((False, True) if candidates.shape[1] else (True,)):
+                    columns = np.flatnonzero(unvisited & self.instance.feasible_successors([current])[0]) if scan \
+                        else candidates[current]
+                    arrival = cost + np.asarray(distances[current, columns], dtype=np.float64)
+                    departure = arrival + np.maximum(ready_time[columns] - arrival, 0) + service[columns]
+                    reachable = np.flatnonzero(unvisited[columns] & (due_date[columns] >= arrival))
 
-                cost += additional_cost
+                    if reachable.size and (scan or departure[reachable].min() < cost + bounds[current]):
+                        break
+
+                profiler.count("full_scans" if scan else "candidate_hits")
 
                 # If no reachable customer is found
-                if not current:
+                if not reachable.size:
                     break
 
-                demand += current.demand
+                earliest = departure[reachable].min()
+                cheapest = columns[reachable[departure[reachable] == earliest]]
+                current = cheapest[np.argmin(order[cheapest])].item()
+
+                cost += earliest.item()
+                load += demand[current].item()
 
                 # Return if max_demand is reached
-                if demand > self.vehicleCapacity:
-                    # Add the current location back onto the list of locations
-                    locations.append(current)
+                if load > self.vehicleCapacity:
+                    # Put the current location back at the end of the list of locations
+                    order[current] = next_order
+                    next_order += 1
                     break
 
-                route.customers.append(current)
+                unvisited[current] = False
+                route.append(self.instance.locations[current])
 
             # Append the route to the list of routes
             self.routes.append(route)
+
+        profiler.add_time("nearest_neighbor", time.perf_counter() - start)
         return self
 
-    def aco_heuristic(self, n_ants: int, max_iter: int, alpha: int, beta: int, rho: float, plot: bool = False) -> "Vrp":
+    def aco_heuristic(self, n_ants: int, max_iter: Optional[int], alpha: int, beta: int, rho: float,
+                      plot: bool = False, seed: Optional[int] = None, n_workers: Optional[int] = None,
+                      local_search: bool = False, n_candidates: Optional[int] = None,
+                      sparse_pheromones: bool = False, profiler: Optional[Profiler] = None,
+                      stopping: Optional[StoppingCriteria] = None,
+                      callback: Optional[Callable[[Progress], Optional[bool]]] = None,
+                      checkpoint: Optional[str] = None, checkpoint_interval: int = 10,
+                      warm_start: bool = False) -> "Vrp":
         """Generate VRP routes using the ACO heuristic
-            :param plot: plot the best cost history
             :param n_ants: Number of ants to use
-            :param max_iter: Maximum number of iterations
+            :param max_iter: Maximum number of iterations, None to only stop on the stopping criteria
             :param alpha: Alpha parameter, controls the influence of pheromones
             :param beta: Beta parameter, controls the influence of cost
             :param rho: Rho parameter, controls the pheromone evaporation rate
             :param plot: Plot the best cost history
+            :param seed: (Optional) Seed of the random generator, results are reproducible for a given seed and
+                number of workers
+            :param n_workers: (Optional) Number of processes to spread the ants of each iteration across
+            :param local_search: Improve the best solution of each iteration with local search before the pheromone
+                update
+            :param n_candidates: (Optional) Number of nearest customers the ants choose from first, they only choose
+                from all customers when none of these is deliverable
+            :param sparse_pheromones: Only store the pheromones of the edges to the n_candidates nearest customers,
+                the other edges share a single level
+            :param profiler: (Optional) Profiler collecting the time spent in each phase and one event per iteration
+            :param stopping: (Optional) Criteria ending the run before max_iter iterations: a time budget or deadline,
+                a number of iterations without improvement, a target cost or a cancellation event
+            :param callback: (Optional) Called with the progress after each iteration, see Stopping.Progress, the run
+                stops if it returns True
+            :param checkpoint: (Optional) Directory to save the state of the run to, see resume_ant_colony
+            :param checkpoint_interval: Number of iterations between two checkpoints, the state is also saved when the
+                run ends
+            :param warm_start: Start from the pheromone levels of the last ant colony run and the current routes,
+                e.g. after changing the locations with add_locations, remove_locations or update_locations
         """
-        # Pheromone matrix : (a : b) -> pheromone level from location a to b
-        pheromones = {}
-        best_cost = float("inf")
-        best_solution = None
-        best_cost_history = []
-
-        # Initialize pheromones
-        # Uses the result of a past heuristic as a starting point if available
-        pheromone_val = 1 / self.total_cost() if self.routes else 1
-
-        for a in self._locationBuf + [self.warehouse]:
-            for b in self._locationBuf + [self.warehouse]:
-                if b != a:
-                    pheromones[(a, b)] = pheromone_val
+        return self._ant_colony("aco", n_ants, max_iter, alpha, beta, rho, plot, seed, n_workers, local_search,
+                                n_candidates, sparse_pheromones, profiler, stopping, callback, checkpoint,
+                                checkpoint_interval, warm_start)
+
+    def acs_heuristic(self, n_ants: int, max_iter: Optional[int], alpha: int, beta: int, rho: float,
+                      plot: bool = False, seed: Optional[int] = None, n_workers: Optional[int] = None,
+                      local_search: bool = False, n_candidates: Optional[int] = None,
+                      sparse_pheromones: bool = False, profiler: Optional[Profiler] = None,
+                      stopping: Optional[StoppingCriteria] = None,
+                      callback: Optional[Callable[[Progress], Optional[bool]]] = None,
+                      checkpoint: Optional[str] = None, checkpoint_interval: int = 10,
+                      warm_start: bool = False) -> "Vrp":
+        """Generate VRP routes using the ACS heuristic, the pheromones evaporate towards a share of their initial
+        level and only the best tour of each iteration reinforces them. See aco_heuristic for the parameters"""
+        return self._ant_colony("acs", n_ants, max_iter, alpha, beta, rho, plot, seed, n_workers, local_search,
+                                n_candidates, sparse_pheromones, profiler, stopping, callback, checkpoint,
+                                checkpoint_interval, warm_start)
+
+    def mmas_heuristic(self, n_ants: int, max_iter: Optional[int], alpha: int, beta: int, rho: float,
+                       plot: bool = False, seed: Optional[int] = None, n_workers: Optional[int] = None,
+                       local_search: bool = False, n_candidates: Optional[int] = None,
+                       sparse_pheromones: bool = False, profiler: Optional[Profiler] = None,
+                       stopping: Optional[StoppingCriteria] = None,
+                       callback: Optional[Callable[[Progress], Optional[bool]]] = None,
+                       checkpoint: Optional[str] = None, checkpoint_interval: int = 10,
+                       warm_start: bool = False) -> "Vrp":
+        """Generate VRP routes using the Max-Min Ant System (MMAS) heuristic, the pheromones are kept within bounds
+        following the best solution. See aco_heuristic for the parameters"""
+        return self._ant_colony("mmas", n_ants, max_iter, alpha, beta, rho, plot, seed, n_workers, local_search,
+                                n_candidates, sparse_pheromones, profiler, stopping, callback, checkpoint,
+                                checkpoint_interval, warm_start)
+
+    def _pheromone_store(self, initial: float, n_candidates: Optional[int], sparse: bool,
+                         warm_start: bool = False) -> PheromoneStore:
+        """Create the pheromone levels of a colony : [a, b] -> pheromone level from location a to b
+            :arg initial: Initial level of every edge
+            :arg n_candidates: (Optional) Number of nearest customers the ants choose from first
+            :arg sparse: Only store the edges to the candidates
+            :arg warm_start: Start from the levels of the last ant colony run if available
+        """
+        if sparse and not n_candidates:
+            raise ValueError("Sparse pheromones require n_candidates")
 
-        # Run max_iter iterations
-        for _ in range(max_iter):
-            # Generate solutions concurrently
-            solutions = [AntColony.construct_solution(alpha, beta, deepcopy(self._locationBuf), self.warehouse,
-                                                      self.vehicleCapacity, pheromones) for _ in range(n_ants)]
+        candidates = self.instance.feasible_neighbor_lists(n_candidates) if sparse else None
 
-            self._aco_heuristic_update_pheromones(solutions, rho, pheromones)
+        if warm_start and self.pheromones is not None:
+            previous = self.pheromones.candidates
+            if (previous is None) == (candidates is None) and (previous is None or np.array_equal(previous,
+                                                                                                   candidates)):
+                return self.pheromones.copy()
 
-            # Find the best solution
-            for solution in solutions:
-                cost = self.total_cost(solution)
+            # The previous levels are moved to the edges stored by this run
+            return self.pheromones.remap(np.arange(len(self.instance)), candidates)
 
-                if cost < best_cost:
-                    best_cost = cost
-                    best_solution = solution
+        return PheromoneStore(len(self.instance), initial, candidates)
 
-            best_cost_history.append(best_cost)
+    def _ant_colony(self, variant: str, n_ants: int, max_iter: Optional[int], alpha: int, beta: int, rho: float,
+                    plot: bool, seed: Optional[int], n_workers: Optional[int], local_search: bool,
+                    n_candidates: Optional[int], sparse_pheromones: bool, profiler: Optional[Profiler],
+                    stopping: Optional[StoppingCriteria], callback: Optional[Callable[[Progress], Optional[bool]]],
+                    checkpoint: Optional[str], checkpoint_interval: int, warm_start: bool) -> "Vrp":
+        """Run an ant colony heuristic, shared by the variants which only differ in their pheromone update
+            :arg variant: Pheromone update rule to use, see AntColony.VARIANTS
+        """
+        return self._follow(self.ant_colony_progress(variant, n_ants, max_iter, alpha, beta, rho, seed, n_workers,
+                                                     local_search, n_candidates, sparse_pheromones, profiler,
+                                                     stopping, checkpoint, checkpoint_interval, warm_start), plot,
+                            callback)
+
+    def _follow(self, progress: Iterator[Progress], plot: bool,
+                callback: Optional[Callable[[Progress], Optional[bool]]]) -> "Vrp":
+        """Run an ant colony to the end, calling the callback after each iteration"""
+        with closing(progress):
+            for state in progress:
+                if callback and callback(state):
+                    break
 
         if plot:
-            plt.plot(range(len(best_cost_history)), best_cost_history)
-            plt.title('Best cost history')
-
-        self.routes = best_solution
+            Plot.plot_history(self.best_cost_history)
 
         return self
 
-    def _aco_heuristic_update_pheromones(self, solutions: list[list[Route]], rho: float, pheromones: dict):
-        """Update the pheromone levels based on the routes taken
-            :arg routes: List of routes taken
-            :arg rho: Rho parameter, controls the pheromone evaporation rate
-            :arg pheromones: Pheromone matrix
+    def ant_colony_progress(self, variant: str, n_ants: int, max_iter: Optional[int], alpha: int, beta: int,
+                            rho: float, seed: Optional[int] = None, n_workers: Optional[int] = None,
+                            local_search: bool = False, n_candidates: Optional[int] = None,
+                            sparse_pheromones: bool = False, profiler: Optional[Profiler] = None,
+                            stopping: Optional[StoppingCriteria] = None, checkpoint: Optional[str] = None,
+                            checkpoint_interval: int = 10, warm_start: bool = False) -> Iterator[Progress]:
+        """Run an ant colony heuristic one iteration at a time, yielding the best solution so far after each
+        iteration. The routes are updated with the best solution so far when the run ends, even if the caller stops
+        iterating early, e.g. for x in vrp.ant_colony_progress(...): if x.elapsed > 2: break
+            :param variant: Pheromone update rule to use, see AntColony.VARIANTS
+            :param max_iter: (Optional) Maximum number of iterations, only the stopping criteria end the run if None
+            :param stopping: (Optional) Criteria ending the run early, e.g. a time budget
+            See aco_heuristic for the other parameters
         """
-        # Evaporate pheromones
-        for key in pheromones.keys():
-            pheromones[key] *= (1 - rho)
+        if variant not in AntColony.VARIANTS:
+            raise ValueError(f"Unknown variant {variant}, expected one of {AntColony.VARIANTS}")
 
-        # Add pheromones to the edges taken
-        for solution in solutions:
-            deposit = 1 / self.total_cost(solution)
-
-            for route in solution:
-                # Add pheromones for the edges between the warehouse and the customers
-                pheromones[(self.warehouse, route.customers[0])] += deposit
+        # Uses the result of a past heuristic as a starting point if available
+        pheromone_val = 1 / self.total_cost() if self.routes else 1
+        colony = AntColony.Colony(variant, alpha, beta, rho,
+                                  self._pheromone_store(pheromone_val, n_candidates, sparse_pheromones, warm_start),
+                                  pheromone_val, np.random.SeedSequence(seed), n_candidates)
+
+        # The current routes are the solution to beat when warm starting
+        if warm_start and self.routes and all(route.is_feasible(self.vehicleCapacity) for route in self.routes):
+            colony.best_solution = AntColony.routes_to_tour(self.routes, 2 * len(self.instance) + 1)
+            colony.best_cost = self.total_cost()
+
+        params = {"n_ants": n_ants, "max_iter": max_iter, "n_workers": n_workers, "local_search": local_search}
+        return self._colony_progress(colony, params, profiler, stopping, checkpoint, checkpoint_interval)
+
+    def resume_ant_colony(self, checkpoint: str, max_iter: Optional[int] = None, plot: bool = False,
+                          profiler: Optional[Profiler] = None, stopping: Optional[StoppingCriteria] = None,
+                          callback: Optional[Callable[[Progress], Optional[bool]]] = None,
+                          checkpoint_interval: int = 10) -> "Vrp":
+        """Resume an ant colony heuristic from a checkpoint, see aco_heuristic. The run goes on exactly as if it had
+        never been interrupted, with the parameters it was started with
+            :param checkpoint: Checkpoint directory, updated as the run goes on
+            :param max_iter: (Optional) Maximum total number of iterations, counting the iterations before the
+                checkpoint, defaults to the one the run was started with
+            See aco_heuristic for the other parameters
+        """
+        return self._follow(self.resume_progress(checkpoint, max_iter, profiler, stopping, checkpoint_interval),
+                            plot, callback)
+
+    def resume_progress(self, checkpoint: str, max_iter: Optional[int] = None, profiler: Optional[Profiler] = None,
+                        stopping: Optional[StoppingCriteria] = None,
+                        checkpoint_interval: int = 10) -> Iterator[Progress]:
+        """Resume an ant colony heuristic from a checkpoint one iteration at a time, see ant_colony_progress and
+        resume_ant_colony"""
+        colony, params = Checkpoint.load_checkpoint(checkpoint, self.instance)
+
+        if max_iter is not None:
+            params["max_iter"] = max_iter
+
+        return self._colony_progress(colony, params, profiler, stopping, checkpoint, checkpoint_interval)
+
+    def _colony_progress(self, colony: AntColony.Colony, params: dict, profiler: Optional[Profiler],
+                         stopping: Optional[StoppingCriteria], checkpoint: Optional[str],
+                         checkpoint_interval: int) -> Iterator[Progress]:
+        """Run a colony one iteration at a time, see ant_colony_progress
+            :arg params: Parameters of the run which are not part of the colony, saved with the checkpoints
+        """
+        max_iter = params["max_iter"]
+        stopping = stopping or StoppingCriteria()
+        if max_iter is None and not stopping.bounded():
+            raise ValueError("Either max_iter or a stopping criterion is required")
+
+        daemon = LocalSearch.Daemon(self.instance, self.vehicleCapacity) if params["local_search"] else None
+        profiler = profiler or NULL_PROFILER
+        self.best_cost_history = colony.best_cost_history
+
+        start = time.perf_counter()
+        limit = stopping.time_limit(start)
+
+        # Iteration of the last checkpoint, the colony state is only consistent between iterations
+        saved, consistent = colony.iteration, True
+
+        def save():
+            nonlocal saved
+            with profiler.phase("checkpoint"):
+                Checkpoint.save_checkpoint(checkpoint, colony, self.instance, params)
+            saved = colony.iteration
+
+        try:
+            n_workers = params["n_workers"]
+            with AntColony.AntPool(self.instance, n_workers) if n_workers else nullcontext() as pool:
+                # Run up to max_iter iterations in total, generating the solutions of all ants concurrently if a pool
+                # is available
+                while max_iter is None or colony.iteration < max_iter:
+                    iteration_start = time.perf_counter()
+                    consistent = False
+                    colony.iterate(self.instance, params["n_ants"], self.vehicleCapacity, pool, daemon, profiler)
+                    consistent = True
+
+                    if checkpoint and colony.iteration % checkpoint_interval == 0:
+                        save()
+
+                    now = time.perf_counter()
+                    reason = stopping.reason(colony.best_cost_history, now, limit, now - iteration_start)
+                    yield Progress(colony.iteration, colony.best_cost, now - start, colony.best_solution,
+                                   self.instance, reason)
+
+                    if reason:
+                        break
+        finally:
+            if checkpoint and consistent and saved != colony.iteration:
+                save()
+
+            if colony.best_solution is not None:
+                self.routes = AntColony.tour_to_routes(colony.best_solution, self.instance)
+
+            self.pheromones = colony.pheromones
+
+    def island_heuristic(self, n_colonies: int, n_ants: int, max_iter: int, alpha: Union[int, list[int]],
+                         beta: Union[int, list[int]], rho: Union[float, list[float]],
+                         variant: Union[str, list[str]] = "aco", migration_interval: int = 10,
+                         topology: str = "ring", migration: str = "best", migration_rate: float = 0.1,
+                         plot: bool = False, seed: Optional[int] = None, n_workers: Optional[int] = None,
+                         n_candidates: Optional[int] = None, sparse_pheromones: bool = False,
+                         profiler: Optional[Profiler] = None) -> "Vrp":
+        """Generate VRP routes by running several independent ant colonies in separate processes, which periodically
+        exchange their best solutions or blend their pheromone levels (island model)
+            :param n_colonies: Number of colonies
+            :param n_ants: Number of ants of each colony
+            :param max_iter: Maximum number of iterations of each colony
+            :param alpha: Alpha parameter, shared by all colonies or one value per colony
+            :param beta: Beta parameter, shared by all colonies or one value per colony
+            :param rho: Rho parameter, shared by all colonies or one value per colony
+            :param variant: Pheromone update rule, "aco", "acs" or "mmas", shared by all colonies or one value per
+                colony
+            :param migration_interval: Number of iterations between two migrations
+            :param topology: Colonies exchanging information, "ring" or "full"
+            :param migration: Information exchanged, "best" solutions or "pheromones"
+            :param migration_rate: Weight of the neighbors' pheromones when blending
+            :param plot: Plot the best cost history
+            :param seed: (Optional) Seed of the random generator, for reproducible results
+            :param n_workers: (Optional) Number of processes, defaults to one per colony
+            :param n_candidates: (Optional) Number of nearest customers the ants choose from first
+            :param sparse_pheromones: Only store the pheromones of the edges to the n_candidates nearest customers
+            :param profiler: (Optional) Profiler collecting the time spent in each epoch and migration, and one event
+                per epoch
+        """
+        pheromone_val = 1 / self.total_cost() if self.routes else 1
 
-                # Add the pheromones for the edges between the customers
-                for i in range(len(route.customers) - 1):
-                    pheromones[(route.customers[i], route.customers[i + 1])] += deposit
+        # Each colony has its own parameters, pheromone levels and random generator
+        variants, alphas, betas, rhos = (Islands.per_colony(value, n_colonies) for value in (variant, alpha, beta, rho))
+        seed_sequences = np.random.SeedSequence(seed).spawn(n_colonies)
 
-                # Add pheromones for the edge between the last customer and the warehouse
-                pheromones[(route.customers[-1], self.warehouse)] += deposit
+        colonies = [AntColony.Colony(variants[k], alphas[k], betas[k], rhos[k],
+                                     self._pheromone_store(pheromone_val, n_candidates, sparse_pheromones),
+                                     pheromone_val, seed_sequences[k], n_candidates) for k in range(n_colonies)]
 
-    def acs_heuristic(self, n_ants: int, max_iter: int, alpha: int, beta: int, rho: float, plot: bool = False) -> "Vrp":
-        """Generate VRP routes using the ACO heuristic
-            :param plot: plot the best cost history
-            :param n_ants: Number of ants to use
-            :param max_iter: Maximum number of iterations
-            :param alpha: Alpha parameter, controls the influence of pheromones
-            :param beta: Beta parameter, controls the influence of cost
-            :param rho: Rho parameter, controls the pheromone evaporation rate
-        """
-        # Pheromone matrix : (a : b) -> pheromone level from location a to b
-        pheromones = {}
-        best_cost = float("inf")
-        best_solution = None
-        best_cost_history = []
+        colonies = Islands.run_islands(self.instance, colonies, n_ants, max_iter, self.vehicleCapacity,
+                                       migration_interval, topology, migration, migration_rate, n_workers,
+                                       profiler or NULL_PROFILER)
 
-        # Initialize pheromones
-        # Uses the result of a past heuristic as a starting point if available
-        pheromone_val = 1 / self.total_cost() if self.routes else 1
+        best_colony = min(colonies, key=lambda colony: colony.best_cost)
 
-        for a in self._locationBuf + [self.warehouse]:
-            for b in self._locationBuf + [self.warehouse]:
-                if b != a:
-                    pheromones[(a, b)] = pheromone_val
+        self.best_cost_history = np.min([colony.best_cost_history for colony in colonies], axis=0).tolist()
 
-        # Run max_iter iterations
-        for _ in range(max_iter):
-            # Generate solutions concurrently
+        if plot:
+            Plot.plot_history(self.best_cost_history)
 
-            solutions = [AntColony.construct_solution(alpha, beta, deepcopy(self._locationBuf), self.warehouse,
-                                                      self.vehicleCapacity, pheromones) for _ in range(n_ants)]
+        self.routes = AntColony.tour_to_routes(best_colony.best_solution, self.instance)
+        self.pheromones = best_colony.pheromones
 
-            self._acs_heuristic_update_pheromones(solutions, rho, pheromones, deepcopy(self._locationBuf),
-                                                  pheromone_val)
+        return self
 
-            # Find the best solution
-            for solution in solutions:
-                cost = self.total_cost(solution)
+    def alns_heuristic(self, max_iter: Optional[int], initial: Optional[str] = "cws", plot: bool = False,
+                       seed: Optional[int] = None, n_neighbors: int = 20,
+                       removal: tuple[float, float] = (0.05, 0.2), temperature: float = 0.05,
+                       cooling: float = 0.9995, segment: int = 100, reaction: float = 0.1,
+                       profiler: Optional[Profiler] = None, stopping: Optional[StoppingCriteria] = None) -> "Vrp":
+        """Generate VRP routes using Adaptive Large Neighborhood Search: customers are repeatedly removed (random,
+        worst, related or whole routes) and inserted back (greedy or regret insertion), the operators being chosen
+        according to their past success, and the new solutions accepted with simulated annealing
+            :param max_iter: Maximum number of iterations, None to only stop on the stopping criteria
+            :param initial: (Optional) Heuristic building the initial routes, "cws", "nearest_neighbor" or
+                "insertion", None to start from the current routes
+            :param plot: Plot the best cost history
+            :param seed: (Optional) Seed of the random generator, for reproducible results
+            :param n_neighbors: Number of nearest neighbors of each customer, a customer is only inserted into the
+                routes serving one of its neighbors or into a new route
+            :param removal: Minimum and maximum share of the customers removed by each iteration
+            :param temperature: Initial temperature, as the relative cost increase accepted with probability 1/2
+            :param cooling: Factor applied to the temperature after each iteration
+            :param segment: Number of iterations between two updates of the operator weights
+            :param reaction: Weight of the last segment's success in the operator weights
+            :param profiler: (Optional) Profiler collecting the time spent destroying and repairing solutions
+            :param stopping: (Optional) Criteria ending the run before max_iter iterations, e.g. a time budget
+        """
+        profiler = profiler or NULL_PROFILER
 
-                if cost < best_cost:
-                    best_cost = cost
-                    best_solution = solution
+        if initial == "cws":
+            self.cws_heuristic(profiler=profiler)
+        elif initial == "nearest_neighbor":
+            self.nearest_neighbor_heuristic(profiler=profiler)
+        elif initial == "insertion":
+            self.insertion_heuristic(profiler=profiler)
+        elif initial is not None:
+            raise ValueError(f"Unknown initial heuristic {initial}")
 
-            best_cost_history.append(best_cost)
+        alns = Alns.Alns(self.instance, self.vehicleCapacity, np.random.default_rng(seed), n_neighbors, removal)
+        self.routes, self.best_cost_history = alns.run(self.routes, max_iter, temperature, cooling, segment,
+                                                       reaction, stopping, profiler)
 
         if plot:
-            plt.plot(range(len(best_cost_history)), best_cost_history)
-            plt.title('Best cost history')
-
-        self.routes = best_solution
+            Plot.plot_history(self.best_cost_history)
 
         return self
 
-    def _acs_heuristic_update_pheromones(self, solutions: list[list[Route]], rho: float, pheromones: dict,
-                                         customers: list[Location], initial_solution: float):
-        """Update the pheromone levels based on the routes taken
-            :arg routes: List of routes taken
-            :arg rho: Rho parameter, controls the pheromone evaporation rate
-            :arg pheromones: Pheromone matrix
+    def add_locations(self, locations: list[Location]) -> "Vrp":
+        """Add customers to a solved instance, inserting each into the routes at its cheapest feasible position
+            :param locations: Customers to add, with ids not used by other locations
         """
-        # Evaporate pheromones
-        for key in pheromones.keys():
-            pheromones[key] = (1 - rho) * pheromones[key] + rho * (1 / len(customers) * initial_solution)
+        ids = [location.id for location in locations]
+        if len(set(ids)) < len(ids) or np.isin(ids, self.instance.location_set.id).any():
+            raise ValueError("Added locations must have new, distinct ids")
 
-        # Identify the best solution in this iteration
-        best_solution = min(solutions, key=lambda sol: self.total_cost(sol))
-        best_cost = self.total_cost(best_solution)
+        location_set = self.instance.location_set.concat(LocationSet.from_locations(locations))
+        sources = np.concatenate((np.arange(len(self.instance)), np.full(len(locations), -1)))
+        return self._change_locations(location_set, sources, ids)
+
+    def remove_locations(self, ids: list[int]) -> "Vrp":
+        """Remove customers from a solved instance, the routes serving them skip them
+            :param ids: Ids of the customers to remove
+        """
+        location_ids = self.instance.location_set.id
+        if not np.isin(ids, location_ids[1:]).all():
+            raise ValueError(f"Unknown customer ids {sorted(set(ids) - set(location_ids[1:].tolist()))}")
 
-        # Intensify pheromones for the best solution
-        for route in best_solution:
-            # Add pheromones for the edges between the warehouse and the customers in the best solution
-            pheromones[(self.warehouse, route.customers[0])] = (1 - rho) * pheromones[
-                (self.warehouse, route.customers[0])] + rho / best_cost
+        sources = np.flatnonzero(~np.isin(location_ids, ids))
+        return self._change_locations(self.instance.location_set.subset(sources), sources, [])
 
-            # Add the pheromones for the edges between the customers in the best solution
-            for i in range(len(route.customers) - 1):
-                pheromones[(route.customers[i], route.customers[i + 1])] = (1 - rho) * pheromones[
-                    (route.customers[i], route.customers[i + 1])] + rho / best_cost
+    def update_locations(self, locations: list[Location]) -> "Vrp":
+        """Change the data of customers of a solved instance, e.g. their delivery windows, each changed customer is
+        moved to its cheapest feasible position in the routes
+            :param locations: New data of the customers, matched to the current customers by id
+        """
+        location_set = self.instance.location_set.subset(np.arange(len(self.instance)))
+        sources = np.arange(len(self.instance))
+
+        for location in locations:
+            i = self.instance.id_index.get(location.id, 0)
+            if not i:
+                raise ValueError(f"Unknown customer id {location.id}")
+
+            # Distances to the customer are only computed again if it moved
+            if (location.x, location.y) != (location_set.x[i], location_set.y[i]):
+                sources[i] = -1
+
+            for column in LocationSet.COLUMNS:
+                getattr(location_set, column)[i] = getattr(location, column)
+
+        return self._change_locations(location_set, sources, [location.id for location in locations])
+
+    def _change_locations(self, location_set: LocationSet, sources: np.ndarray, pending: list[int]) -> "Vrp":
+        """Move to changed locations, repairing the routes and carrying over the pheromone levels
+            :arg location_set: New locations, the warehouse first
+            :arg sources: Index in the current instance of each new location, -1 for locations at new coordinates
+            :arg pending: Ids of the customers to insert into the routes
+        """
+        instance = self.instance.update(location_set, sources)
+        index = instance.id_index
+        waiting = set(pending)
+
+        # Step 1 : Keep the customers of each route which are unchanged, bound to the new instance
+        routes = []
+        for route in self.routes:
+            customers = [instance.locations[index[customer.id]] for customer in route.customers
+                         if customer.id in index and customer.id not in waiting]
+            if customers:
+                routes.append(Route(instance.warehouse, customers))
+
+        # Step 2 : Carry over the pheromone levels, the edges of moved customers keep their levels
+        pheromones = self.pheromones
+        if pheromones is not None:
+            origins = np.array([self.instance.id_index.get(location_id, -1)
+                                for location_id in location_set.id.tolist()])
+            candidates = None if pheromones.candidates is None else \
+                instance.feasible_neighbor_lists(pheromones.candidates.shape[1])
+            pheromones = pheromones.remap(origins, candidates)
+
+        vehicle_number, vehicle_capacity, history = self.vehicleNumber, self.vehicleCapacity, self.best_cost_history
+        self._setup(instance, vehicle_number, vehicle_capacity)
+        self.best_cost_history = history
+        self.pheromones = pheromones
+
+        # Step 3 : Insert the new and changed customers at their cheapest feasible positions
+        self.routes = Insertion.insert_customers(routes, [instance.locations[index[i]] for i in pending],
+                                                 instance.warehouse, vehicle_capacity)
+        return self
 
-            # Add pheromones for the edge between the last customer and the warehouse in the best solution
-            pheromones[(route.customers[-1], self.warehouse)] = (1 - rho) * pheromones[
-                (route.customers[-1], self.warehouse)] + rho / best_cost
+    def solve(self, heuristic: str, cache: Optional[SolutionCache] = None, **params) -> "Vrp":
+        """Run a heuristic by name, e.g. vrp.solve("aco", n_ants=20, max_iter=50, alpha=1, beta=2, rho=0.1, seed=0),
+        through a solution cache if given. Randomized heuristics are only cached with a seed, and runs with a
+        callback, stopping criteria, checkpoint, profiler or warm start are never cached
+            :param heuristic: Name of the heuristic, e.g. "cws" for cws_heuristic
+            :param cache: (Optional) Cache to look the solution up in, and to store it to on a miss
+            :param params: Parameters of the heuristic
+        """
+        method = getattr(self, f"{heuristic}_heuristic", None)
+
+        if method is None:
+            raise ValueError(f"Unknown heuristic {heuristic}")
+
+        signature = inspect.signature(method)
+        if cache is None or ("seed" in signature.parameters and params.get("seed") is None) or \
+                any(params.get(name) for name in _UNCACHED_PARAMS):
+            return method(**params)
+
+        # Parameters left to their default are part of the key, so that both spellings of a call share a solution
+        arguments = signature.bind(**params)
+        arguments.apply_defaults()
+        key_params = {name: value for name, value in arguments.arguments.items() if name != "plot"}
+        key = cache.key(self.instance, self.vehicleCapacity, heuristic, key_params, self.routes)
+
+        solution = cache.get(key)
+        if solution is None:
+            method(**params)
+            cache.put(key, CachedSolution.from_routes(self.routes, self.best_cost_history))
+        else:
+            self.routes = solution.routes(self.instance)
+            self.best_cost_history = list(solution.best_cost_history)
 
-        # Add pheromones to the edges taken
-        # for solution in solutions:
-        # deposit = 1 / self.total_cost(solution)
+        return self
 
-        # for route in solution:
-        # Add pheromones for the edges between the warehouse and the customers
-        # pheromones[(self.warehouse, route.customers[0])] += deposit
+    def solution(self) -> Solution:
+        """Get the current routes as a compact giant tour, see Solution"""
+        return Solution.from_routes(self.routes, self.instance, self.vehicleCapacity)
 
-        # Add the pheromones for the edges between the customers
-        # for i in range(len(route.customers) - 1):
-        # pheromones[(route.customers[i], route.customers[i + 1])] += deposit
+    def set_solution(self, solution: Solution) -> "Vrp":
+        """Replace the current routes by the routes of a solution built for this instance"""
+        if solution.instance is not self.instance:
+            raise ValueError("The solution was built for another instance")
 
-        # Add pheromones for the edge between the last customer and the warehouse
-        # pheromones[(route.customers[-1], self.warehouse)] += deposit
+        self.routes = solution.routes()
+        return self
 
     def total_cost(self, routes: Optional[list[Route]] = None) -> float:
         """Calculate the total cost of all routes
@@ -256,42 +643,132 @@ class Vrp:
             print("")
         return self
 
-    def cws_heuristic(self) -> "Vrp":
-        # Step 1 : Initialize routes
-        routes = [Route(warehouse=self.warehouse, customers=[loc]) for loc in
-                  self._locationBuf]  # Create a route for each location in the location buffer and add it to the routes list
-
-        # Step 2 : Calculate the savings
-        savings = []
-        for i in range(len(routes)):
-            for j in range(i + 1, len(routes)):  # For each pair of routes
-                route_i = routes[i]  # Get the first route
-                route_j = routes[j]  # Get the second route
-                warehouse = self.warehouse  # Get the warehouse location
-                loc_i = route_i.customers[-1]  # Get the last customer of the first route
-                loc_j = route_j.customers[0]  # Get the first customer of the second route
-                saving = warehouse.distance_to(loc_i) + warehouse.distance_to(loc_j) - loc_i.distance_to(
-                    loc_j)  # Calculate the saving
-                savings.append((saving, route_i, route_j))  # Add the saving to the list of savings
-
-        # Step 3 : Sort the savings
-        savings.sort(reverse=True, key=lambda x: x[0])  # Sort the savings in descending order
-
-        # Step 4 : Merge routes based on savings
-        for saving, route_i, route_j in savings:
-            if route_i in routes and route_j in routes:
-                total_demand = route_i.demand() + route_j.demand()  # Calculate the total demand of the two routes
-                if total_demand <= self.vehicleCapacity:  # Check if the total demand is less than or equal to the vehicle capacity
-                    merged_route = route_i.merge(route_j)  # Merge the two routes into a single route
-                    routes.remove(route_i)
-                    routes.remove(route_j)
-                    routes.append(merged_route)
-
-        self.routes = routes
+    def cws_heuristic(self, n_neighbors: Optional[int] = 50, time_windows: bool = True,
+                      profiler: Optional[Profiler] = None) -> "Vrp":
+        """Generate VRP routes using the Clarke-Wright savings heuristic
+            :param n_neighbors: (Optional) Only consider joining each customer with its nearest customers, all pairs
+                if None
+            :param time_windows: Only merge routes if the delivery windows are still met, otherwise only the vehicle
+                capacity is respected
+            :param profiler: (Optional) Profiler collecting the time spent computing the savings and merging routes
+        """
+        self.routes = Savings.savings_routes(self.instance, self.vehicleCapacity, n_neighbors, time_windows,
+                                             profiler or NULL_PROFILER)
         return self
 
-    def plot(self) -> "Vrp":
-        for i in range(len(self.routes)):
-            self.routes[i].plot(xmin=self._xmin, xmax=self._xmax, ymin=self._ymin, ymax=self._ymax,
-                                title=f"Route {i + 1}")
+    def insertion_heuristic(self, regret: Optional[int] = None, mu: float = 1, lam: float = 1, alpha1: float = 1,
+                            seed_customer: str = "farthest", n_routes: Optional[int] = None,
+                            n_neighbors: Optional[int] = 20,
+                            profiler: Optional[Profiler] = None) -> "Vrp":
+        """Generate VRP routes by inserting the customers one by one into the routes, with Solomon's I1 heuristic
+        building one route at a time, or with regret-k insertion building all routes at once
+            :param regret: (Optional) Number of options k of regret-k insertion, None for Solomon's I1 heuristic
+            :param mu: I1 weight of the removed edge in the detour d(i, u) + d(u, j) - mu d(i, j)
+            :param lam: I1 weight of the distance from the warehouse in the saving of an insertion
+            :param alpha1: I1 weight of the detour against the push forward of the next service start, between 0
+                and 1
+            :param seed_customer: Customer starting each new route, "farthest" from the warehouse or earliest "due_date"
+            :param n_routes: (Optional) Number of routes regret-k insertion opens at the start, defaults to the
+                number of vehicles the total demand needs
+            :param n_neighbors: (Optional) Regret-k insertion only inserts a customer into the routes serving one of
+                its nearest customers, into any route if None
+            :param profiler: (Optional) Profiler collecting the construction time and the number of evaluated
+                insertions
+        """
+        profiler = profiler or NULL_PROFILER
+        with profiler.phase("insertion"):
+            if regret is None:
+                self.routes = Insertion.solomon_routes(self.instance, self.vehicleCapacity, mu, lam, alpha1,
+                                                       seed_customer, profiler)
+            else:
+                self.routes = Insertion.regret_routes(self.instance, self.vehicleCapacity, regret, n_routes,
+                                                      seed_customer, n_neighbors, profiler)
+        return self
+
+    def decomposition_heuristic(self, heuristic: str = "insertion", params: Optional[dict] = None,
+                                method: str = "sweep", cluster_size: int = 100, n_clusters: Optional[int] = None,
+                                time_weight: float = 1, seed: Optional[int] = None, n_workers: Optional[int] = None,
+                                polish: bool = True, n_neighbors: int = 20, max_passes: Optional[int] = 3,
+                                profiler: Optional[Profiler] = None) -> "Vrp":
+        """Generate VRP routes by splitting the customers into clusters, solving each cluster independently with
+        another heuristic, then joining their routes and improving them with local search around the cluster
+        boundaries. Each sub-problem only holds the distances between its own locations, and the polish only looks
+        at the nearest neighbors of the customers, so with lazy_distances large instances are solved in roughly
+        linear time and memory, e.g. load_vrp(filename, lazy_distances=True).decomposition_heuristic()
+            :param heuristic: Name of the heuristic solving the clusters, e.g. "aco" for aco_heuristic
+            :param params: (Optional) Parameters of the heuristic, e.g. {"n_ants": 20, "max_iter": 50, ...}
+            :param method: Clustering method, "sweep" for sectors of polar angles around the warehouse or "kmeans"
+                on the coordinates and delivery windows
+            :param cluster_size: Average number of customers of a cluster, used if n_clusters is None
+            :param n_clusters: (Optional) Number of clusters
+            :param time_weight: Weight of the middle of the delivery windows in k-means, in distance units per time
+                unit
+            :param seed: (Optional) Seed of the random generator of k-means
+            :param n_workers: (Optional) Number of processes solving the clusters in parallel
+            :param polish: Improve the joined routes with local search, starting from the customers having one of
+                their nearest neighbors in another cluster
+            :param n_neighbors: Number of nearest neighbors each customer is paired with by the local search
+            :param max_passes: (Optional) Maximum number of local search passes over the boundary customers, until no
+                move improves the routes if None
+            :param profiler: (Optional) Profiler collecting the time spent clustering, solving the clusters and
+                polishing
+        """
+        profiler = profiler or NULL_PROFILER
+        n_clusters = n_clusters or max(1, -(-len(self._locationBuf) // cluster_size))
+
+        with profiler.phase("clustering"):
+            if method == "sweep":
+                clusters = Decomposition.sweep_clusters(self.instance, n_clusters)
+            elif method == "kmeans":
+                clusters = Decomposition.kmeans_clusters(self.instance, n_clusters, np.random.default_rng(seed),
+                                                         time_weight)
+            else:
+                raise ValueError(f"Unknown clustering method {method}, expected one of {Decomposition.METHODS}")
+
+        with profiler.phase("clusters"):
+            solutions = Decomposition.solve_clusters(self.instance, clusters, self.vehicleNumber,
+                                                     self.vehicleCapacity, heuristic, params or {}, n_workers)
+        profiler.count("clusters", len(clusters))
+
+        self.routes = [route for solution in solutions for route in solution.routes(self.instance)]
+
+        if polish:
+            with profiler.phase("polish"):
+                local_search = LocalSearch.LocalSearch(self.instance, self.vehicleCapacity, n_neighbors)
+                self.routes = local_search.improve(self.routes, max_passes,
+                                                   Decomposition.boundary_customers(self.instance, clusters))
+
+        return self
+
+    def improve(self, n_neighbors: int = 20, operators: tuple[str, ...] = LocalSearch.OPERATORS,
+                max_passes: Optional[int] = None, profiler: Optional[Profiler] = None) -> "Vrp":
+        """Improve the current routes with local search (2-opt, Or-opt, relocate, swap, 2-opt*), respecting the
+        vehicle capacity and the delivery windows
+            :param n_neighbors: Number of nearest neighbors each customer is paired with
+            :param operators: Operators to apply, in order
+            :param max_passes: (Optional) Maximum number of passes over all customers
+            :param profiler: (Optional) Profiler collecting the time spent in local search
+        """
+        profiler = profiler or NULL_PROFILER
+        with profiler.phase("local_search"):
+            local_search = LocalSearch.LocalSearch(self.instance, self.vehicleCapacity, n_neighbors, operators)
+            self.routes = local_search.improve(self.routes, max_passes)
+        profiler.count("routes_improved", len(self.routes))
+        return self
+
+    def plot(self, filename: Optional[str] = None, labels: bool = False, title: Optional[str] = None) -> "Vrp":
+        """Draw all routes on a single figure, see Route.plot to draw a route on its own
+            :param filename: (Optional) Image file to write the figure to, e.g. routes.png or routes.svg, without
+                any GUI backend. The figure is drawn with pyplot if None
+            :param labels: Annotate the customers with their ids
+            :param title: (Optional) Title of the figure, defaults to the number of routes and the total cost
+        """
+        title = title or f"{len(self.routes)} routes, total cost {self.total_cost():.1f}"
+        bounds = (self._xmin, self._xmax, self._ymin, self._ymax)
+
+        if filename:
+            Plot.save_routes(filename, self.routes, self.warehouse, title, labels, bounds)
+        else:
+            Plot.plot_routes(self.routes, self.warehouse, title, labels, bounds)
+
         return self
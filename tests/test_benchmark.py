@@ -0,0 +1,59 @@
+from types import SimpleNamespace
+import src.Benchmark as Benchmark
+
+
+def no_proc(path, *args, **kwargs):
+    raise OSError(f"No such file: {path}")
+
+
+def test_peak_rss_is_reported_in_kilobytes(monkeypatch):
+    # Platform without /proc, read from ru_maxrss
+    monkeypatch.setattr(Benchmark, "open", no_proc, raising=False)
+    usage = SimpleNamespace(ru_maxrss=2048 * 1024)
+    monkeypatch.setattr(Benchmark, "resource", SimpleNamespace(RUSAGE_SELF=0, getrusage=lambda who: usage))
+
+    monkeypatch.setattr(Benchmark.sys, "platform", "linux")
+    assert Benchmark.peak_rss_kb() == 2048 * 1024
+
+    # macOS reports bytes
+    monkeypatch.setattr(Benchmark.sys, "platform", "darwin")
+    assert Benchmark.peak_rss_kb() == 2048
+
+
+def test_peak_rss_without_resource(monkeypatch):
+    monkeypatch.setattr(Benchmark, "open", no_proc, raising=False)
+    monkeypatch.setattr(Benchmark, "resource", None)
+    peak = Benchmark.peak_rss_kb()
+    assert peak is None or peak > 0
+
+
+def test_resume_only_skips_completed_jobs(tmp_path):
+    output = str(tmp_path / "results.csv")
+    jobs = [{"instance": "a.txt", "heuristic": "cws", "params": {}, "seed": None},
+            {"instance": "b.txt", "heuristic": "cws", "params": {}, "seed": None},
+            {"instance": "c.txt", "heuristic": "aco", "params": {"n_ants": 5}, "seed": 0}]
+
+    with open(output, "w", newline="") as file:
+        writer = Benchmark.csv.DictWriter(file, fieldnames=Benchmark.COLUMNS)
+        writer.writeheader()
+        for job, status in zip(jobs, ("ok", "error", "timeout")):
+            instance, heuristic, params, seed = Benchmark.job_key(job)
+            writer.writerow({"instance": instance, "heuristic": heuristic, "params": params, "seed": seed,
+                             "status": status})
+
+    assert Benchmark.completed_jobs(output) == {Benchmark.job_key(jobs[0])}
+
+
+def test_peak_rss_of_a_job_excludes_the_parent():
+    # Peak memory of the parent well above the memory needed by the job
+    ballast = Benchmark.os.urandom(512 * 1024 * 1024)
+    parent_peak = Benchmark.peak_rss_kb()
+    results = []
+
+    job = {"instance": "Dataset/100/c101.txt", "heuristic": "nearest_neighbor", "params": {}, "seed": None}
+    Benchmark.run_jobs([job], 1, 60, lambda job, result: results.append(result))
+    del ballast
+
+    assert results[0]["status"] == "ok"
+    if parent_peak is not None:
+        assert results[0]["peak_rss_kb"] < parent_peak - 256 * 1024
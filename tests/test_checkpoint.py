@@ -0,0 +1,24 @@
+import os
+from src.Dataset import load_vrp
+
+
+def test_stale_arrays_are_deleted_once_no_longer_mapped(tmp_path, monkeypatch):
+    vrp = load_vrp("Dataset/100/c101.txt", cache=False)
+    vrp.aco_heuristic(5, 2, 1, 2, 0.1, seed=0, checkpoint=str(tmp_path), checkpoint_interval=1)
+
+    # Like Windows, which refuses to delete the pheromones the resumed run holds memory-mapped
+    remove = os.remove
+
+    def locked_remove(filename):
+        if os.path.basename(filename) == "pheromones-00000002.npy":
+            raise PermissionError(filename)
+        remove(filename)
+
+    monkeypatch.setattr(os, "remove", locked_remove)
+    vrp.resume_ant_colony(str(tmp_path), max_iter=4, checkpoint_interval=1)
+    assert sorted(path.name for path in tmp_path.glob("pheromones-*")) == ["pheromones-00000002.npy",
+                                                                           "pheromones-00000004.npy"]
+
+    monkeypatch.undo()
+    vrp.resume_ant_colony(str(tmp_path), max_iter=5, checkpoint_interval=1)
+    assert [path.name for path in tmp_path.glob("pheromones-*")] == ["pheromones-00000005.npy"]
@@ -0,0 +1,33 @@
+import shutil
+import src.Dataset as Dataset
+
+
+def test_load_writes_and_reads_the_cache(tmp_path):
+    filename = str(tmp_path / "c101.txt")
+    shutil.copy("Dataset/100/c101.txt", filename)
+
+    vehicle_number, vehicle_capacity, customers = Dataset.load(filename)
+    assert len(list(tmp_path.glob("c101.txt.*.npz"))) == 1
+
+    cached = Dataset.load(filename)
+    assert cached[:2] == (vehicle_number, vehicle_capacity)
+    assert (cached[2] == customers).all()
+
+
+def test_load_from_a_read_only_directory(tmp_path, monkeypatch):
+    filename = str(tmp_path / "c101.txt")
+    shutil.copy("Dataset/100/c101.txt", filename)
+
+    # Like a read-only directory, whatever the permissions of the user running the tests
+    def read_only_open(file, mode="r", *args, **kwargs):
+        if "w" in mode:
+            raise PermissionError(file)
+        return open(file, mode, *args, **kwargs)
+
+    monkeypatch.setattr(Dataset, "open", read_only_open, raising=False)
+    vehicle_number, vehicle_capacity, customers = Dataset.load(filename)
+
+    expected = Dataset.parse(filename)
+    assert (vehicle_number, vehicle_capacity) == expected[:2]
+    assert (customers == expected[2]).all()
+    assert not list(tmp_path.glob("c101.txt.*"))
@@ -0,0 +1,15 @@
+from src.Dataset import load_vrp
+from src.Generator import generate_files
+
+
+def test_window_densities_give_distinct_files(tmp_path):
+    dense, sparse = (generate_files(str(tmp_path), [50], ["random"], ["tight"], 0, density)[0]
+                     for density in (1, 0.5))
+
+    assert dense != sparse
+    with open(dense) as file_dense, open(sparse) as file_sparse:
+        assert file_dense.read() != file_sparse.read()
+
+    # Generating again reuses the file of the same parameters
+    assert generate_files(str(tmp_path), [50], ["random"], ["tight"], 0, 0.5) == [sparse]
+    assert len(load_vrp(sparse, cache=False)._locationBuf) == 50
@@ -0,0 +1,27 @@
+from glob import glob
+import pytest
+from src.Dataset import load_vrp
+
+# Both spellings of the extension are in the dataset, a set as Windows matches either with both patterns
+INSTANCES = sorted(set(glob("Dataset/*/*.txt") + glob("Dataset/*/*.TXT")))
+
+HEURISTICS = {
+    "cws": {},
+    "insertion": {},
+    "decomposition": {"cluster_size": 50},
+}
+
+
+def test_every_instance_is_found():
+    assert len(INSTANCES) == 122
+
+
+@pytest.mark.parametrize("heuristic", HEURISTICS)
+@pytest.mark.parametrize("filename", INSTANCES)
+def test_routes_cover_every_customer_and_are_feasible(filename, heuristic):
+    vrp = getattr(load_vrp(filename, cache=False), f"{heuristic}_heuristic")(**HEURISTICS[heuristic])
+    visited = [customer.id for route in vrp.routes for customer in route.customers]
+
+    assert sorted(visited) == sorted(customer.id for customer in vrp._locationBuf)
+    assert all(route.customers for route in vrp.routes)
+    assert all(route.is_feasible(vrp.vehicleCapacity) for route in vrp.routes)
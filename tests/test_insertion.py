@@ -0,0 +1,24 @@
+from src.Benchmark import make_jobs, run_job
+from src.Dataset import load_vrp
+from src.SolutionCache import SolutionCache
+
+INSTANCE = "Dataset/100/r101.txt"
+
+
+def test_benchmark_runs_insertion_with_a_seed():
+    jobs = make_jobs([INSTANCE], ["insertion"], {"regret": [None, 2]}, [0, 1])
+
+    # The heuristic is deterministic, the random seeds are not applied to it
+    assert [job["seed"] for job in jobs] == [None, None]
+    assert all(run_job(job)["status"] == "ok" for job in jobs)
+
+
+def test_solve_caches_insertion():
+    cache = SolutionCache()
+    vrp = load_vrp(INSTANCE, cache=False).solve("insertion", cache, seed_customer="due_date")
+    routes = [[customer.id for customer in route.customers] for route in vrp.routes]
+
+    # The cache key holds the routes a heuristic starts from, the second run starts from none like the first
+    vrp = load_vrp(INSTANCE, cache=False).solve("insertion", cache, seed_customer="due_date")
+    assert (cache.misses, cache.hits) == (1, 1)
+    assert [[customer.id for customer in route.customers] for route in vrp.routes] == routes
@@ -0,0 +1,48 @@
+import pytest
+from src.Dataset import load
+from src.Instance import Instance
+from src.LocationSet import LocationSet
+from src.Vrp import Vrp
+import numpy as np
+
+
+@pytest.fixture(scope="module")
+def location_set():
+    return LocationSet.from_records(load("Dataset/100/r101.txt", cache=False)[2])
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32])
+def test_lazy_distances_match_the_matrix(location_set, dtype):
+    dense = Instance.from_location_set(location_set, dtype=dtype).distances
+    lazy = Instance.from_location_set(location_set, dtype=dtype, lazy=True).distances
+    a = np.array([3, 5, 7])
+
+    for key in [(0, 5), 0, (slice(None), 0), (slice(2, 9), slice(1, None)), (a, a), np.ix_(a, a), (a, slice(None)),
+                (slice(None), a), (3, a), (a[:, None], a), (slice(3, 6), 4)]:
+        assert np.shape(lazy[key]) == np.shape(dense[key])
+        assert np.asarray(lazy[key]).dtype == np.asarray(dense[key]).dtype
+        np.testing.assert_array_equal(lazy[key], dense[key])
+
+    assert all(lazy.item(i, j) == dense.item(i, j) for i in range(len(dense)) for j in range(len(dense)))
+    np.testing.assert_array_equal(np.asarray(lazy), dense)
+
+
+def test_arc_feasible_without_the_arc_matrix(location_set):
+    instance = Instance.from_location_set(location_set, lazy=True)
+    starts, neighbors = np.arange(len(instance))[:, None], instance.neighbor_lists(20)
+
+    forward, backward = instance.arc_feasible(starts, neighbors), instance.arc_feasible(neighbors, starts)
+    assert instance._arcs is None
+
+    np.testing.assert_array_equal(forward, instance.feasible_successors(starts[:, 0])[starts, neighbors])
+    np.testing.assert_array_equal(instance.arc_feasible(starts, neighbors), forward)
+    np.testing.assert_array_equal(instance.arc_feasible(neighbors, starts), backward)
+
+
+def test_decomposition_with_lazy_distances(location_set):
+    dense = Vrp.from_location_set(location_set, 25, 200).decomposition_heuristic(cluster_size=30)
+    lazy = Vrp.from_location_set(location_set, 25, 200, lazy_distances=True).decomposition_heuristic(cluster_size=30)
+
+    assert [[customer.id for customer in route.customers] for route in lazy.routes] == \
+        [[customer.id for customer in route.customers] for route in dense.routes]
+    assert lazy.instance._arcs is None
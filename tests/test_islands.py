@@ -0,0 +1,23 @@
+from src.Dataset import load_vrp
+import src.Heuristics.AntColony as AntColony
+import numpy as np
+
+
+def test_iteration_seeds_depend_on_the_spawn_key():
+    first, second = np.random.SeedSequence(0).spawn(2)
+
+    assert [seed.spawn_key for seed in AntColony.iteration_seeds(first, 3, 2)] == [(0, 3, 0), (0, 3, 1)]
+    assert AntColony.iteration_seeds(first, 3, 1)[0].generate_state(4).tolist() != \
+        AntColony.iteration_seeds(second, 3, 1)[0].generate_state(4).tolist()
+
+
+def test_colonies_spawned_from_one_seed_build_different_tours():
+    vrp = load_vrp("Dataset/100/c101.txt", cache=False)
+    tours = []
+
+    for seed_sequence in np.random.SeedSequence(0).spawn(3):
+        colony = AntColony.Colony("aco", 1, 2, 0.1, vrp._pheromone_store(1, None, False), 1, seed_sequence)
+        tours.append(colony.iterate(vrp.instance, 5, vrp.vehicleCapacity)[0])
+
+    assert not np.array_equal(tours[0], tours[1])
+    assert not np.array_equal(tours[1], tours[2])
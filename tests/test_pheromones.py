@@ -0,0 +1,41 @@
+import pytest
+from src.Dataset import load_vrp
+import src.Heuristics.AntColony as AntColony
+import numpy as np
+
+
+@pytest.fixture(scope="module")
+def vrp():
+    return load_vrp("Dataset/100/r101.txt", cache=False)
+
+
+@pytest.mark.parametrize("n_candidates", [None, 10])
+def test_mmas_reinforced_edges_end_above_the_others(vrp, n_candidates):
+    rho = 0.1
+    pheromones = vrp._pheromone_store(1, n_candidates, n_candidates is not None)
+    tours, costs = AntColony.construct_solutions(vrp.instance, pheromones, 5, 1, 2, vrp.vehicleCapacity,
+                                                 np.random.default_rng(0))
+
+    AntColony.update_pheromones_mmas(pheromones, tours, costs, rho, costs.min())
+    pheromones.evaporate(rho)
+
+    levels = pheromones.matrix()
+    start, end, _ = AntColony.tour_edges(tours[np.argmin(costs):np.argmin(costs) + 1])
+    reinforced = np.zeros(levels.shape, dtype=bool)
+    reinforced[start, end] = True
+    # A sparse store only keeps the deposits on the candidate edges
+    stored = np.ones(levels.shape, dtype=bool)
+    if n_candidates is not None:
+        stored[:] = False
+        stored[np.arange(len(levels))[:, None], pheromones.candidates] = True
+    lower, upper = pheromones.bounds
+
+    assert levels[~reinforced].max() < levels[reinforced & stored].min()
+    assert lower <= levels.min() and levels.max() <= upper
+
+
+def test_mmas_improves_on_the_first_iteration(vrp):
+    history = load_vrp("Dataset/100/r101.txt", cache=False).mmas_heuristic(10, 150, 1, 2, 0.1, seed=0) \
+        .best_cost_history
+
+    assert history[-1] < history[0]
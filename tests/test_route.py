@@ -0,0 +1,142 @@
+from itertools import permutations
+import pytest
+from src.Dataset import load_vrp
+from src.Route import EPSILON, Route, RouteState
+import numpy as np
+
+# Tolerance of the cost deltas against full recomputation
+TOLERANCE = 1e-6
+
+N_CASES = 2000
+
+
+@pytest.fixture(scope="module", params=["Dataset/100/c101.txt", "Dataset/100/r101.txt", "Dataset/100/rc201.txt"])
+def vrp(request):
+    return load_vrp(request.param, cache=False).cws_heuristic()
+
+
+def random_route(vrp, rng: np.random.Generator) -> Route:
+    """Feasible route: the customers of a route of the solution, a random share of them removed"""
+    customers = vrp.routes[rng.integers(len(vrp.routes))].customers
+    return Route(vrp.warehouse, [customer for customer in customers if rng.random() < 0.8] or customers[:1])
+
+
+def shifted_cost(state: RouteState, position: int, delta: float):
+    """Change of the route cost when the arrival at a position is shifted by delta, recomputed from there on, None if
+    a delivery window is missed"""
+    arrival = state.arrival[position] + delta
+
+    for k in range(position, len(state.nodes)):
+        node = state.nodes[k]
+        if arrival > node.due_date + EPSILON:
+            return None
+        if k + 1 < len(state.nodes):
+            arrival = max(arrival, node.ready_time) + node.service + node.distance_to(state.nodes[k + 1])
+
+    return arrival - state.cost
+
+
+def recomputed_delta(route: Route, customers: list, capacity: int):
+    """Change of the route cost with other customers, from a new schedule, None if the route is infeasible"""
+    changed = Route(route.warehouse, customers)
+    return changed.cost() - route.cost() if changed.is_feasible(capacity) else None
+
+
+def assert_same_delta(delta, expected):
+    if expected is None:
+        assert delta is None
+    else:
+        assert delta == pytest.approx(expected, abs=TOLERANCE)
+
+
+def test_routes_are_feasible(vrp):
+    assert all(route.is_feasible(vrp.vehicleCapacity) for route in vrp.routes)
+
+
+def test_shift(vrp):
+    rng = np.random.default_rng(0)
+
+    for _ in range(N_CASES):
+        state = random_route(vrp, rng).state
+        position = rng.integers(1, len(state.nodes))
+        delta = rng.choice([-1, 1]) * rng.exponential(20)
+
+        assert_same_delta(state.shift(position, delta), shifted_cost(state, position, delta))
+
+
+def test_insertion_cost(vrp):
+    rng = np.random.default_rng(1)
+
+    for _ in range(N_CASES):
+        route = random_route(vrp, rng)
+        customer = vrp._locationBuf[rng.integers(len(vrp._locationBuf))]
+        if customer in route.customers:
+            continue
+        position = rng.integers(len(route.customers) + 1)
+
+        expected = recomputed_delta(route, route.customers[:position] + [customer] + route.customers[position:],
+                                    vrp.vehicleCapacity)
+        assert_same_delta(route.insertion_cost(customer, position, vrp.vehicleCapacity), expected)
+
+
+def test_removal_cost(vrp):
+    rng = np.random.default_rng(2)
+
+    for _ in range(N_CASES):
+        route = random_route(vrp, rng)
+        position = rng.integers(len(route.customers))
+
+        expected = recomputed_delta(route, route.customers[:position] + route.customers[position + 1:], None)
+        assert_same_delta(route.removal_cost(position), expected)
+
+
+def test_replacement_cost(vrp):
+    rng = np.random.default_rng(3)
+
+    for _ in range(N_CASES):
+        route = random_route(vrp, rng)
+        customer = vrp._locationBuf[rng.integers(len(vrp._locationBuf))]
+        if customer in route.customers:
+            continue
+        position = rng.integers(len(route.customers))
+
+        expected = recomputed_delta(route, route.customers[:position] + [customer] + route.customers[position + 1:],
+                                    vrp.vehicleCapacity)
+        assert_same_delta(route.replacement_cost(position, customer, vrp.vehicleCapacity), expected)
+
+
+def brute_force(route: Route, time_windows: bool):
+    """Best cost (with time windows) or length (without) over every order of the customers, None if none is
+    feasible"""
+    orders = [Route(route.warehouse, list(order)) for order in permutations(route.customers)]
+
+    if time_windows:
+        return min((order.cost() for order in orders if order.is_feasible()), default=None)
+
+    return min(order.len() for order in orders)
+
+
+@pytest.mark.parametrize("time_windows", [False, True])
+def test_held_karp_matches_brute_force(vrp, time_windows):
+    rng = np.random.default_rng(4)
+
+    for n in range(8):
+        for _ in range(4):
+            # Customers of a route of the solution in a random order, so that a feasible order exists, or any customers
+            route = random_route(vrp, rng) if rng.random() < 0.5 else Route(vrp.warehouse, list(vrp._locationBuf))
+            route = Route(vrp.warehouse, [route.customers[i] for i in rng.permutation(len(route.customers))[:n]])
+
+            best = brute_force(route, time_windows)
+            optimized = route.held_karp(time_windows)
+
+            assert sorted(customer.id for customer in optimized.customers) == \
+                sorted(customer.id for customer in route.customers)
+
+            if not time_windows:
+                assert optimized.len() == pytest.approx(best, abs=TOLERANCE)
+            elif best is None:
+                # No order is feasible, the route is returned unchanged
+                assert optimized.customers == route.customers
+            else:
+                assert optimized.is_feasible()
+                assert optimized.cost() == pytest.approx(best, abs=TOLERANCE)
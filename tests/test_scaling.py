@@ -0,0 +1,11 @@
+import os
+from src.Scaling import idle_rss
+
+
+def test_idle_rss_excludes_the_parent():
+    # Peak memory of the parent well above the memory of an idle process
+    ballast = os.urandom(512 * 1024 * 1024)
+    rss = idle_rss()
+    del ballast
+
+    assert rss is None or rss < 256 * 1024
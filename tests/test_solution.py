@@ -0,0 +1,29 @@
+import pytest
+from src.Dataset import load_vrp
+from src.Heuristics.Pheromones import PheromoneStore
+from src.Solution import Solution, evaluate_tours
+import src.Heuristics.AntColony as AntColony
+import numpy as np
+
+
+@pytest.mark.parametrize("filename", ["Dataset/100/c101.txt", "Dataset/100/r201.txt", "Dataset/50/RC101.txt"])
+@pytest.mark.parametrize("n_candidates", [None, 10])
+def test_ant_costs_match_the_routes(filename, n_candidates):
+    vrp = load_vrp(filename, cache=False)
+    instance = vrp.instance
+    tours, costs = AntColony.construct_solutions(instance, PheromoneStore(len(instance), 1), 20, 1, 2,
+                                                 vrp.vehicleCapacity, np.random.default_rng(0), n_candidates)
+    evaluation = evaluate_tours(instance, tours, vrp.vehicleCapacity)
+
+    assert evaluation.feasible.all()
+    np.testing.assert_array_equal(evaluation.costs, costs)
+    np.testing.assert_allclose(evaluation.route_costs.sum(axis=1), costs)
+
+    for tour, cost in zip(tours, costs):
+        routes = AntColony.tour_to_routes(tour, instance)
+        solution = Solution.from_routes(routes, instance, vrp.vehicleCapacity)
+
+        assert solution.cost == cost
+        assert solution.cost == pytest.approx(sum(route.cost() for route in routes))
+        assert solution.route_loads.tolist() == [sum(customer.demand for customer in route.customers)
+                                                 for route in routes]